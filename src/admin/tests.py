@@ -1,13 +1,16 @@
 import hashlib
+import threading
 
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core import mail
-from rest_framework.status import HTTP_403_FORBIDDEN, HTTP_200_OK
+from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_200_OK
 from rest_framework.test import APITestCase
 
-from challenge.models import Category, Challenge
+from challenge.models import Category, Challenge, Solve
+from challenge.tests.mixins import ChallengeSetupMixin
 from member.models import Member
+from plugins.flag.executor import executor
 
 
 class MissingPointsTestCase(APITestCase):
@@ -145,3 +148,53 @@ class AuditLogViewTestCase(APITestCase):
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.get(reverse("audit-log"))
         self.assertEqual(response.status_code, HTTP_200_OK)
+
+
+class VerifyFlagsViewTestCase(ChallengeSetupMixin, APITestCase):
+    def verify(self, flags, user=None):
+        self.client.force_authenticate(user=user or self.admin_user)
+        return self.client.post(reverse("verify-flags"), {"flags": flags}, format="json")
+
+    def test_verify_flags(self):
+        response = self.verify(
+            [
+                {"challenge": self.challenge1.pk, "flag": "ractf{a}"},
+                {"challenge": self.challenge2.pk, "flag": "ractf{b}"},
+                {"challenge": 0, "flag": "ractf{a}"},
+            ]
+        )
+        results = response.data["d"]["results"]
+        self.assertEqual([result["correct"] for result in results], [True, False, None])
+        self.assertEqual(results[2]["error"], "challenge_not_found")
+        self.assertFalse(Solve.objects.exists())
+
+    def test_verify_flags_self_check(self):
+        self.challenge1.flag_metadata = {}
+        self.challenge1.save()
+        response = self.verify([{"challenge": self.challenge1.pk, "flag": "ractf{a}"}])
+        self.assertIn("invalid_flag_data", [issue["issue"] for issue in response.data["d"]["issues"]])
+        self.assertEqual(response.data["d"]["results"][0]["error"], "KeyError: 'flag'")
+
+    @override_settings(FLAG_CHECK_QUEUE_TIMEOUT=0.01)
+    def test_verify_flags_waits_for_worker(self):
+        self.challenge1.flag_type = "regex"
+        self.challenge1.flag_metadata = {"flag": "ractf{a+}"}
+        self.challenge1.save()
+        executor.start()
+        _, slots = executor.get_pool()
+        for _ in range(executor.slot_count):
+            slots.acquire()
+        release = threading.Timer(0.2, lambda: [slots.release() for _ in range(executor.slot_count)])
+        release.start()
+        response = self.verify([{"challenge": self.challenge1.pk, "flag": "ractf{aa}"}] * 8)
+        release.join()
+        results = response.data["d"]["results"]
+        self.assertEqual([(result["correct"], result["error"]) for result in results], [(True, None)] * 8)
+
+    def test_verify_flags_invalid(self):
+        response = self.verify([{"flag": "ractf{a}"}])
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_verify_flags_not_admin(self):
+        response = self.verify([], user=self.user)
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
@@ -7,6 +7,7 @@ router = DefaultRouter()
 
 urlpatterns = [
     path("self_check/", views.SelfCheckView.as_view(), name="self-check"),
+    path("verify_flags/", views.VerifyFlagsView.as_view(), name="verify-flags"),
     path("list/", views.mail_list, name="mail-list"),
     path("audit_log/", views.AuditLogView.as_view(), name="audit-log"),
 ]
@@ -3,12 +3,16 @@ from django.core import mail
 from django.http import HttpResponseNotFound
 from django.shortcuts import render
 from rest_framework.permissions import IsAdminUser
+from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
 
 from admin.models import AuditLogEntry
 from admin.serializers import AuditLogSerializer
 from backend.response import FormattedResponse
 from challenge.models import Challenge
+from challenge.verification import verify_flags
+
+MAX_VERIFY_FLAGS = 5000
 
 
 class SelfCheckView(APIView):
@@ -23,6 +27,22 @@ class SelfCheckView(APIView):
         return FormattedResponse(issues)
 
 
+class VerifyFlagsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        flags = request.data.get("flags")
+        if not isinstance(flags, list) or len(flags) > MAX_VERIFY_FLAGS:
+            return FormattedResponse(m="invalid_flags", status=HTTP_400_BAD_REQUEST)
+        try:
+            pairs = [(int(pair["challenge"]), pair["flag"]) for pair in flags]
+        except (KeyError, TypeError, ValueError):
+            return FormattedResponse(m="invalid_flags", status=HTTP_400_BAD_REQUEST)
+
+        results, issues = verify_flags(pairs)
+        return FormattedResponse({"results": results, "issues": issues})
+
+
 def mail_list(request):
     if settings.EMAIL_BACKEND == "anymail.backends.test.EmailBackend":
         return render(request, "mail_list.html", context={"emails": getattr(mail, 'outbox', [])})
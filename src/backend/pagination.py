@@ -1,8 +1,15 @@
+import base64
+import binascii
+import json
 from collections import OrderedDict
+from datetime import datetime
 from typing import Optional
 from urllib import parse
 
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from backend.response import FormattedResponse
 
@@ -33,3 +40,124 @@ class FormattedPagination(LimitOffsetPagination):
                 ]
             )
         )
+
+
+class FormattedKeysetPagination(FormattedPagination):
+    """
+    Limit/offset pagination which also supports keyset pagination on the queryset's ordering.
+
+    Clients which send a cursor parameter, empty for the first page, are paged by the values of the ordering columns
+    of the rows either side of the page, with the primary key as the final tiebreaker, rather than by an offset. They
+    aren't given a count, so a deep page costs the same as the first. Every other client gets limit/offset pagination.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.count = None
+        self.fields = self.get_ordering(queryset)
+        self.reverse, values = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        ordering = []
+        for field, descending in self.fields:
+            # Nulls always sort last going forwards, so pages come out the same on every database.
+            expression = F(field).desc if descending != self.reverse else F(field).asc
+            ordering.append(expression(nulls_first=True) if self.reverse else expression(nulls_last=True))
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_position_filter(values))
+
+        results = list(queryset[: self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[: self.limit]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.results = results
+        return results
+
+    def get_ordering(self, queryset):
+        """Return the (field, descending) pairs the queryset is ordered by, ending with the primary key."""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        fields = []
+        for field in ordering:
+            if not isinstance(field, str):
+                raise NotFound(self.invalid_cursor_message)
+            name = field.lstrip("-")
+            fields.append(("id" if name == "pk" else name, field.startswith("-")))
+        if not any(name == "id" for name, _ in fields):
+            fields.append(("id", False))
+        return fields
+
+    def get_position_filter(self, values):
+        """Return a filter for the rows strictly after, or before when going backwards, the given position."""
+        if len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        position = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.fields, values):
+            if value is None:
+                # Going forwards nothing comes after a null, going backwards every non null comes before one.
+                beyond = Q(**{f"{field}__isnull": False}) if self.reverse else Q(pk__in=[])
+                same = Q(**{f"{field}__isnull": True})
+            else:
+                lookup = "gt" if descending == self.reverse else "lt"
+                beyond = Q(**{f"{field}__{lookup}": value})
+                if not self.reverse:
+                    beyond |= Q(**{f"{field}__isnull": True})
+                same = Q(**{field: value})
+            position |= equal & beyond
+            equal &= same
+        return position
+
+    def get_position(self, instance):
+        values = []
+        for field, _ in self.fields:
+            value = instance
+            for attribute in field.split("__"):
+                value = getattr(value, attribute, None)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return values
+
+    def encode_cursor(self, reverse, values):
+        cursor = json.dumps({"r": reverse, "p": values}, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(cursor).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return False, None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return bool(cursor["r"]), list(cursor["p"])
+        except (binascii.Error, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, reverse, instance):
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return prepend_api_prefix(
+            replace_query_param(url, self.cursor_query_param, self.encode_cursor(reverse, self.get_position(instance)))
+        )
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.results:
+            return None
+        return self.get_cursor_link(False, self.results[-1])
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.results:
+            return None
+        return self.get_cursor_link(True, self.results[0])
@@ -0,0 +1,109 @@
+"""
+Query plan checks for the hottest queries.
+
+Each hot query is explained against the database and its plan searched for sequential scans over tables which grow
+with the size of an event. On SQLite, whose planner uses an index whenever one applies, any such scan means an index
+is missing, so the test suite checks every hot query against every large table. On Postgres the planner rightly scans
+small tables, so the check_query_plans management command only counts a scan against a table with at least a given
+number of rows, and is meant to be run against a database seeded with `make fake-bulk-data`.
+"""
+
+import json
+import re
+
+from django.db import connection
+
+from challenge.models import Score, Solve
+from hint.models import HintUse
+from member.models import Member, UserIP
+from team.models import Team
+
+LARGE_TABLES = (
+    Member._meta.db_table,
+    Team._meta.db_table,
+    Solve._meta.db_table,
+    Score._meta.db_table,
+    HintUse._meta.db_table,
+    UserIP._meta.db_table,
+)
+
+# The plans don't depend on which rows are looked up, so placeholder ids are used.
+HOT_QUERIES = {
+    "team_leaderboard": lambda: Team.objects.visible().ranked()[:100],
+    "user_leaderboard": lambda: Member.objects.filter(is_visible=True).order_by("-leaderboard_points", "last_score")[
+        :100
+    ],
+    "team_solves": lambda: Solve.objects.filter(team_id=1, correct=True),
+    "user_solves": lambda: Solve.objects.filter(solved_by_id=1, correct=True),
+    "challenge_solves": lambda: Solve.objects.filter(challenge_id=1, correct=True),
+    "team_challenge_solved": lambda: Solve.objects.filter(team_id=1, challenge_id=1, correct=True),
+    "team_hint_penalty": lambda: HintUse.objects.filter(team_id=1, challenge_id=1).values("hint__penalty"),
+    "team_hint_used": lambda: HintUse.objects.filter(hint_id=1, team_id=1),
+    "team_hints_used": lambda: HintUse.objects.filter(team_id=1).values_list("hint_id", flat=True),
+    "user_ip": lambda: UserIP.objects.filter(user_id=1, ip="127.0.0.1"),
+    "team_scores": lambda: Score.objects.filter(team_id__in=[1, 2], leaderboard=True).order_by("timestamp"),
+    "user_scores": lambda: Score.objects.filter(user_id__in=[1, 2], leaderboard=True).order_by("timestamp"),
+}
+
+SQLITE_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)(.*)")
+
+
+def explain(queryset):
+    """Return the plan of a queryset as the database reports it."""
+    if connection.vendor == "postgresql":
+        return queryset.explain(format="json")
+    return queryset.explain()
+
+
+def get_postgres_scans(node):
+    scans = []
+    if node.get("Node Type") == "Seq Scan":
+        scans.append(node["Relation Name"])
+    for child in node.get("Plans", []):
+        scans += get_postgres_scans(child)
+    return scans
+
+
+def get_sequential_scans(plan):
+    """Return the tables a plan from explain() reads in full without an index."""
+    if connection.vendor == "postgresql":
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return sorted({table for entry in plan for table in get_postgres_scans(entry["Plan"])})
+    scans = set()
+    for line in plan.splitlines():
+        match = SQLITE_SCAN.search(line)
+        if match is not None and "USING" not in match.group(2):
+            scans.add(match.group(1))
+    return sorted(scans)
+
+
+def get_table_rows(table):
+    """Return roughly how many rows a table has."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            return max(int(row[0]), 0) if row is not None else 0
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+def check_query_plans(queries=None, min_rows=0):
+    """
+    Explain each hot query, returning a dict of the ones which scan a large table to the tables they scan.
+
+    Tables with fewer than min_rows rows are ignored.
+    """
+    queries = HOT_QUERIES if queries is None else queries
+    rows = {}
+    failures = {}
+    for name, query in queries.items():
+        scans = [table for table in get_sequential_scans(explain(query())) if table in LARGE_TABLES]
+        if min_rows:
+            for table in scans:
+                if table not in rows:
+                    rows[table] = get_table_rows(table)
+            scans = [table for table in scans if rows[table] >= min_rows]
+        if scans:
+            failures[name] = scans
+    return failures
@@ -9,3 +9,19 @@ class FormattedResponse(Response):
             s = False
         data = {"s": s, "m": m, "d": d}
         super(FormattedResponse, self).__init__(data, status, template_name, headers, exception, content_type)
+
+
+class PrerenderedResponse(Response):
+    """A response whose body has already been rendered, e.g. a FormattedResponse body held in the cache."""
+
+    def __init__(self, content=b"", status=None, headers=None, content_type="application/json; charset=utf-8"):
+        super(PrerenderedResponse, self).__init__(None, status, headers=headers, content_type=content_type)
+        self.prerendered_content = content
+
+    @property
+    def rendered_content(self):
+        if self.prerendered_content:
+            self["Content-Type"] = self.content_type
+        else:
+            del self["Content-Type"]
+        return self.prerendered_content
@@ -0,0 +1,115 @@
+"""
+Compilation of serpy serializers into specialised functions.
+
+serpy serializes an object by looping over a list of field tuples and branching on each tuple's options for every
+object. CompiledSerializer generates Python source for a function per serializer class instead, with the branches
+resolved once: plain attributes are read inline, conversion functions and method getters are bound as locals, and
+nested compiled serializers are called directly rather than through their to_value. The result is identical to
+serpy's own output.
+"""
+
+import keyword
+import operator
+
+import serpy
+
+
+def _is_simple_attr(attr):
+    return all(part.isidentifier() and not keyword.iskeyword(part) for part in attr.split("."))
+
+
+def _is_plain(serializer_cls):
+    """Check whether a serializer class serializes objects with nothing but its fields."""
+    return (
+        issubclass(serializer_cls, CompiledSerializer)
+        and serializer_cls._serialize is CompiledSerializer._serialize
+        and serializer_cls.to_value is serpy.Serializer.to_value
+    )
+
+
+def compile_serializer(serializer_cls):
+    """Generate a function of (serializer, instance) returning what serpy would serialize instance to."""
+    namespace = {}
+    fields = list(zip(serializer_cls._field_map.items(), serializer_cls._compiled_fields))
+    # Optional fields may be left out of the result, otherwise it can be built as a single dict display.
+    all_required = all(required or pass_self for _, (_, _, _, _, required, pass_self) in fields)
+    lines = [] if all_required else ["    result = {}"]
+    items = []
+    for index, ((name, field), (label, getter, to_value, call, required, pass_self)) in enumerate(fields):
+        namespace[f"name_{index}"] = label
+        if pass_self:
+            namespace[f"getter_{index}"] = getter
+            expression = f"getter_{index}(serializer, instance)"
+            conversions = []
+        else:
+            attr = field.attr or name
+            if (
+                field.as_getter(name, serializer_cls) is None
+                and serializer_cls.default_getter is operator.attrgetter
+                and _is_simple_attr(attr)
+            ):
+                expression = f"instance.{attr}"
+            else:
+                namespace[f"getter_{index}"] = getter
+                expression = f"getter_{index}(instance)"
+
+            conversions = []
+            if call:
+                conversions.append("{}()")
+            if isinstance(field, serpy.Serializer) and _is_plain(type(field)):
+                namespace[f"nested_{index}"] = field
+                namespace[f"serialize_{index}"] = type(field).get_compiled()
+                if field.many:
+                    conversions.append(f"[serialize_{index}(nested_{index}, item) for item in {{}}]")
+                else:
+                    conversions.append(f"serialize_{index}(nested_{index}, {{}})")
+            elif to_value is not None:
+                namespace[f"to_value_{index}"] = to_value
+                conversions.append(f"to_value_{index}({{}})")
+
+        if required or pass_self:
+            for conversion in conversions:
+                expression = conversion.format(expression)
+            if all_required:
+                items.append(f"name_{index}: {expression}")
+            else:
+                lines.append(f"    result[name_{index}] = {expression}")
+            continue
+
+        converted = "value"
+        for conversion in conversions:
+            converted = conversion.format(converted)
+        lines += [
+            "    try:",
+            f"        value = {expression}",
+            "    except (KeyError, AttributeError):",
+            "        pass",
+            "    else:",
+        ]
+        if conversions:
+            lines += ["        if value is not None:", f"            value = {converted}"]
+        lines.append(f"        result[name_{index}] = value")
+
+    if all_required:
+        lines.append("    return {" + ", ".join(items) + "}")
+    else:
+        lines.append("    return result")
+    function_name = f"serialize_{serializer_cls.__name__}"
+    source = f"def {function_name}(serializer, instance):\n" + "\n".join(lines) + "\n"
+    exec(compile(source, f"<compiled {serializer_cls.__module__}.{serializer_cls.__qualname__}>", "exec"), namespace)
+    function = namespace[function_name]
+    function.source = source
+    return function
+
+
+class CompiledSerializer(serpy.Serializer):
+    """A serpy serializer whose field loop is compiled into a specialised function the first time it's used."""
+
+    @classmethod
+    def get_compiled(cls):
+        if "_compiled_serialize" not in cls.__dict__:
+            cls._compiled_serialize = compile_serializer(cls)
+        return cls._compiled_serialize
+
+    def _serialize(self, instance, fields):
+        return type(self).get_compiled()(self, instance)
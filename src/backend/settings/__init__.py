@@ -10,6 +10,7 @@ from corsheaders.defaults import default_headers
 
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 CORS_ALLOW_HEADERS = [*default_headers, "x-exporting", "exporting"]
+CORS_EXPOSE_HEADERS = ["etag", "x-board-version"]
 
 DOMAIN = os.getenv("DOMAIN")
 DEBUG = bool(os.getenv("DEBUG"))
@@ -46,6 +47,7 @@ DEFAULT_CONFIG = {
     "config_version": 5,
     "flag_prefix": "ractf",
     "graph_members": 10,
+    "graph_resolution": 100,
     "register_start_time": time.time(),
     "register_end_time": -1,
     "end_time": time.time() + 7 * 24 * 60 * 60,
@@ -66,7 +68,6 @@ DEFAULT_CONFIG = {
     "enable_prelogin": True,
     "enable_maintenance_mode": False,
     "enable_registration": True,
-    "enable_preevent_cache": True,
     "enable_scoreboard": True,
     "enable_scoring": True,
     "enable_solve_broadcast": True,
@@ -77,8 +78,9 @@ DEFAULT_CONFIG = {
     "invite_required": False,
     "hide_scoreboard_at": -1,
     "setup_wizard_complete": False,
-    "sensitive_fields": ["sensitive_fields", "enable_force_admin_2fa", "firstblood_webhook"],
+    "sensitive_fields": ["sensitive_fields", "enable_force_admin_2fa", "firstblood_webhook", "notification_sinks"],
     "firstblood_webhook": "",
+    "notification_sinks": [],
     "event_name": "RACTF",
 }
 
@@ -93,6 +95,7 @@ INSTALLED_APPS = [
     "hint.apps.HintConfig",
     "leaderboard.apps.LeaderboardConfig",
     "member.apps.MemberConfig",
+    "notifications.apps.NotificationsConfig",
     "pages.apps.PagesConfig",
     "plugins.apps.PluginsConfig",
     "ractf.apps.RactfConfig",
@@ -296,6 +299,23 @@ elif os.getenv("ANDROMEDA_URL") or os.getenv("CHALLENGE_SERVER_TYPE") == "ANDROM
 else:
     CHALLENGE_SERVER_ENABLED = False
 
+NOTIFICATION_TIMEOUT = float(os.getenv("NOTIFICATION_TIMEOUT", 5))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5))
+NOTIFICATION_RETENTION = int(os.getenv("NOTIFICATION_RETENTION", 7 * 24 * 60 * 60))
+
+BUFFER_INCORRECT_ATTEMPTS = bool(os.getenv("BUFFER_INCORRECT_ATTEMPTS"))
+INCORRECT_ATTEMPT_FLUSH_INTERVAL = float(os.getenv("INCORRECT_ATTEMPT_FLUSH_INTERVAL", 2))
+INCORRECT_ATTEMPT_FLUSH_SIZE = int(os.getenv("INCORRECT_ATTEMPT_FLUSH_SIZE", 500))
+
+FLAG_CHECK_TIMEOUT = float(os.getenv("FLAG_CHECK_TIMEOUT", 0.5))
+FLAG_CHECK_WORKERS = int(os.getenv("FLAG_CHECK_WORKERS", 2))
+FLAG_CHECK_QUEUE_TIMEOUT = float(os.getenv("FLAG_CHECK_QUEUE_TIMEOUT", 5))
+
+COALESCE_SCORE_RECALCULATION = bool(os.getenv("COALESCE_SCORE_RECALCULATION"))
+SCORE_RECALCULATION_INTERVAL = float(os.getenv("SCORE_RECALCULATION_INTERVAL", 5))
+
+STANDINGS_SNAPSHOT_STORAGE = bool(os.getenv("STANDINGS_SNAPSHOT_STORAGE"))
+
 INSTALLED_PLUGINS = [
     "plugins.flag.hashed",
     "plugins.flag.plaintext",
@@ -1,15 +1,25 @@
+from types import SimpleNamespace
 from unittest import TestCase
+from urllib.parse import parse_qs, urlparse
+
+import serpy
 
 from django.core.exceptions import ValidationError
+from django.db.models import F
 from django.http import HttpRequest
 from rest_framework.request import Request
+from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_404_NOT_FOUND
 from rest_framework.test import APITestCase
 
 from backend.pagination import prepend_api_prefix
 from backend.permissions import ReadOnlyBot
+from backend.query_plans import check_query_plans
+from backend.serpy_compiler import CompiledSerializer
 from backend.validators import printable_name
-from member.models import Member
+from challenge.models import Category, Challenge, Score, Solve
+from member.models import Member, UserIP
+from team.models import Team
 
 
 class CatchAllTestCase(APITestCase):
@@ -44,3 +54,162 @@ class APIPrefixTestCase(TestCase):
     def test_prepend_api_prefix(self):
         prepended = prepend_api_prefix("https://api.ractf.co.uk/challenges/")
         self.assertEqual(prepended, "https://api.ractf.co.uk/api/v2/challenges/?")
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        for i in range(7):
+            user = Member.objects.create(username=f"keyset-{i}", email=f"keyset-{i}@example.org", is_visible=True)
+            if i % 2:
+                team = Team.objects.create(name=f"keyset-{i % 3}", password="keyset", owner=user, is_visible=True)
+                user.team = team
+                user.save()
+        self.client.force_authenticate(user)
+
+    def get_cursor(self, link):
+        return parse_qs(urlparse(link).query)["cursor"][0]
+
+    def page_through(self, url, **params):
+        response = self.client.get(url, {"cursor": "", "limit": 3, **params})
+        pages = [response.data["d"]]
+        while pages[-1]["next"] is not None:
+            cursor = self.get_cursor(pages[-1]["next"])
+            pages.append(self.client.get(url, {"cursor": cursor, "limit": 3, **params}).data["d"])
+        return pages
+
+    def test_matches_offset(self):
+        offset = self.client.get(reverse("member-list"), {"limit": 100}).data["d"]
+        pages = self.page_through(reverse("member-list"))
+        keyset_ids = [user["id"] for page in pages for user in page["results"]]
+        self.assertEqual(keyset_ids, [user["id"] for user in offset["results"]])
+        self.assertEqual(len(pages), 3)
+
+    def test_no_count(self):
+        pages = self.page_through(reverse("member-list"))
+        self.assertIsNone(pages[0]["count"])
+        self.assertIsNone(pages[0]["previous"])
+        self.assertIsNotNone(self.client.get(reverse("member-list")).data["d"]["count"])
+
+    def test_previous(self):
+        pages = self.page_through(reverse("member-list"))
+        cursor = self.get_cursor(pages[2]["previous"])
+        previous = self.client.get(reverse("member-list"), {"cursor": cursor, "limit": 3})
+        self.assertEqual(previous.data["d"]["results"], pages[1]["results"])
+        self.assertIsNotNone(previous.data["d"]["next"])
+
+    def test_nullable_ordering(self):
+        expected = list(
+            Member.objects.filter(is_visible=True)
+            .order_by(F("team__name").asc(nulls_last=True), "id")
+            .values_list("id", flat=True)
+        )
+        pages = self.page_through(reverse("member-list"), ordering="team__name")
+        self.assertEqual([user["id"] for page in pages for user in page["results"]], expected)
+        cursor = self.get_cursor(pages[-1]["previous"])
+        previous = self.client.get(reverse("member-list"), {"cursor": cursor, "limit": 3, "ordering": "team__name"})
+        self.assertEqual(previous.data["d"]["results"], pages[-2]["results"])
+
+    def test_annotated_ordering(self):
+        offset = self.client.get(reverse("team-list"), {"limit": 100, "ordering": "-members_count"}).data["d"]
+        pages = self.page_through(reverse("team-list"), ordering="-members_count")
+        self.assertEqual(
+            sorted(team["id"] for page in pages for team in page["results"]), sorted(t["id"] for t in offset["results"])
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("member-list"), {"cursor": "a"})
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+
+class QueryPlanTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = Member.objects.bulk_create(
+            Member(username=f"plan-{i}", email=f"plan-{i}@example.org", is_visible=True) for i in range(200)
+        )
+        teams = Team.objects.bulk_create(
+            Team(name=f"plan-{i}", password="plan", owner=user, leaderboard_points=i) for i, user in enumerate(users)
+        )
+        UserIP.objects.bulk_create(UserIP(user=user, ip="127.0.0.1", user_agent="plan") for user in users)
+        category = Category.objects.create(name="plan", display_order=0, contained_type="test", description="")
+        challenges = Challenge.objects.bulk_create(
+            Challenge(
+                name=f"plan-{i}",
+                category=category,
+                description="",
+                challenge_type="basic",
+                challenge_metadata={},
+                flag_type="plaintext",
+                flag_metadata={"flag": "ractf{a}"},
+                author="plan",
+                score=100,
+                unlock_requirements="",
+            )
+            for i in range(5)
+        )
+        scores = Score.objects.bulk_create(
+            Score(team=team, user=user, reason="challenge", points=100)
+            for team, user in zip(teams, users)
+            for _ in challenges
+        )
+        Solve.objects.bulk_create(
+            Solve(team=score.team, solved_by=score.user, challenge=challenge, score=score, flag="ractf{a}")
+            for score, challenge in zip(scores, challenges * len(teams))
+        )
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(check_query_plans(), {})
+
+    def test_sequential_scan_detected(self):
+        queries = {"flag": lambda: Solve.objects.filter(flag="ractf{a}")}
+        self.assertEqual(check_query_plans(queries), {"flag": [Solve._meta.db_table]})
+
+    def test_small_tables_ignored(self):
+        queries = {"flag": lambda: Solve.objects.filter(flag="ractf{a}")}
+        self.assertEqual(check_query_plans(queries, min_rows=1001), {})
+        self.assertEqual(check_query_plans(queries, min_rows=1000), {"flag": [Solve._meta.db_table]})
+
+
+class NestedSerializer(CompiledSerializer):
+    id = serpy.IntField()
+    name = serpy.StrField(required=False)
+
+
+class ExampleSerializer(CompiledSerializer):
+    id = serpy.IntField()
+    label = serpy.StrField(attr="name", label="title")
+    owner = serpy.StrField(attr="owner.name", required=False)
+    total = serpy.Field(call=True)
+    double = serpy.MethodField()
+    children = NestedSerializer(many=True)
+    metadata = serpy.DictSerializer()
+
+    def get_double(self, instance):
+        return instance.id * 2
+
+
+class InterpretedExampleSerializer(ExampleSerializer):
+    def _serialize(self, instance, fields):
+        return serpy.Serializer._serialize(self, instance, fields)
+
+
+class CompiledSerializerTestCase(TestCase):
+    def setUp(self):
+        child = SimpleNamespace(id="1", name=None)
+        self.instances = [
+            SimpleNamespace(id="5", name=1, owner=SimpleNamespace(name=2), total=lambda: 3, children=[child], metadata={}),
+            SimpleNamespace(id=6, name="a", owner=None, total=lambda: 4, children=[], metadata={"a": 1}),
+        ]
+
+    def test_compiled_matches_serpy(self):
+        self.assertEqual(
+            ExampleSerializer(self.instances, many=True).data,
+            InterpretedExampleSerializer(self.instances, many=True).data,
+        )
+
+    def test_compiled_once_per_class(self):
+        self.assertIs(ExampleSerializer.get_compiled(), ExampleSerializer.get_compiled())
+
+    def test_compiled_required_field_missing(self):
+        with self.assertRaises(AttributeError):
+            ExampleSerializer(SimpleNamespace(id=1)).data
@@ -0,0 +1,213 @@
+"""
+Buffered ingestion of incorrect flag attempts.
+
+Wrong flags vastly outnumber right ones during an event, so with BUFFER_INCORRECT_ATTEMPTS set, incorrect attempts
+aren't inserted one at a time. They're held in a per-process buffer and written with a single bulk insert once
+INCORRECT_ATTEMPT_FLUSH_SIZE have built up, or every INCORRECT_ATTEMPT_FLUSH_INTERVAL seconds from a background
+thread. The buffer is also flushed when the process exits, see gunicorn_config.worker_exit.
+
+Attempts waiting in a buffer are counted in the cache as soon as they're committed, per team and challenge and per
+challenge, so the attempt limit and the incorrect solve counts include them before they reach the table.
+
+Each team's attempts at a challenge are also kept as an atomic counter in the cache, so submissions to challenges with
+an attempt_limit can be turned away without counting solves. A counter is only created the first time it's read, from
+the solve table, and is then kept up to date as solves are made, deleted or buffered. Attempts only reach the counter
+once they commit, so each submission also reserves an attempt in a second counter of attempts in flight, with an
+atomic increment, before its flag is checked. The limit is checked against both, and the reservation released once the
+attempt it stood for has been counted.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from challenge import counters
+from challenge.models import Solve
+
+PENDING_TIMEOUT = 600
+RESERVATION_TIMEOUT = 600
+
+logger = logging.getLogger(__name__)
+
+
+def get_pending_key(challenge_id, team_id=None):
+    if team_id is None:
+        return f"incorrect_attempts_pending_{challenge_id}"
+    return f"incorrect_attempts_pending_{challenge_id}_{team_id}"
+
+
+def get_attempt_key(challenge_id, team_id):
+    return f"challenge_attempts_{challenge_id}_{team_id}"
+
+
+def get_reservation_key(challenge_id, team_id):
+    return f"challenge_attempts_reserved_{challenge_id}_{team_id}"
+
+
+def _adjust_pending(deltas):
+    cache = caches["default"]
+    for key, delta in deltas.items():
+        cache.add(key, 0, timeout=PENDING_TIMEOUT)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+class AttemptBuffer:
+    """Incorrect attempts waiting to be written, shared by every thread in the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.solves = []
+        self.thread = None
+
+    def add(self, solve):
+        with self.lock:
+            self.solves.append(solve)
+            full = len(self.solves) >= settings.INCORRECT_ATTEMPT_FLUSH_SIZE
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        if full:
+            self.flush()
+
+    def run(self):
+        while not stopped.wait(settings.INCORRECT_ATTEMPT_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush incorrect attempts, retrying next interval")
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Write every buffered attempt to the table, returning how many there were."""
+        with self.lock:
+            solves, self.solves = self.solves, []
+        if not solves:
+            return 0
+        try:
+            Solve.objects.bulk_create(solves, batch_size=1000)
+        except Exception:
+            with self.lock:
+                self.solves[:0] = solves
+            raise
+        pending = Counter()
+        for solve in solves:
+            pending[get_pending_key(solve.challenge_id)] -= 1
+            pending[get_pending_key(solve.challenge_id, solve.team_id)] -= 1
+        _adjust_pending(pending)
+        return len(solves)
+
+
+buffer = AttemptBuffer()
+stopped = threading.Event()
+
+
+def _buffer(solve):
+    _adjust_pending({get_pending_key(solve.challenge_id): 1, get_pending_key(solve.challenge_id, solve.team_id): 1})
+    _apply_attempt(solve.challenge_id, solve.team_id, 1)
+    buffer.add(solve)
+
+
+def record_incorrect_attempt(user, team, challenge, flag):
+    """Buffer an incorrect attempt to be inserted in bulk once the current transaction commits, counting it then."""
+    solve = Solve(team=team, solved_by=user, challenge=challenge, flag=flag, correct=False, score=None)
+    # Bulk inserts don't send post_save, so the counter the signal would have updated is updated here instead.
+    counters.increment("incorrect_solves", challenge.pk)
+    transaction.on_commit(lambda: _buffer(solve))
+
+
+def get_pending_attempts(challenge, team):
+    """Return how many of a team's incorrect attempts at a challenge are buffered and not yet in the table."""
+    return max(caches["default"].get(get_pending_key(challenge.pk, team.pk), 0), 0)
+
+
+def get_pending_counts(challenge_ids):
+    """Return the number of buffered incorrect attempts at each of the given challenges which have any."""
+    keys = {get_pending_key(challenge_id): challenge_id for challenge_id in challenge_ids}
+    return {keys[key]: count for key, count in caches["default"].get_many(keys.keys()).items() if count > 0}
+
+
+def get_attempt_count(challenge_id, team_id):
+    """Return how many attempts a team has made at a challenge, creating its counter from the solve table if needed."""
+    cache = caches["default"]
+    count = cache.get(get_attempt_key(challenge_id, team_id))
+    if count is not None:
+        return count
+    count = Solve.objects.filter(challenge_id=challenge_id, team_id=team_id).count()
+    if settings.BUFFER_INCORRECT_ATTEMPTS:
+        count += max(cache.get(get_pending_key(challenge_id, team_id), 0), 0)
+    if not cache.add(get_attempt_key(challenge_id, team_id), count, timeout=None):
+        return cache.get(get_attempt_key(challenge_id, team_id), count)
+    return count
+
+
+def _apply_attempt(challenge_id, team_id, delta):
+    try:
+        caches["default"].incr(get_attempt_key(challenge_id, team_id), delta)
+    except ValueError:
+        pass
+
+
+def record_attempt(challenge_id, team_id, delta=1):
+    """Adjust a team's attempt counter, if it has one, once the current transaction commits."""
+    transaction.on_commit(lambda: _apply_attempt(challenge_id, team_id, delta))
+
+
+def reserve_attempt(challenge_id, team_id, limit):
+    """
+    Reserve one of a team's attempts at a challenge while it's made, returning whether it's within the attempt limit.
+
+    A reservation which is refused is released straight away, otherwise it must be released with release_attempt.
+    """
+    cache = caches["default"]
+    key = get_reservation_key(challenge_id, team_id)
+    cache.add(key, 0, timeout=RESERVATION_TIMEOUT)
+    try:
+        reserved = cache.incr(key)
+    except ValueError:
+        # Expired between the add and the incr.
+        cache.add(key, 1, timeout=RESERVATION_TIMEOUT)
+        reserved = 1
+    # Attempts reserved before this one are counted as if they'd been made.
+    if get_attempt_count(challenge_id, team_id) + max(reserved - 1, 0) > limit:
+        _release(key)
+        return False
+    return True
+
+
+def _release(key):
+    try:
+        caches["default"].decr(key)
+    except ValueError:
+        pass
+
+
+def release_attempt(challenge_id, team_id):
+    """Release a reservation once the current transaction, if any, commits and the attempt it stood for is counted."""
+    key = get_reservation_key(challenge_id, team_id)
+    transaction.on_commit(lambda: _release(key))
+
+
+def reset_attempt_count(challenge_id, team_id):
+    """Set a team's attempt counter to zero, giving it its full attempt limit again."""
+    caches["default"].set(get_attempt_key(challenge_id, team_id), 0, timeout=None)
+    caches["default"].delete(get_reservation_key(challenge_id, team_id))
+
+
+def flush_incorrect_attempts():
+    return buffer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    stopped.set()
+    if buffer.solves:
+        flush_incorrect_attempts()
@@ -0,0 +1,445 @@
+"""
+Caching for the challenge board.
+
+The board is split into a base document, which is serialized once and shared between every team, and a small
+per-team overlay holding the ids of the challenges a team has solved and unlocked and the hints it has used. Solves
+and hint uses only invalidate the overlay of the team involved, the base document is only rebuilt when a challenge,
+category, hint, file or tag is changed.
+
+Each team's rendered board, with vote and solve counts filled in, is also cached as the exact response body along with
+its ETag, so repeated fetches are served without decoding or re-encoding the board. Teams which haven't solved anything
+or used any hints all share the rendered board of the anonymous overlay. Each team's current ETag is also kept under a
+key of its own along with the versions it was rendered at, and fetched in the same get_many as the mod index, release
+schedule, latest change and counters version, so a client which already has the current board gets a 304 after a
+single cache lookup.
+
+Every key is scoped by the board version, which changes whenever the board is edited and whenever a category or
+challenge release time, or the start or end of the competition, passes. The board for an upcoming release can
+therefore be rendered ahead of time by challenge.warmup and starts being served the moment the release happens.
+
+Clients are also given a version made of the latest entry in the board change log and the latest release boundary
+passed. Sending it back gets a delta holding only the categories and challenges edited since, as long as no release
+has happened in between.
+
+Single challenges, which clients fetch in bursts when told a challenge changed, have their base board entry cached
+on their own, and are rendered with the team's overlay if it's cached or just their own solved and unlocked state
+otherwise.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import caches
+from django.db import models
+from django.db.models import Case, Prefetch, Value, When
+from django.utils import timezone
+
+from backend.renderers import RACTFJSONRenderer
+from challenge import changes, counters, unlocks
+from challenge.models import Category, Challenge, File, Tag
+from challenge.serializers import FastBoardCategorySerializer, FastBoardChallengeSerializer
+from config import config
+from hint.models import Hint
+from hint.usage import get_used_hint_ids
+
+
+MOD_INDEX_KEY = "challenge_mod_index"
+RELEASE_SCHEDULE_KEY = "challenge_release_schedule"
+
+
+def get_mod_index():
+    return str(caches["default"].get(MOD_INDEX_KEY, 0))
+
+
+def bump_mod_index():
+    """Change the board version, so every cached board and challenge is rebuilt."""
+    new_index = caches["default"].get(MOD_INDEX_KEY, 0) + 1
+    caches["default"].set(MOD_INDEX_KEY, new_index, timeout=None)
+
+
+def invalidate_challenge(challenge_id):
+    """Rebuild the board after a challenge is updated without being saved, such as when it gets its first blood."""
+    bump_mod_index()
+    changes.log_change(challenge_id=challenge_id)
+
+
+def get_board_state(*keys):
+    """
+    Return the mod index and release schedule, along with the values of any other keys, from a single cache lookup.
+
+    The release schedule is the sorted timestamps at which the board changes without being edited. It's stored with the
+    mod index it was built at, and rebuilt if that's out of date.
+    """
+    cache = caches["default"]
+    cached = cache.get_many([MOD_INDEX_KEY, RELEASE_SCHEDULE_KEY, *keys])
+    mod_index = str(cached.get(MOD_INDEX_KEY, 0))
+    schedule = cached.get(RELEASE_SCHEDULE_KEY)
+    if schedule is None or schedule[0] != mod_index or not config.get("enable_caching"):
+        release_times = {
+            release_time.timestamp()
+            for model in (Category, Challenge)
+            for release_time in model.objects.values_list("release_time", flat=True).distinct()
+        }
+        schedule = (mod_index, release_times)
+        cache.set(RELEASE_SCHEDULE_KEY, schedule, 3600)
+    return mod_index, sorted(schedule[1] | {config.get("start_time"), config.get("end_time")}), cached
+
+
+def get_release_schedule():
+    """Return the sorted timestamps at which the board changes without being edited."""
+    return get_board_state()[1]
+
+
+def get_generation(schedule, at=None):
+    if at is None:
+        at = time.time()
+    return int(max((release_time for release_time in schedule if release_time <= at), default=0))
+
+
+def get_release_generation(at=None):
+    """Return the latest release boundary passed at the given timestamp, or now."""
+    return get_generation(get_release_schedule(), at)
+
+
+def get_board_version(at=None):
+    """Return the version of the board which is current at the given timestamp, or now."""
+    mod_index, schedule, _ = get_board_state()
+    return mod_index + "_" + str(get_generation(schedule, at))
+
+
+def get_overlay_cache_key(team, version=None):
+    if version is None:
+        version = get_board_version()
+    if team is None:
+        return version + "categoryvs_no_team"
+    return version + "categoryvs_team_" + str(team.pk)
+
+
+def get_cache_key(user):
+    """Return the key of the board overlay for the user's team."""
+    return get_overlay_cache_key(user.team)
+
+
+def get_rendered_cache_keys(team, version=None):
+    """Return the keys of a team's rendered board ETag and body."""
+    key = get_overlay_cache_key(team, version)
+    return key + "_etag", key + "_body"
+
+
+def get_current_etag_key(team):
+    """Return the key of the ETag a team was last served, along with the board and counters versions it belongs to."""
+    return "board_current_etag_" + (str(team.pk) if team is not None else "no_team")
+
+
+def invalidate_team_overlay(team):
+    """Drop a team's board overlay after it solves a challenge or uses a hint."""
+    version = get_board_version()
+    caches["default"].delete_many(
+        [get_overlay_cache_key(team, version), *get_rendered_cache_keys(team, version), get_current_etag_key(team)]
+    )
+
+
+def get_base_cache_key(version=None):
+    if version is None:
+        version = get_board_version()
+    return version + "categoryvs_base"
+
+
+def get_challenge_cache_key(challenge_id, version=None):
+    if version is None:
+        version = get_board_version()
+    return version + "challenge_" + str(challenge_id)
+
+
+def get_challenge_queryset(now):
+    """Return the challenges annotated and prefetched for serializing the base board as it is at the given time."""
+    return (
+        Challenge.objects.annotate(
+            unlock_time_surpassed=Case(
+                When(release_time__lte=now, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            )
+        )
+        .prefetch_related(
+            Prefetch("hint_set", queryset=Hint.objects.annotate(used=Value(False)), to_attr="hints"),
+            Prefetch("file_set", queryset=File.objects.all(), to_attr="files"),
+            Prefetch(
+                "tag_set",
+                queryset=Tag.objects.all()
+                if now.timestamp() > config.get("end_time")
+                else Tag.objects.filter(post_competition=False),
+                to_attr="tags",
+            ),
+        )
+        .select_related("first_blood")
+    )
+
+
+def get_board_queryset(at=None):
+    """Return the categories released at the given timestamp, or now, prefetched for serializing the base board."""
+    now = timezone.now() if at is None else datetime.fromtimestamp(at, tz=dt_timezone.utc)
+    categories = Category.objects.filter(release_time__lte=now)
+    return categories.prefetch_related(
+        Prefetch("category_challenges", queryset=get_challenge_queryset(now), to_attr="challenges")
+    )
+
+
+def serialize_base_board(at=None):
+    """Serialize the team-agnostic board document as it is at the given timestamp, or now."""
+    return FastBoardCategorySerializer(get_board_queryset(at), many=True, context={"request": None}).data
+
+
+def get_base_board():
+    """Return the team-agnostic board document, serializing it if it isn't cached."""
+    cache = caches["default"]
+    key = get_base_cache_key()
+    board = cache.get(key)
+    if board is None or not config.get("enable_caching"):
+        board = serialize_base_board()
+        cache.set(key, board, 3600)
+    return board
+
+
+def build_team_overlay(team, board):
+    """Work out which challenges on the board a team has solved and unlocked, and which hints it has used."""
+    if team is None:
+        solves, hints_used = set(), set()
+    else:
+        solves = set(team.solves.filter(correct=True).values_list("challenge", flat=True))
+        hints_used = set(get_used_hint_ids(team))
+    unlocked = unlocks.get_unlocked_ids(
+        (
+            (challenge["id"], challenge["unlock_requirements"])
+            for category in board
+            for challenge in category["challenges"]
+        ),
+        unlocks.get_solve_bitset(solves),
+    )
+    return {"solved": solves, "unlocked": unlocked, "hints_used": hints_used}
+
+
+def get_team_overlay(user, board):
+    """Return the board overlay for the user's team, building it if it isn't cached."""
+    cache = caches["default"]
+    overlay = cache.get(get_cache_key(user))
+    if overlay is None or not config.get("enable_caching"):
+        overlay = build_team_overlay(user.team, board)
+        cache.set(get_cache_key(user), overlay, 3600)
+    return overlay
+
+
+def render_challenge(entry, overlay):
+    """Combine a challenge's base board entry with a team's overlay into the challenge sent to the client."""
+    if entry["id"] in overlay["unlocked"] and not entry["hidden"] and entry["unlock_time_surpassed"]:
+        challenge = dict(entry["unlocked"])
+        challenge["solved"] = entry["id"] in overlay["solved"]
+        challenge["hints"] = [dict(hint, used=hint["id"] in overlay["hints_used"]) for hint in challenge["hints"]]
+        return challenge
+    return dict(entry["locked"])
+
+
+def render_board(board, overlay):
+    """Combine the base board with a team's overlay into the categories sent to the client."""
+    categories = []
+    for base_category in board:
+        challenges = []
+        for entry in base_category["challenges"]:
+            challenges.append(render_challenge(entry, overlay))
+        category = dict(base_category)
+        category["challenges"] = challenges
+        categories.append(category)
+    return categories
+
+
+def serialize_base_challenge(challenge_id):
+    """Serialize the team-agnostic board entry of a single challenge, or return None if it doesn't exist."""
+    challenge = get_challenge_queryset(timezone.now()).filter(pk=challenge_id).first()
+    if challenge is None:
+        return None
+    # The counters are filled in when the challenge is rendered, so they don't need loading here.
+    context = {"request": None, "solve_counter": {}, "votes_positive_counter": {}, "votes_negative_counter": {}}
+    return FastBoardChallengeSerializer(challenge, context=context).data
+
+
+def get_base_challenge(challenge_id):
+    """Return the team-agnostic board entry of a single challenge, serializing it alone if it isn't cached."""
+    cache = caches["default"]
+    key = get_challenge_cache_key(challenge_id)
+    entry = cache.get(key)
+    if entry is None or not config.get("enable_caching"):
+        entry = serialize_base_challenge(challenge_id)
+        if entry is not None:
+            cache.set(key, entry, 3600)
+    return entry
+
+
+def get_challenge_overlay(team, entry):
+    """
+    Return a board overlay good enough to render a single challenge for a team.
+
+    The team's cached board overlay is used if there is one, otherwise only the given challenge's solved and unlocked
+    state is worked out, rather than the whole board's.
+    """
+    if config.get("enable_caching"):
+        overlay = caches["default"].get(get_overlay_cache_key(team))
+        if overlay is not None:
+            return overlay
+    if team is None:
+        bitset, hints_used = 0, frozenset()
+    else:
+        bitset, hints_used = unlocks.get_team_solve_bitset(team), get_used_hint_ids(team)
+    return {
+        "solved": {entry["id"]} if unlocks.is_solved(entry["id"], bitset) else set(),
+        "unlocked": {entry["id"]} if unlocks.requirements_met(entry["unlock_requirements"], bitset) else set(),
+        "hints_used": hints_used,
+    }
+
+
+def get_challenge(user, challenge_id):
+    """Return a single challenge as it appears on the user's board, or None if it doesn't exist."""
+    entry = get_base_challenge(challenge_id)
+    if entry is None:
+        return None
+    challenge = render_challenge(entry, get_challenge_overlay(getattr(user, "team", None), entry))
+    if "votes" in challenge:
+        challenge_counters = counters.get_single_challenge_counters(challenge_id)
+        challenge["votes"] = {
+            "positive": challenge_counters["positive_votes"],
+            "negative": challenge_counters["negative_votes"],
+        }
+        challenge["solve_count"] = challenge_counters["solves"]
+    return challenge
+
+
+def get_board(user):
+    """Return the rendered board for a non-staff user."""
+    board = get_base_board()
+    return render_board(board, get_team_overlay(user, board))
+
+
+def add_counters(categories):
+    """Fill in the vote and solve counts of every challenge on a serialized board."""
+    challenge_counters = counters.get_challenge_counters()
+    solve_counts = challenge_counters["solves"]
+    positive_votes = challenge_counters["positive_votes"]
+    negative_votes = challenge_counters["negative_votes"]
+    for category in categories:
+        for challenge in category["challenges"]:
+            challenge["votes"] = {
+                "positive": positive_votes.get(challenge["id"], 0),
+                "negative": negative_votes.get(challenge["id"], 0),
+            }
+            challenge["solve_count"] = solve_counts.get(challenge["id"], 0)
+    return categories
+
+
+def render_body(board, overlay):
+    """Render a board and overlay into a response body and its ETag."""
+    body = RACTFJSONRenderer().render({"s": True, "m": "", "d": add_counters(render_board(board, overlay))})
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"', body
+
+
+def get_cached_etag(etag_key):
+    """Return the ETag stored under a key if it was rendered against the current counters."""
+    if not config.get("enable_caching"):
+        return None
+    cached = caches["default"].get_many([etag_key, counters.VERSION_KEY])
+    if etag_key not in cached:
+        return None
+    etag, version = cached[etag_key]
+    if version != cached.get(counters.VERSION_KEY, 0):
+        return None
+    return etag
+
+
+def get_board_etag(user):
+    """
+    Return the client version of the board and the ETag of the user's current rendered board, from one cache lookup.
+
+    The ETag is None if the user's board isn't cached, or is out of date.
+    """
+    etag_key = get_current_etag_key(user.team)
+    mod_index, schedule, cached = get_board_state(changes.LATEST_KEY, counters.VERSION_KEY, etag_key)
+    generation = get_generation(schedule)
+    latest = cached.get(changes.LATEST_KEY)
+    client_version = f"{latest if latest is not None else changes.get_latest_change()}.{generation}"
+    current = cached.get(etag_key)
+    if not config.get("enable_caching") or current is None:
+        return client_version, None
+    board_version, counters_version, etag = current
+    if board_version != f"{mod_index}_{generation}" or counters_version != cached.get(counters.VERSION_KEY, 0):
+        return client_version, None
+    return client_version, etag
+
+
+def get_rendered_board(user):
+    """Return the ETag and response body of the user's board, rendering it if the cached copy is missing or stale."""
+    cache = caches["default"]
+    board_version = get_board_version()
+    counters_version = counters.get_counters_version()
+    etag_key, body_key = get_rendered_cache_keys(user.team, board_version)
+    etag = get_cached_etag(etag_key)
+    board = overlay = None
+    if etag is None:
+        board = get_base_board()
+        overlay = get_team_overlay(user, board)
+        if not overlay["solved"] and not overlay["hints_used"]:
+            etag_key, body_key = get_rendered_cache_keys(None, board_version)
+            etag = get_cached_etag(etag_key)
+    body = cache.get(body_key) if etag is not None else None
+    if body is None:
+        if board is None:
+            board = get_base_board()
+            overlay = get_team_overlay(user, board)
+        etag, body = render_body(board, overlay)
+        if config.get("enable_caching"):
+            cache.set_many({etag_key: (etag, counters_version), body_key: body}, 3600)
+    if config.get("enable_caching"):
+        cache.set(get_current_etag_key(user.team), (board_version, counters_version, etag), 3600)
+    return etag, body
+
+
+def get_client_version():
+    """Return the board version sent to clients, to be passed back to get_board_delta."""
+    return f"{changes.get_latest_change()}.{get_release_generation()}"
+
+
+def get_board_delta(user, since):
+    """
+    Return the parts of the user's board which changed since the given client version.
+
+    The delta has the same shape as the board, with only the changed challenges in each category, and only categories
+    which changed or contain a changed challenge. Challenges and categories which changed and are no longer on the
+    board are listed by id. Returns None if the version is invalid or too old, and the whole board has to be sent.
+    """
+    try:
+        change_id, generation = (int(part) for part in since.split("."))
+    except ValueError:
+        return None
+    version = get_client_version()
+    if generation != get_release_generation():
+        return None
+    changed = changes.get_changes_since(change_id)
+    if changed is None:
+        return None
+    challenge_ids, category_ids = changed
+
+    categories = []
+    present_challenges, present_categories = set(), set()
+    for category in get_board(user):
+        present_categories.add(category["id"])
+        challenges = []
+        for challenge in category["challenges"]:
+            present_challenges.add(challenge["id"])
+            if challenge["id"] in challenge_ids:
+                challenges.append(challenge)
+        if challenges or category["id"] in category_ids:
+            categories.append(dict(category, challenges=challenges))
+    return {
+        "version": version,
+        "categories": add_counters(categories),
+        "removed_challenges": sorted(challenge_ids - present_challenges),
+        "removed_categories": sorted(category_ids - present_categories),
+    }
@@ -0,0 +1,50 @@
+"""
+The log of edits to the challenge board.
+
+Every save or delete of a category, challenge, hint, file or tag is recorded against the category or challenge it
+belongs to, so a client which already has the board can be sent only the challenges and categories which changed
+since the version it has. Only the most recent CHANGE_LOG_LENGTH changes are kept, clients further behind than that
+have to refetch the whole board.
+"""
+
+from django.core.cache import caches
+from django.db import transaction
+
+from challenge.models import BoardChange
+
+CHANGE_LOG_LENGTH = 1000
+LATEST_KEY = "board_change_latest"
+
+
+def log_change(challenge_id=None, category_id=None):
+    """Record that a challenge or category changed."""
+    change = BoardChange.objects.create(challenge_id=challenge_id, category_id=category_id)
+    if change.id % 100 == 0:
+        BoardChange.objects.filter(id__lte=change.id - CHANGE_LOG_LENGTH).delete()
+    transaction.on_commit(lambda: caches["default"].set(LATEST_KEY, change.id, timeout=None))
+
+
+def get_latest_change():
+    """Return the id of the latest change, or 0 if nothing has changed."""
+    latest = caches["default"].get(LATEST_KEY)
+    if latest is None:
+        latest = BoardChange.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        caches["default"].set(LATEST_KEY, latest, timeout=None)
+    return latest
+
+
+def get_changes_since(change_id):
+    """
+    Return the sets of challenge ids and category ids changed after the given change.
+
+    Returns None if the given change is unknown, or changes after it have already been pruned from the log.
+    """
+    if change_id > get_latest_change():
+        return None
+    oldest = BoardChange.objects.order_by("id").values_list("id", flat=True).first()
+    if oldest is not None and change_id < oldest - 1:
+        return None
+    changes = BoardChange.objects.filter(id__gt=change_id).values_list("challenge_id", "category_id")
+    challenge_ids = {challenge_id for challenge_id, _ in changes if challenge_id is not None}
+    category_ids = {category_id for _, category_id in changes if category_id is not None}
+    return challenge_ids, category_ids
@@ -0,0 +1,151 @@
+"""
+Incrementally maintained per-challenge counters.
+
+Correct solves, incorrect solves and positive and negative votes are kept as one atomic counter per challenge in the
+cache, updated as solves and votes are made or deleted, instead of being aggregated from the solve and vote tables on
+every request. The counters are rebuilt from the tables the first time they are read after the cache is cleared, and
+can be reconciled at any time with the rebuild_challenge_counters management command.
+
+Rendered boards are cached against a version which changes with the counters the board shows. Incorrect solves aren't
+shown on the board, and far outnumber everything else, so they don't change it.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+
+from challenge.models import Challenge, ChallengeVote, Solve
+from config import config
+
+COUNTERS = ("solves", "incorrect_solves", "positive_votes", "negative_votes")
+BOARD_COUNTERS = ("solves", "positive_votes", "negative_votes")
+BUILT_KEY = "challenge_counters_built"
+VERSION_KEY = "challenge_counters_version"
+
+
+def get_counter_key(counter, challenge_id):
+    return f"challenge_counter_{counter}_{challenge_id}"
+
+
+def count_from_tables(challenge_ids=None):
+    """Aggregate every counter from the solve and vote tables, optionally for only the given challenges."""
+    counters = {counter: {} for counter in COUNTERS}
+    solves = Solve.objects.all()
+    votes = ChallengeVote.objects.all()
+    if challenge_ids is not None:
+        solves = solves.filter(challenge_id__in=challenge_ids)
+        votes = votes.filter(challenge_id__in=challenge_ids)
+    solves = solves.values("challenge").annotate(
+        correct_count=Count("id", filter=Q(correct=True)),
+        incorrect_count=Count("id", filter=Q(correct=False)),
+    )
+    for row in solves.order_by():
+        counters["solves"][row["challenge"]] = row["correct_count"]
+        counters["incorrect_solves"][row["challenge"]] = row["incorrect_count"]
+    if settings.BUFFER_INCORRECT_ATTEMPTS:
+        from challenge.attempts import get_pending_counts
+
+        if challenge_ids is None:
+            challenge_ids = Challenge.objects.values_list("id", flat=True)
+        for challenge_id, count in get_pending_counts(challenge_ids).items():
+            counters["incorrect_solves"][challenge_id] = counters["incorrect_solves"].get(challenge_id, 0) + count
+    votes = votes.values("challenge").annotate(
+        positive_count=Count("id", filter=Q(positive=True)),
+        negative_count=Count("id", filter=Q(positive=False)),
+    )
+    for row in votes.order_by():
+        counters["positive_votes"][row["challenge"]] = row["positive_count"]
+        counters["negative_votes"][row["challenge"]] = row["negative_count"]
+    return {counter: {pk: count for pk, count in values.items() if count} for counter, values in counters.items()}
+
+
+def rebuild_challenge_counters():
+    """Overwrite the stored counters with fresh aggregates from the tables."""
+    counters = count_from_tables()
+    challenge_ids = Challenge.objects.values_list("id", flat=True)
+    cache = caches["default"]
+    cache.set_many(
+        {
+            get_counter_key(counter, challenge_id): counters[counter].get(challenge_id, 0)
+            for counter in COUNTERS
+            for challenge_id in challenge_ids
+        },
+        timeout=None,
+    )
+    cache.set(BUILT_KEY, True, timeout=None)
+    _bump_version()
+    return counters
+
+
+def _bump_version():
+    cache = caches["default"]
+    cache.add(VERSION_KEY, 0, timeout=None)
+    cache.incr(VERSION_KEY)
+
+
+def get_counters_version():
+    """Return a number which changes whenever a counter on the board does, building the counters first if needed."""
+    cached = caches["default"].get_many([BUILT_KEY, VERSION_KEY])
+    if not cached.get(BUILT_KEY) and config.get("enable_caching"):
+        rebuild_challenge_counters()
+        return caches["default"].get(VERSION_KEY, 0)
+    return cached.get(VERSION_KEY, 0)
+
+
+def get_challenge_counters():
+    """
+    Return every counter as a dict of counter name to {challenge id: count}.
+
+    Challenges with a count of 0 are left out of each dict.
+    """
+    if not config.get("enable_caching"):
+        return count_from_tables()
+    cache = caches["default"]
+    if not cache.get(BUILT_KEY):
+        return rebuild_challenge_counters()
+    challenge_ids = Challenge.objects.values_list("id", flat=True)
+    keys = {
+        get_counter_key(counter, challenge_id): (counter, challenge_id)
+        for counter in COUNTERS
+        for challenge_id in challenge_ids
+    }
+    counters = {counter: {} for counter in COUNTERS}
+    for key, count in cache.get_many(keys.keys()).items():
+        if count:
+            counter, challenge_id = keys[key]
+            counters[counter][challenge_id] = count
+    return counters
+
+
+def get_single_challenge_counters(challenge_id):
+    """Return every counter of a single challenge as a dict of counter name to count."""
+    if not config.get("enable_caching"):
+        counters = count_from_tables([challenge_id])
+        return {counter: counters[counter].get(challenge_id, 0) for counter in COUNTERS}
+    cache = caches["default"]
+    if not cache.get(BUILT_KEY):
+        counters = rebuild_challenge_counters()
+        return {counter: counters[counter].get(challenge_id, 0) for counter in COUNTERS}
+    cached = cache.get_many([get_counter_key(counter, challenge_id) for counter in COUNTERS])
+    return {counter: cached.get(get_counter_key(counter, challenge_id)) or 0 for counter in COUNTERS}
+
+
+def _apply(counter, challenge_id, delta):
+    cache = caches["default"]
+    if not cache.get(BUILT_KEY):
+        return
+    key = get_counter_key(counter, challenge_id)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key, delta)
+    if counter in BOARD_COUNTERS:
+        _bump_version()
+
+
+def increment(counter, challenge_id, delta=1):
+    """Adjust a challenge's counter once the current transaction, if any, commits."""
+    transaction.on_commit(lambda: _apply(counter, challenge_id, delta))
+
+
+def decrement(counter, challenge_id, delta=1):
+    increment(counter, challenge_id, -delta)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenge', '0023_boardchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='flag_version',
+            field=models.IntegerField(default=0, editable=False, help_text='Bumped whenever the flag changes, so prepared flag checks are rebuilt.'),
+        ),
+    ]
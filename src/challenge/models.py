@@ -14,7 +14,6 @@ from django.db.models import (
     Value,
     When,
 )
-from django.db.models.aggregates import Count
 from django.db.models.query import Prefetch
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -22,6 +21,7 @@ from django.utils import timezone
 from django.utils.functional import cached_property
 from django_prometheus.models import ExportModelOperationsMixin
 
+from challenge import unlocks
 from config import config
 from member.models import Member
 from plugins import plugins
@@ -66,6 +66,17 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
         null=True,
         help_text="The dynamically updated score for this challenge, null if the challenge is statically scored."
     )
+    flag_version = models.IntegerField(
+        default=0, editable=False, help_text="Bumped whenever the flag changes, so prepared flag checks are rebuilt."
+    )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"flag_type", "flag_metadata"} & set(update_fields):
+            self.flag_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "flag_version"}
+        super().save(*args, **kwargs)
 
     def self_check(self):
         """Check the challenge doesn't have any configuration issues."""
@@ -87,6 +98,11 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
         if (self.flag_type == "lenient") ^ (self.challenge_type == "freeform"):
             issues.append({"issue": "lenient_freeform_mismatch", "challenge": self.pk})
 
+        try:
+            unlocks.validate_requirements(self.unlock_requirements)
+        except ValueError as e:
+            issues.append({"issue": "invalid_unlock_requirements", "extra": str(e), "challenge": self.pk})
+
         return issues
 
     @cached_property
@@ -100,6 +116,11 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
         return plugins.plugins["points"][self.points_type](self)
 
     def is_unlocked(self, user, solves=None):
+        """
+        Check whether the user's team has unlocked this challenge.
+
+        solves may be the team's solve bitset or an iterable of solved challenge ids, and is queried if not given.
+        """
         if user is None:
             return False
         if not user.is_authenticated:
@@ -108,33 +129,15 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
             return True
         if user.team is None:
             return False
-        if solves is None:
-            solves = list(user.team.solves.filter(correct=True).values_list("challenge", flat=True))
-        requirements = self.unlock_requirements
-        state = []
-        for i in requirements.split():
-            if i.isdigit():
-                state.append(int(i) in solves)
-            elif i == "OR":
-                if len(state) >= 2:
-                    a, b = state.pop(), state.pop()
-                    state.append(a or b)
-            elif i == "AND":
-                if len(state) >= 2:
-                    a, b = state.pop(), state.pop()
-                    state.append(a and b)
-        if not state:
-            return False
-        return state[0]
+        return unlocks.requirements_met(self.unlock_requirements, unlocks.as_solve_bitset(solves, user.team))
 
     def is_solved(self, user, solves=None):
+        """Check whether the user's team has solved this challenge, solves is as for is_unlocked."""
         if not user.is_authenticated:
             return False
         if user.team is None:
             return False
-        if solves is None:
-            solves = list(user.team.solves.filter(correct=True).values_list("challenge", flat=True))
-        return self.pk in solves
+        return unlocks.is_solved(self.pk, unlocks.as_solve_bitset(solves, user.team))
 
     def get_solve_count(self, solve_counter):
         return solve_counter.get(self.pk, 0)
@@ -145,7 +148,6 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
             return Challenge.objects.none()
         if user.team is not None:
             challenges = Challenge.objects.annotate(
-                solve_count=Count("solves", filter=Q(solves__correct=True)),
                 unlock_time_surpassed=Case(
                     When(release_time__lte=timezone.now(), then=Value(True)),
                     default=Value(False),
@@ -155,24 +157,21 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
         else:
             challenges = Challenge.objects.annotate(
                 solved=Value(False, models.BooleanField()),
-                solve_count=Count("solves", distinct=True),
                 unlock_time_surpassed=Case(
                     When(release_time__lte=timezone.now(), then=Value(True)),
                     default=Value(False),
                     output_field=models.BooleanField(),
                 ),
             )
-        from hint.models import Hint, HintUse
+        from hint.models import Hint
+        from hint.usage import get_used_hint_ids
 
         x = challenges.prefetch_related(
             Prefetch(
                 "hint_set",
                 queryset=Hint.objects.annotate(
                     used=Case(
-                        When(
-                            id__in=HintUse.objects.filter(team=user.team).values_list("hint_id"),
-                            then=Value(True),
-                        ),
+                        When(id__in=get_used_hint_ids(user.team), then=Value(True)),
                         default=Value(False),
                         output_field=models.BooleanField(),
                     )
@@ -188,7 +187,6 @@ class Challenge(ExportModelOperationsMixin("challenge"), models.Model):
                 to_attr="tags",
             ),
             "first_blood",
-            "hint_set__uses",
         )
         return x
 
@@ -281,3 +279,16 @@ class Tag(ExportModelOperationsMixin("tag"), models.Model):
     text = models.CharField(max_length=255)
     type = models.CharField(max_length=255)
     post_competition = models.BooleanField(default=False)
+
+
+class BoardChange(models.Model):
+    """
+    A record of an edit to a challenge, or to one of its hints, files or tags, or to a category.
+
+    The ids aren't foreign keys so that deletions are logged too. The id of the latest change is used as the board
+    version clients send back to only fetch what changed since.
+    """
+
+    challenge_id = models.IntegerField(null=True)
+    category_id = models.IntegerField(null=True)
+    timestamp = models.DateTimeField(default=timezone.now)
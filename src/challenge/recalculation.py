@@ -0,0 +1,96 @@
+"""
+Coalesced recalculation of challenges whose points change as they're solved.
+
+With COALESCE_SCORE_RECALCULATION set, a correct solve on a decaying challenge only scores the new solve at the
+challenge's current value, instead of rewriting the score of every earlier solve while the team is locked. The
+recalculate_challenges management command then brings each such challenge up to date in a single pass every
+SCORE_RECALCULATION_INTERVAL seconds, so the leaderboard lags by at most about that long.
+
+A challenge is due a pass whenever its current_score differs from the points its solve count is worth, so a burst of
+solves costs one pass however many there were. A pass only touches the scores whose points actually change, and
+adjusts the totals of the teams and users they belong to in place with F() expressions, so it can't lose points
+scored concurrently and doesn't need to lock them.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from challenge.board import invalidate_challenge
+from challenge.counters import get_challenge_counters
+from challenge.models import Challenge, Score, Solve
+from leaderboard.ranking import refresh_on_commit
+from leaderboard.snapshots import invalidate_on_commit
+from leaderboard.timeline import drop_on_commit
+from member.models import Member
+from plugins.plugins import plugins
+
+
+def get_recalculated_challenges():
+    """Return every challenge whose points are recalculated as it's solved."""
+    points_types = [name for name, plugin in plugins["points"].items() if plugin.recalculate_type != "none"]
+    return Challenge.objects.filter(points_type__in=points_types)
+
+
+def get_due_challenges():
+    """Return the recalculated challenges whose current_score doesn't match their number of solves."""
+    solves = get_challenge_counters()["solves"]
+    due = []
+    for challenge in get_recalculated_challenges():
+        current = challenge.score if challenge.current_score is None else challenge.current_score
+        if challenge.points_plugin.get_points(None, None, solves.get(challenge.pk, 0)) != current:
+            due.append(challenge)
+    return due
+
+
+def recalculate_challenge(challenge):
+    """Bring every score of a challenge, and the totals they count towards, up to date. Returns the new points."""
+    from team.models import Team
+
+    with transaction.atomic():
+        solves = Solve.objects.filter(challenge=challenge, correct=True)
+        points = challenge.points_plugin.get_points(None, None, solves.count())
+        changed = (
+            Score.objects.select_for_update()
+            .filter(id__in=solves.values("score"))
+            .exclude(points=points)
+            .values_list("id", "points", "leaderboard", "team_id", "user_id")
+        )
+
+        # Every team and user has at most one score per challenge, so their totals can be adjusted by groups which
+        # changed by the same amount.
+        groups = defaultdict(lambda: ([], [], []))
+        for score_id, old_points, leaderboard, team_id, user_id in changed:
+            score_ids, team_ids, user_ids = groups[(points - old_points, leaderboard)]
+            score_ids.append(score_id)
+            if team_id is not None:
+                team_ids.append(team_id)
+            if user_id is not None:
+                user_ids.append(user_id)
+
+        if groups:
+            invalidate_on_commit()
+        for (delta, leaderboard), (score_ids, team_ids, user_ids) in groups.items():
+            Score.objects.filter(id__in=score_ids).update(points=points)
+            updates = {"points": F("points") + delta}
+            if leaderboard:
+                updates["leaderboard_points"] = F("leaderboard_points") + delta
+                refresh_on_commit(team_ids=team_ids, user_ids=user_ids)
+                drop_on_commit(team_ids=team_ids, user_ids=user_ids)
+            Team.objects.filter(id__in=team_ids).update(**updates)
+            Member.objects.filter(id__in=user_ids).update(**updates)
+
+        # Updated in place rather than saved, since saving a challenge rewrites every one of its scores.
+        Challenge.objects.filter(pk=challenge.pk).update(current_score=points)
+        challenge.current_score = points
+        invalidate_challenge(challenge.pk)
+    return points
+
+
+def recalculate_due_challenges():
+    """Recalculate every challenge which is due, returning them."""
+    due = get_due_challenges()
+    for challenge in due:
+        recalculate_challenge(challenge)
+    return due
@@ -1,6 +1,8 @@
 import serpy
 from rest_framework import serializers
 
+from backend.serpy_compiler import CompiledSerializer
+from challenge import unlocks
 from challenge.models import (
     Category,
     Challenge,
@@ -10,28 +12,23 @@ from challenge.models import (
     Solve,
     Tag,
 )
-from challenge.sql import get_negative_votes, get_positive_votes, get_solve_counts
+from challenge.counters import get_challenge_counters
 from hint.serializers import FastHintSerializer
 
 
 def setup_context(context):
+    counters = get_challenge_counters()
     context.update(
         {
             "request": context["request"],
-            "solve_counter": get_solve_counts(),
-            "votes_positive_counter": get_positive_votes(),
-            "votes_negative_counter": get_negative_votes(),
+            "solve_counter": counters["solves"],
+            "votes_positive_counter": counters["positive_votes"],
+            "votes_negative_counter": counters["negative_votes"],
         }
     )
     if context["request"] and context["request"].user is not None:
         if context["request"].user.team is not None:
-            context.update(
-                {
-                    "solves": list(
-                        context["request"].user.team.solves.filter(correct=True).values_list("challenge", flat=True)
-                    ),
-                }
-            )
+            context.update({"solves": unlocks.get_team_solve_bitset(context["request"].user.team)})
 
 
 class ForeignAttributeField(serpy.Field):
@@ -67,7 +64,7 @@ class FileSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "url", "size", "challenge", "md5"]
 
 
-class FastFileSerializer(serpy.Serializer):
+class FastFileSerializer(CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     url = serpy.StrField()
@@ -76,32 +73,43 @@ class FastFileSerializer(serpy.Serializer):
     challenge = ForeignAttributeField()
 
 
-class FastNestedTagSerializer(serpy.Serializer):
+class FastNestedTagSerializer(CompiledSerializer):
     text = serpy.StrField()
     type = serpy.StrField()
 
 
 class ChallengeSerializerMixin:
+    def bind_context(self, context):
+        """Set the context up, unless a parent serializer already has, and keep the parts read for every challenge."""
+        if "solve_counter" not in context:
+            setup_context(context)
+        self.context = context
+        self.user = context["request"].user if context["request"] else None
+        self.solves = context.get("solves", None)
+        self.solve_counter = context["solve_counter"]
+        self.votes_positive_counter = context["votes_positive_counter"]
+        self.votes_negative_counter = context["votes_negative_counter"]
+
     def get_unlocked(self, instance):
         if not getattr(instance, "unlocked", None):
-            return instance.is_unlocked(self.context["request"].user, solves=self.context.get("solves", None))
+            return instance.is_unlocked(self.user, solves=self.solves)
         return instance.unlocked
 
     def get_solved(self, instance):
         if not getattr(instance, "solved", None):
-            return instance.is_solved(self.context["request"].user, solves=self.context.get("solves", None))
+            return instance.is_solved(self.user, solves=self.solves)
         return instance.solved
 
     def get_solve_count(self, instance):
-        return instance.get_solve_count(self.context.get("solve_counter", None))
+        return instance.get_solve_count(self.solve_counter)
 
     def get_unlock_time_surpassed(self, instance):
         return instance.unlock_time_surpassed
 
     def get_votes(self, instance):
         return {
-            "positive": self.context["votes_positive_counter"].get(instance.pk, 0),
-            "negative": self.context["votes_negative_counter"].get(instance.pk, 0),
+            "positive": self.votes_positive_counter.get(instance.pk, 0),
+            "negative": self.votes_negative_counter.get(instance.pk, 0),
         }
 
     def get_post_score_explanation(self, instance):
@@ -110,7 +118,7 @@ class ChallengeSerializerMixin:
         return None
 
 
-class FastLockedChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
+class FastLockedChallengeSerializer(ChallengeSerializerMixin, CompiledSerializer):
     id = serpy.IntField()
     unlock_requirements = serpy.StrField()
     challenge_metadata = serpy.Field()
@@ -120,11 +128,13 @@ class FastLockedChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
 
     def serialize(self, instance):
         serialized = self._serialize(instance, self._compiled_fields)
-        serialized["challenge_metadata"].pop("cserv_name", None)
+        serialized["challenge_metadata"] = {
+            key: value for key, value in serialized["challenge_metadata"].items() if key != "cserv_name"
+        }
         return serialized
 
 
-class FastChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
+class FastChallengeSerializer(ChallengeSerializerMixin, CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     description = serpy.StrField()
@@ -155,20 +165,48 @@ class FastChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
         super().__init__(*args, **kwargs)
 
         if "context" in kwargs:
-            self.context = kwargs["context"]
-            setup_context(self.context)
+            self.bind_context(kwargs["context"])
+        self.locked_serializer = FastLockedChallengeSerializer()
 
     def _serialize(self, instance, fields):
         if (
-            instance.is_unlocked(self.context["request"].user, solves=self.context.get("solves", None))
+            instance.is_unlocked(self.user, solves=self.solves)
             and not instance.hidden
             and instance.unlock_time_surpassed
         ):
             return super(FastChallengeSerializer, self)._serialize(instance, fields)
-        return FastLockedChallengeSerializer(instance).serialize(instance)
+        return self.locked_serializer.serialize(instance)
+
+
+class FastBoardChallengeSerializer(FastChallengeSerializer):
+    """
+    Serialize a challenge without reference to the requesting team.
+
+    Both the unlocked and locked representations are kept, the team-specific fields are filled in from the team's
+    board overlay when the board is rendered.
+    """
 
+    def get_solved(self, instance):
+        return False
+
+    def get_unlocked(self, instance):
+        return True
 
-class FastCategorySerializer(serpy.Serializer):
+    def get_post_score_explanation(self, instance):
+        return instance.post_score_explanation
+
+    def _serialize(self, instance, fields):
+        return {
+            "id": instance.pk,
+            "hidden": instance.hidden,
+            "unlock_time_surpassed": instance.unlock_time_surpassed,
+            "unlock_requirements": instance.unlock_requirements,
+            "unlocked": CompiledSerializer._serialize(self, instance, fields),
+            "locked": self.locked_serializer.serialize(instance),
+        }
+
+
+class FastCategorySerializer(CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     display_order = serpy.StrField()
@@ -181,14 +219,21 @@ class FastCategorySerializer(serpy.Serializer):
         model = Category
         fields = ["id", "name", "display_order", "contained_type", "description", "metadata", "challenges"]
 
+    challenge_serializer_class = FastChallengeSerializer
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if "context" in kwargs:
             self.context = kwargs["context"]
             setup_context(self.context)
+            self.challenge_serializer = self.challenge_serializer_class(many=True, context=self.context)
 
     def get_challenges(self, instance):
-        return FastChallengeSerializer(instance.challenges, many=True, context=self.context).data
+        return self.challenge_serializer.to_value(instance.challenges)
+
+
+class FastBoardCategorySerializer(FastCategorySerializer):
+    challenge_serializer_class = FastBoardChallengeSerializer
 
 
 class ChallengeFeedbackSerializer(serializers.ModelSerializer):
@@ -207,7 +252,7 @@ class CreateCategorySerializer(serializers.ModelSerializer):
         return Category.objects.create(**validated_data, display_order=Category.objects.count())
 
 
-class FastAdminChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
+class FastAdminChallengeSerializer(ChallengeSerializerMixin, CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     description = serpy.StrField()
@@ -237,19 +282,7 @@ class FastAdminChallengeSerializer(ChallengeSerializerMixin, serpy.Serializer):
     def __init__(self, *args, **kwargs):
         super(FastAdminChallengeSerializer, self).__init__(*args, **kwargs)
         if "context" in kwargs:
-            self.context = kwargs["context"]
-            if "solve_counter" not in self.context:
-                setup_context(self.context)
-
-    def serialize(self, instance):
-        return super(
-            FastAdminChallengeSerializer, FastAdminChallengeSerializer(instance, context=self.context)
-        ).to_value(instance)
-
-    def to_value(self, instance):
-        if self.many:
-            return [self.serialize(o) for o in instance]
-        return self.serialize(instance)
+            self.bind_context(kwargs["context"])
 
 
 class CreateChallengeSerializer(serializers.ModelSerializer):
@@ -279,6 +312,13 @@ class CreateChallengeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
+    def validate_unlock_requirements(self, value):
+        try:
+            unlocks.validate_requirements(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
     def create(self, validated_data):
         tags = validated_data.pop("tags", [])
         challenge = Challenge.objects.create(**validated_data)
@@ -295,7 +335,7 @@ class CreateChallengeSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class FastAdminCategorySerializer(serpy.Serializer):
+class FastAdminCategorySerializer(CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     display_order = serpy.StrField()
@@ -309,9 +349,10 @@ class FastAdminCategorySerializer(serpy.Serializer):
         if "context" in kwargs:
             self.context = kwargs["context"]
             setup_context(self.context)
+            self.challenge_serializer = FastAdminChallengeSerializer(many=True, context=self.context)
 
     def get_challenges(self, instance):
-        return FastAdminChallengeSerializer(instance.challenges, many=True, context=self.context).data
+        return self.challenge_serializer.to_value(instance.challenges)
 
 
 class AdminScoreSerializer(serializers.ModelSerializer):
@@ -1,12 +1,17 @@
-from django.core.cache import caches
 from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from challenge.models import Category, Challenge, File, Score, Tag
-from challenge.views import get_cache_key
+from challenge import changes, counters
+from challenge.attempts import record_attempt
+from challenge.board import bump_mod_index, invalidate_team_overlay
+from challenge.models import Category, Challenge, ChallengeVote, File, Score, Solve, Tag
 from hint.models import Hint, HintUse
-from scorerecalculator.views import recalculate_team
+from hint.usage import invalidate_used_hints
+from leaderboard.snapshots import invalidate_on_commit
+from leaderboard.timeline import drop_on_commit
+from plugins.flag.base import clear_prepared
+from scorerecalculator.totals import recalculate_teams, recalculate_users
 
 
 @receiver([post_save, post_delete], sender=Challenge)
@@ -15,25 +20,58 @@ from scorerecalculator.views import recalculate_team
 @receiver([post_save, post_delete], sender=File)
 @receiver([post_save, post_delete], sender=Tag)
 def challenge_cache_invalidate(sender, instance, **kwargs):
-    new_index = caches["default"].get("challenge_mod_index", 0) + 1
-    caches["default"].set("challenge_mod_index", new_index, timeout=None)
+    bump_mod_index()
+    if sender is Category:
+        changes.log_change(category_id=instance.pk)
+    elif sender is Challenge:
+        changes.log_change(challenge_id=instance.pk)
+        clear_prepared(instance.pk)
+    else:
+        changes.log_change(challenge_id=instance.challenge_id)
 
 
 @receiver([post_save], sender=Challenge)
 def challenge_recalculate(sender, instance, **kwargs):
     with transaction.atomic():
         correct_solves = instance.solves.filter(correct=True)
-        if instance.current_score is None:
-            Score.objects.filter(id__in=correct_solves.values_list("score", flat=True)).update(points=instance.score)
-            for solve in correct_solves:
-                recalculate_team(solve.team)
-        else:
-            Score.objects.filter(id__in=correct_solves.values_list("score", flat=True))\
-                .update(points=instance.current_score)
-            for solve in correct_solves:
-                recalculate_team(solve.team)
+        solvers = list(correct_solves.values_list("team_id", "solved_by_id"))
+        team_ids, user_ids = [team for team, _ in solvers], [user for _, user in solvers]
+        drop_on_commit(team_ids=team_ids, user_ids=user_ids)
+        if solvers:
+            invalidate_on_commit()
+        points = instance.score if instance.current_score is None else instance.current_score
+        Score.objects.filter(id__in=correct_solves.values_list("score", flat=True)).update(points=points)
+        recalculate_teams([team for team in team_ids if team is not None])
+        recalculate_users([user for user in user_ids if user is not None])
 
 
 @receiver([post_save, post_delete], sender=HintUse)
 def team_cache_invalidate(sender, instance: HintUse, **kwargs):
-    caches["default"].delete(get_cache_key(instance.user))
+    invalidate_team_overlay(instance.team)
+    invalidate_used_hints(instance.team)
+
+
+@receiver(post_save, sender=Solve)
+def solve_counter_increment(sender, instance: Solve, created, **kwargs):
+    if created:
+        counters.increment("solves" if instance.correct else "incorrect_solves", instance.challenge_id)
+        if instance.team_id is not None:
+            record_attempt(instance.challenge_id, instance.team_id)
+
+
+@receiver(post_delete, sender=Solve)
+def solve_counter_decrement(sender, instance: Solve, **kwargs):
+    counters.decrement("solves" if instance.correct else "incorrect_solves", instance.challenge_id)
+    if instance.team_id is not None:
+        record_attempt(instance.challenge_id, instance.team_id, -1)
+
+
+@receiver(post_save, sender=ChallengeVote)
+def vote_counter_increment(sender, instance: ChallengeVote, created, **kwargs):
+    if created:
+        counters.increment("positive_votes" if instance.positive else "negative_votes", instance.challenge_id)
+
+
+@receiver(post_delete, sender=ChallengeVote)
+def vote_counter_decrement(sender, instance: ChallengeVote, **kwargs):
+    counters.decrement("positive_votes" if instance.positive else "negative_votes", instance.challenge_id)
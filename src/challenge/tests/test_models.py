@@ -104,6 +104,11 @@ class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
         checks = challenge.self_check()
         self.assertNotIn("lenient_freeform_mismatch", [check["issue"] for check in checks])
 
+    def test_invalid_unlock_requirements(self):
+        self.challenge2.unlock_requirements = "1 OR"
+        checks = self.challenge2.self_check()
+        self.assertIn("invalid_unlock_requirements", [check["issue"] for check in checks])
+
     def test_is_unlocked_null_user(self):
         self.assertEqual(self.challenge2.is_unlocked(None), False)
 
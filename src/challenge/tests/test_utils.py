@@ -1,16 +1,32 @@
+from datetime import timedelta
 from unittest import TestCase
 
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
-from challenge.models import File, get_file_name
+from challenge.attempts import flush_incorrect_attempts, get_attempt_key, get_pending_attempts, get_pending_key
+from challenge.counters import count_from_tables, get_challenge_counters, rebuild_challenge_counters
+from challenge.recalculation import get_due_challenges, recalculate_due_challenges
+from challenge.models import Category, ChallengeVote, File, Solve, get_file_name
 from challenge.sql import get_negative_votes, get_positive_votes
 from challenge.tests.mixins import ChallengeSetupMixin
-from challenge.views import get_cache_key
+from challenge.unlocks import (
+    compile_requirements,
+    get_solve_bitset,
+    get_unlocked_ids,
+    requirements_met,
+    validate_requirements,
+)
+from challenge.board import get_base_cache_key, get_board_version, get_cache_key
+from challenge.warmup import get_next_release, warm_board
 from config import config
 from member.models import Member
 
 
-class CacheKeyTestCase(TestCase):
+class CacheKeyTestCase(APITestCase):
     def test_get_cache_key_no_team(self):
         user = Member(username="cachekeytest", email="cachekeytest@example.com")
         self.assertTrue(get_cache_key(user).endswith("no_team"))
@@ -32,6 +48,74 @@ class SqlTestCase(APITestCase):
         self.assertEqual(first, second)
 
 
+class CountersTestCase(ChallengeSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        config.set("enable_caching", True)
+        rebuild_challenge_counters()
+
+    def tearDown(self):
+        config.set("enable_caching", False)
+
+    def test_counters_incremented_on_solve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Solve.objects.create(team=self.team, solved_by=self.user, challenge=self.challenge1, correct=True)
+            Solve.objects.create(team=self.team2, solved_by=self.user3, challenge=self.challenge1, correct=False)
+        counters = get_challenge_counters()
+        self.assertEqual(counters["solves"], {self.challenge1.pk: 1})
+        self.assertEqual(counters["incorrect_solves"], {self.challenge1.pk: 1})
+
+    def test_counters_decremented_on_solve_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            solve = Solve.objects.create(team=self.team, solved_by=self.user, challenge=self.challenge1, correct=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            solve.delete()
+        self.assertEqual(get_challenge_counters()["solves"], {})
+
+    def test_counters_follow_changed_vote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ChallengeVote.objects.create(user=self.user, challenge=self.challenge1, positive=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            ChallengeVote.objects.filter(user=self.user, challenge=self.challenge1).delete()
+            ChallengeVote.objects.create(user=self.user, challenge=self.challenge1, positive=False)
+        counters = get_challenge_counters()
+        self.assertEqual(counters["positive_votes"], {})
+        self.assertEqual(counters["negative_votes"], {self.challenge1.pk: 1})
+
+    def test_rebuild_matches_tables(self):
+        Solve.objects.create(team=self.team, solved_by=self.user, challenge=self.challenge2, correct=True)
+        self.assertEqual(get_challenge_counters()["solves"], {})
+        rebuild_challenge_counters()
+        self.assertEqual(get_challenge_counters()["solves"], {self.challenge2.pk: 1})
+
+
+class WarmupTestCase(ChallengeSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        config.set("enable_caching", True)
+        self.release_time = timezone.now() + timedelta(minutes=5)
+        self.category2 = Category.objects.create(
+            name="later", display_order=1, contained_type="test", description="", release_time=self.release_time
+        )
+
+    def tearDown(self):
+        config.set("enable_caching", False)
+
+    def test_next_release(self):
+        self.assertEqual(get_next_release(), min(self.release_time.timestamp(), config.get("end_time")))
+
+    def test_board_version_changes_at_release(self):
+        at = self.release_time.timestamp()
+        self.assertNotEqual(get_board_version(), get_board_version(at))
+        self.assertEqual(get_board_version(at), get_board_version(at + 1))
+
+    def test_warm_board_ahead_of_release(self):
+        version = warm_board(self.release_time.timestamp())
+        board = caches["default"].get(get_base_cache_key(version))
+        self.assertIn("later", [category["name"] for category in board])
+        self.assertNotIn("later", [category["name"] for category in caches["default"].get(get_base_cache_key()) or []])
+
+
 class FileTestCase(ChallengeSetupMixin, APITestCase):
 
     def test_get_filename(self):
@@ -39,3 +123,122 @@ class FileTestCase(ChallengeSetupMixin, APITestCase):
         file = File(challenge=self.challenge1, md5=md5)
         self.assertEqual(get_file_name(file, "filename"), f"{self.challenge1.pk}/{md5}/filename")
 
+
+
+class UnlockRequirementsTestCase(TestCase):
+    def test_compiled_requirements_cached(self):
+        self.assertIs(compile_requirements("1 2 OR"), compile_requirements("1 2 OR"))
+
+    def test_requirements_met_nested(self):
+        self.assertTrue(requirements_met("1 2 OR 3 AND", get_solve_bitset([2, 3])))
+        self.assertFalse(requirements_met("1 2 OR 3 AND", get_solve_bitset([1, 2])))
+
+    def test_requirements_met_empty(self):
+        self.assertTrue(requirements_met("", 0))
+        self.assertTrue(requirements_met(None, 0))
+
+    def test_requirements_met_large_id(self):
+        self.assertTrue(requirements_met("100000", get_solve_bitset([100000])))
+
+    def test_get_unlocked_ids(self):
+        requirements = [(1, ""), (2, "1"), (3, "1 2 AND"), (4, "5")]
+        self.assertEqual(get_unlocked_ids(requirements, get_solve_bitset([1])), {1, 2})
+
+    def test_validate_requirements_valid(self):
+        self.assertIsNone(validate_requirements("1 2 OR 3 AND"))
+
+    def test_validate_requirements_unknown_token(self):
+        self.assertRaises(ValueError, lambda: validate_requirements("1 2 XOR"))
+
+    def test_validate_requirements_missing_operand(self):
+        self.assertRaises(ValueError, lambda: validate_requirements("1 AND"))
+
+    def test_validate_requirements_missing_operator(self):
+        self.assertRaises(ValueError, lambda: validate_requirements("1 2"))
+
+
+@override_settings(
+    BUFFER_INCORRECT_ATTEMPTS=True, INCORRECT_ATTEMPT_FLUSH_SIZE=1000, INCORRECT_ATTEMPT_FLUSH_INTERVAL=3600
+)
+class IncorrectAttemptBufferTestCase(ChallengeSetupMixin, APITestCase):
+    def tearDown(self):
+        flush_incorrect_attempts()
+        caches["default"].delete_many(
+            [
+                get_pending_key(self.challenge2.pk),
+                get_pending_key(self.challenge2.pk, self.team.pk),
+                get_attempt_key(self.challenge2.pk, self.team.pk),
+            ]
+        )
+
+    def submit_incorrect(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("submit-flag"), {"flag": "ractf{b}", "challenge": self.challenge2.pk})
+
+    def test_incorrect_attempt_buffered(self):
+        self.submit_incorrect()
+        self.assertFalse(Solve.objects.filter(correct=False).exists())
+        self.assertEqual(get_pending_attempts(self.challenge2, self.team), 1)
+
+    def test_flush(self):
+        self.submit_incorrect()
+        self.submit_incorrect()
+        self.assertEqual(flush_incorrect_attempts(), 2)
+        self.assertEqual(Solve.objects.filter(team=self.team, challenge=self.challenge2, correct=False).count(), 2)
+        self.assertEqual(get_pending_attempts(self.challenge2, self.team), 0)
+
+    @override_settings(INCORRECT_ATTEMPT_FLUSH_SIZE=2)
+    def test_flush_when_full(self):
+        self.submit_incorrect()
+        self.submit_incorrect()
+        self.assertEqual(Solve.objects.filter(correct=False).count(), 2)
+
+    def test_attempt_limit_counts_buffered(self):
+        self.challenge2.challenge_metadata = {"attempt_limit": 1}
+        self.challenge2.save()
+        self.submit_incorrect()
+        self.submit_incorrect()
+        response = self.submit_incorrect()
+        self.assertEqual(response.data["m"], "attempt_limit_reached")
+
+    def test_count_from_tables_counts_buffered(self):
+        self.submit_incorrect()
+        self.assertEqual(count_from_tables()["incorrect_solves"][self.challenge2.pk], 1)
+        flush_incorrect_attempts()
+        self.assertEqual(count_from_tables()["incorrect_solves"][self.challenge2.pk], 1)
+
+
+@override_settings(COALESCE_SCORE_RECALCULATION=True)
+class RecalculationTestCase(ChallengeSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.challenge2.points_type = "decay"
+        self.challenge2.flag_metadata.update(decay_constant=0.5, min_points=50)
+        self.challenge2.save()
+        self.solve_challenge(self.user)
+        self.solve_challenge(self.user3)
+        rebuild_challenge_counters()
+
+    def test_solve_not_recalculated(self):
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, 1000)
+        self.assertEqual(get_due_challenges(), [self.challenge2])
+
+    def test_recalculate_due(self):
+        recalculate_due_challenges()
+        self.user.refresh_from_db()
+        self.team2.refresh_from_db()
+        self.challenge2.refresh_from_db()
+        self.assertEqual(self.user.points, 525)
+        self.assertEqual(self.team2.leaderboard_points, 525)
+        self.assertEqual(self.challenge2.current_score, 525)
+        self.assertEqual(get_due_challenges(), [])
+
+    def test_recalculate_coalesced(self):
+        self.solve_challenge(self.admin_user)
+        rebuild_challenge_counters()
+        with self.assertNumQueries(13):
+            recalculate_due_challenges()
+        self.admin_user.refresh_from_db()
+        self.assertEqual(self.admin_user.points, 288)
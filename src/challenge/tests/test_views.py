@@ -1,4 +1,5 @@
 import time
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
@@ -11,15 +12,26 @@ from rest_framework.status import (
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
     HTTP_403_FORBIDDEN,
+    HTTP_404_NOT_FOUND,
     HTTP_204_NO_CONTENT,
+    HTTP_304_NOT_MODIFIED,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 from rest_framework.test import APITestCase
 
+from challenge.attempts import get_attempt_key, get_reservation_key
+from challenge.board import get_cached_etag, get_challenge_cache_key, get_rendered_cache_keys
+from challenge.changes import LATEST_KEY
+from challenge.counters import rebuild_challenge_counters
 from challenge.models import Solve, ChallengeVote, ChallengeFeedback, Tag
 from challenge.tests.mixins import ChallengeSetupMixin
+from challenge.warmup import warm_board
 from config import config
 from hint.models import HintUse
+from hint.usage import invalidate_used_hints
 from member.models import Member
+from notifications.models import Notification
+from plugins.flag.executor import FlagCheckTimeout
 
 
 class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
@@ -58,6 +70,20 @@ class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
         response = self.client.post(reverse("submit-flag"), data)
         self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
 
+    def test_solve_challenge_not_unlocked_not_checked(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch("challenge.views.check_flag") as check:
+            response = self.client.post(reverse("submit-flag"), {"flag": "ractf{a}", "challenge": self.challenge3.pk})
+        self.assertEqual(response.data["m"], "challenge_not_unlocked")
+        check.assert_not_called()
+
+    def test_solve_challenge_already_solved_not_checked(self):
+        self.solve_challenge()
+        with mock.patch("challenge.views.check_flag") as check:
+            response = self.client.post(reverse("submit-flag"), {"flag": "ractf{a}", "challenge": self.challenge2.pk})
+        self.assertEqual(response.data["m"], "already_solved_challenge")
+        check.assert_not_called()
+
     def test_solve_challenge_attempt_limit_reached(self):
         self.client.force_authenticate(user=self.user)
         self.challenge2.challenge_metadata = {"attempt_limit": -1}
@@ -69,6 +95,7 @@ class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
         response = self.client.post(reverse("submit-flag"), data)
         self.challenge2.challenge_metadata = {}
         self.challenge2.save()
+        caches["default"].delete(get_attempt_key(self.challenge2.pk, self.team.pk))
         self.assertEqual(response.data["m"], "attempt_limit_reached")
 
     def test_solve_challenge_attempt_limit_not_reached(self):
@@ -82,8 +109,26 @@ class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
         response = self.client.post(reverse("submit-flag"), data)
         self.challenge2.challenge_metadata = {}
         self.challenge2.save()
+        caches["default"].delete(get_attempt_key(self.challenge2.pk, self.team.pk))
         self.assertNotEqual(response.data["m"], "attempt_limit_reached")
 
+    def test_solve_challenge_attempt_limit_checked_before_locking(self):
+        self.challenge2.challenge_metadata = {"attempt_limit": 1}
+        self.challenge2.save()
+        caches["default"].set(get_attempt_key(self.challenge2.pk, self.team.pk), 2)
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse("submit-flag"), {"flag": "ractf{a}", "challenge": self.challenge2.pk})
+        caches["default"].delete(get_attempt_key(self.challenge2.pk, self.team.pk))
+        self.assertEqual(response.data["m"], "attempt_limit_reached")
+
+    def test_solve_challenge_flag_check_timeout(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch("challenge.views.check_flag", side_effect=FlagCheckTimeout("cpu")):
+            response = self.client.post(reverse("submit-flag"), {"flag": "ractf{a}", "challenge": self.challenge2.pk})
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Solve.objects.filter(challenge=self.challenge2).exists())
+
     def test_solve_challenge_with_explanation(self):
         self.client.force_authenticate(user=self.user)
         self.challenge2.post_score_explanation = "test"
@@ -119,6 +164,22 @@ class ChallengeTestCase(ChallengeSetupMixin, APITestCase):
         response = self.client.get(reverse("team-self"))
         self.assertEqual(response.data["solves"][0]["first_blood"], True)
 
+    def test_solve_first_blood_on_cached_board(self):
+        self.client.force_authenticate(user=self.user)
+        config.set("enable_caching", True)
+        self.client.get(reverse("categories-list"))
+        self.solve_challenge()
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertEqual(self.find_challenge_entry(self.challenge2, data=response.json())["first_blood"], "challenge-test")
+
+    def test_solve_first_blood_queues_notification(self):
+        config.set("notification_sinks", [{"type": "stub"}])
+        self.solve_challenge()
+        self.solve_challenge(user=self.user3)
+        config.set("notification_sinks", [])
+        self.assertEqual(Notification.objects.get().payload, {"challenge": self.challenge2.name, "team": "team"})
+
     def test_solve_solved_by_name(self):
         self.solve_challenge()
         response = self.client.get(reverse("team-self"))
@@ -260,8 +321,8 @@ class CategoryViewsetTestCase(ChallengeSetupMixin, APITestCase):
     def test_category_list_authenticated_content(self):
         self.client.force_authenticate(self.user)
         response = self.client.get(reverse("categories-list"))
-        self.assertEqual(len(response.data["d"]), 1)
-        self.assertEqual(len(response.data["d"][0]["challenges"]), 3)
+        self.assertEqual(len(response.json()["d"]), 1)
+        self.assertEqual(len(response.json()["d"][0]["challenges"]), 3)
 
     def test_category_list_challenge_redacting(self):
         self.user.is_staff = False
@@ -269,7 +330,7 @@ class CategoryViewsetTestCase(ChallengeSetupMixin, APITestCase):
         self.client.force_authenticate(self.user)
         response = self.client.get(reverse("categories-list"))
         config.set("enable_caching", False)
-        self.assertFalse("description" in self.find_challenge_entry(self.challenge1, data=response.data))
+        self.assertFalse("description" in self.find_challenge_entry(self.challenge1, data=response.json()))
 
     def test_category_list_challenge_redacting_admin(self):
         self.user.is_staff = True
@@ -330,26 +391,160 @@ class CategoryViewsetTestCase(ChallengeSetupMixin, APITestCase):
         uncached_response = self.client.get(reverse("categories-list"))
         cached_response = self.client.get(reverse("categories-list"))
         config.set("enable_caching", False)
-        self.assertEqual(uncached_response.data, cached_response.data)
+        self.assertEqual(uncached_response.json(), cached_response.json())
 
-    def test_category_list_content_preevent_cached(self):
+    def test_category_list_overlay_updated_on_solve(self):
         self.client.force_authenticate(self.user)
-        config.set("enable_preevent_cache", True)
-        config.set("start_time", time.time() - 5)
-        caches["default"].set("preevent_cache", {"key": "value"})
-        cached_response = self.client.get(reverse("categories-list"))
-        config.set("enable_preevent_cache", False)
-        self.assertEqual(cached_response.data["d"], {"key": "value"})
+        config.set("enable_caching", True)
+        self.client.get(reverse("categories-list"))
+        self.solve_challenge()
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertTrue(self.find_challenge_entry(self.challenge2, data=response.json())["solved"])
+        self.assertTrue("description" in self.find_challenge_entry(self.challenge1, data=response.json()))
+
+    def test_category_list_base_shared_between_teams(self):
+        config.set("enable_caching", True)
+        self.solve_challenge()
+        self.client.get(reverse("categories-list"))
+        self.client.force_authenticate(self.user3)
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertFalse(self.find_challenge_entry(self.challenge2, data=response.json())["solved"])
+        self.assertFalse("description" in self.find_challenge_entry(self.challenge1, data=response.json()))
+
+    def test_category_list_overlay_hint_used(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        self.client.get(reverse("categories-list"))
+        self.client.post(reverse("hint-use"), data={"id": self.hint3.pk})
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertTrue(self.find_challenge_entry(self.challenge2, data=response.json())["hints"][0]["used"])
+
+    def test_category_list_etag_not_modified(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        response = self.client.get(reverse("categories-list"))
+        cached_response = self.client.get(reverse("categories-list"), HTTP_IF_NONE_MATCH=response["ETag"])
+        config.set("enable_caching", False)
+        self.assertEqual(cached_response.status_code, HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached_response.content, b"")
+
+    def test_category_list_etag_single_cache_lookup(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        etag = self.client.get(reverse("categories-list"))["ETag"]
+        cache = caches["default"]
+        with mock.patch.object(cache, "get", wraps=cache.get) as get, \
+                mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            response = self.client.get(reverse("categories-list"), HTTP_IF_NONE_MATCH=etag)
+        config.set("enable_caching", False)
+        self.assertEqual(response.status_code, HTTP_304_NOT_MODIFIED)
+        self.assertEqual(get_many.call_count, 1)
+        # The file based test cache implements get_many with get, so apart from config and throttling, those are the
+        # only keys read.
+        keys = [call.args[0] for call in get.call_args_list if not call.args[0].startswith(("config_", "throttle_"))]
+        self.assertEqual(keys, get_many.call_args.args[0])
+
+    def test_category_list_etag_changed_on_solve(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        etag = self.client.get(reverse("categories-list"))["ETag"]
+        self.solve_challenge()
+        response = self.client.get(reverse("categories-list"), HTTP_IF_NONE_MATCH=etag)
+        config.set("enable_caching", False)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_category_list_etag_unchanged_on_incorrect_flag(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        etag = self.client.get(reverse("categories-list"))["ETag"]
+        self.client.force_authenticate(self.user3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("submit-flag"), {"flag": "ractf{b}", "challenge": self.challenge2.pk})
+        # The user hasn't solved anything, so they're served the board shared by every such team.
+        cached_etag = get_cached_etag(get_rendered_cache_keys(None)[0])
+        config.set("enable_caching", False)
+        self.assertEqual(cached_etag, etag)
+
+    def test_category_list_etag_without_caching(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("categories-list"))
+        cached_response = self.client.get(reverse("categories-list"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached_response.status_code, HTTP_304_NOT_MODIFIED)
+
+    def test_category_list_version_header(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("categories-list"))
+        self.assertIn("X-Board-Version", response)
+
+    def test_category_list_delta(self):
+        caches["default"].delete(LATEST_KEY)
+        self.client.force_authenticate(self.user)
+        version = self.client.get(reverse("categories-list"))["X-Board-Version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.challenge1.description = "changed"
+            self.challenge1.save()
+        response = self.client.get(reverse("categories-list"), {"since": version})
+        self.assertEqual(len(response.data["d"]["categories"]), 1)
+        self.assertEqual([c["id"] for c in response.data["d"]["categories"][0]["challenges"]], [self.challenge1.pk])
+        self.assertNotEqual(response.data["d"]["version"], version)
+
+    def test_category_list_delta_unchanged(self):
+        caches["default"].delete(LATEST_KEY)
+        self.client.force_authenticate(self.user)
+        version = self.client.get(reverse("categories-list"))["X-Board-Version"]
+        response = self.client.get(reverse("categories-list"), {"since": version})
+        self.assertEqual(response.data["d"]["categories"], [])
+        self.assertEqual(response.data["d"]["version"], version)
 
-    def test_category_list_content_preevent_cached_admin(self):
+    def test_category_list_delta_removed(self):
+        caches["default"].delete(LATEST_KEY)
+        self.client.force_authenticate(self.user)
+        version = self.client.get(reverse("categories-list"))["X-Board-Version"]
+        challenge3_id = self.challenge3.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.challenge3.delete()
+        response = self.client.get(reverse("categories-list"), {"since": version})
+        self.assertEqual(response.data["d"]["removed_challenges"], [challenge3_id])
+
+    def test_category_list_delta_invalid_version(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("categories-list"), {"since": "invalid"})
+        self.assertEqual(len(response.json()["d"]), 1)
+
+    def test_category_list_served_from_warmed_board(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        invalidate_used_hints(self.team)
+        warm_board()
+        _, body_key = get_rendered_cache_keys(None)
+        caches["default"].set(body_key, b'{"s":true,"m":"","d":"warm"}')
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertEqual(response.json()["d"], "warm")
+
+    def test_category_list_admin_not_served_from_warmed_board(self):
         self.user.is_staff = True
         self.user.save()
         self.client.force_authenticate(self.user)
-        config.set("enable_preevent_cache", True)
-        caches["default"].set("preevent_cache", {"key": "value"})
-        cached_response = self.client.get(reverse("categories-list"))
-        config.set("enable_preevent_cache", False)
-        self.assertNotEqual(cached_response.data["d"], {"key": "value"})
+        config.set("enable_caching", True)
+        warm_board()
+        _, body_key = get_rendered_cache_keys(None)
+        caches["default"].set(body_key, b'{"s":true,"m":"","d":"warm"}')
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertNotEqual(response.data["d"], "warm")
+
+    def test_category_list_team_with_solves_not_served_from_warmed_board(self):
+        config.set("enable_caching", True)
+        warm_board()
+        self.solve_challenge()
+        response = self.client.get(reverse("categories-list"))
+        config.set("enable_caching", False)
+        self.assertTrue(self.find_challenge_entry(self.challenge2, data=response.json())["solved"])
 
 
 class ChallengeViewsetTestCase(ChallengeSetupMixin, APITestCase):
@@ -400,6 +595,41 @@ class ChallengeViewsetTestCase(ChallengeSetupMixin, APITestCase):
         response = self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge1.pk}))
         self.assertFalse("description" in response.data)
 
+    def test_single_challenge_matches_board(self):
+        self.solve_challenge()
+        board = self.client.get(reverse("categories-list")).json()
+        response = self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge2.pk}))
+        self.assertEqual(response.json()["d"], self.find_challenge_entry(self.challenge2, data=board))
+
+    def test_single_challenge_solved_cached(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        rebuild_challenge_counters()
+        self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge2.pk}))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.solve_challenge()
+        response = self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge2.pk}))
+        config.set("enable_caching", False)
+        self.assertTrue(response.data["solved"])
+        self.assertEqual(response.data["solve_count"], 1)
+
+    def test_single_challenge_served_from_cache(self):
+        self.client.force_authenticate(self.user)
+        config.set("enable_caching", True)
+        self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge2.pk}))
+        key = get_challenge_cache_key(self.challenge2.pk)
+        entry = caches["default"].get(key)
+        entry["unlocked"]["name"] = "cached"
+        caches["default"].set(key, entry)
+        response = self.client.get(reverse("challenges-detail", kwargs={"pk": self.challenge2.pk}))
+        config.set("enable_caching", False)
+        self.assertEqual(response.data["name"], "cached")
+
+    def test_single_challenge_not_found(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("challenges-detail", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
     def test_single_challenge_admin_redacting(self):
         self.user.is_staff = True
         self.user.save()
@@ -451,6 +681,29 @@ class ChallengeViewsetTestCase(ChallengeSetupMixin, APITestCase):
         )
         self.assertEqual(response.status_code, HTTP_201_CREATED)
 
+    def test_create_challenge_invalid_unlock_requirements(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            reverse("challenges-list"),
+            data={
+                "name": "test4",
+                "category": self.category.id,
+                "description": "abc",
+                "challenge_type": "test",
+                "challenge_metadata": {},
+                "flag_type": "plaintext",
+                "author": "ractf",
+                "score": 1000,
+                "unlock_requirements": "1 AND",
+                "flag_metadata": {},
+                "tags": [],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
     def test_create_challenge_unauthorized(self):
         self.user.is_staff = False
         self.user.save()
@@ -770,3 +1023,72 @@ class ChallengeFeedbackTestCase(ChallengeSetupMixin, APITestCase):
         self.client.post(reverse("submit-feedback"), data)
         votes = ChallengeFeedback.objects.filter(user=self.user, challenge=self.challenge2)
         self.assertEqual(len(votes), 1)
+
+
+class AttemptCountTestCase(ChallengeSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.challenge2.challenge_metadata = {"attempt_limit": 2}
+        self.challenge2.save()
+
+    def tearDown(self):
+        caches["default"].delete(get_attempt_key(self.challenge2.pk, self.team.pk))
+        caches["default"].delete(get_reservation_key(self.challenge2.pk, self.team.pk))
+
+    def submit_incorrect(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("submit-flag"), {"flag": "ractf{b}", "challenge": self.challenge2.pk})
+
+    def get_attempts(self):
+        self.client.force_authenticate(user=self.admin_user)
+        return self.client.get(reverse("attempt-count"), {"challenge": self.challenge2.pk, "team": self.team.pk})
+
+    def test_attempts_counted(self):
+        self.submit_incorrect()
+        self.submit_incorrect()
+        self.assertEqual(self.get_attempts().data["d"]["attempts"], 2)
+
+    def test_attempt_counter_built_from_solves(self):
+        Solve.objects.create(team=self.team, solved_by=self.user, challenge=self.challenge2, correct=False, flag="a")
+        self.assertEqual(self.get_attempts().data["d"]["attempts"], 1)
+
+    def test_attempt_limit_reached(self):
+        for _ in range(3):
+            self.submit_incorrect()
+        self.assertEqual(self.submit_incorrect().data["m"], "attempt_limit_reached")
+
+    def test_concurrent_attempts_limited(self):
+        # One attempt made already leaves two within the limit. Every other submission is made while the first one's
+        # flag is being checked, before any of them has been counted.
+        self.submit_incorrect()
+        checked = []
+
+        def check(*args, **kwargs):
+            checked.append(args)
+            if len(checked) == 1:
+                for _ in range(5):
+                    self.client.post(reverse("submit-flag"), {"flag": "ractf{b}", "challenge": self.challenge2.pk})
+            return False
+
+        self.client.force_authenticate(user=self.user)
+        with mock.patch("challenge.views.check_flag", side_effect=check):
+            self.client.post(reverse("submit-flag"), {"flag": "ractf{b}", "challenge": self.challenge2.pk})
+        self.assertEqual(len(checked), 2)
+
+    def test_reset(self):
+        for _ in range(3):
+            self.submit_incorrect()
+        self.client.force_authenticate(user=self.admin_user)
+        self.client.delete(reverse("attempt-count"), {"challenge": self.challenge2.pk, "team": self.team.pk})
+        self.assertEqual(self.submit_incorrect().data["m"], "incorrect_flag")
+
+    def test_attempts_not_admin(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("attempt-count"), {"challenge": self.challenge2.pk, "team": self.team.pk})
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_attempts_unknown_team(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse("attempt-count"), {"challenge": self.challenge2.pk, "team": "a"})
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
@@ -0,0 +1,105 @@
+"""
+Compiled evaluation of challenge unlock requirements.
+
+Unlock requirements are stored as RPN strings of challenge ids combined with AND and OR, e.g. "1 2 OR 3 AND". Each
+distinct string is compiled once per process into a function of a team's solve bitset, an int with bit n set if the
+team has solved the challenge with id n, so checking a requirement never has to scan a list of solves.
+"""
+
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+OPERATORS = {"AND", "OR"}
+
+
+def _locked(_):
+    return False
+
+
+def _solved(challenge_id):
+    mask = 1 << challenge_id
+    return lambda bitset: bitset & mask != 0
+
+
+def _and(a, b):
+    return lambda bitset: a(bitset) and b(bitset)
+
+
+def _or(a, b):
+    return lambda bitset: a(bitset) or b(bitset)
+
+
+@lru_cache(maxsize=4096)
+def compile_requirements(requirements: str) -> Callable[[int], bool]:
+    """
+    Compile an RPN requirement string into a function of a solve bitset.
+
+    This mirrors the behaviour of the original interpreter for malformed strings: unknown tokens and operators without
+    enough operands are skipped, and the bottom of the stack is used as the result.
+    """
+    stack = []
+    for token in requirements.split():
+        if token.isdigit():
+            stack.append(_solved(int(token)))
+        elif token in OPERATORS and len(stack) >= 2:
+            a, b = stack.pop(), stack.pop()
+            stack.append(_and(a, b) if token == "AND" else _or(a, b))
+    if not stack:
+        return _locked
+    return stack[0]
+
+
+def validate_requirements(requirements: Optional[str]) -> None:
+    """Raise a ValueError if an unlock requirement string isn't a single well formed RPN expression."""
+    if not requirements:
+        return
+    depth = 0
+    for token in requirements.split():
+        if token.isdigit():
+            depth += 1
+        elif token in OPERATORS:
+            if depth < 2:
+                raise ValueError(f"'{token}' needs two operands")
+            depth -= 1
+        else:
+            raise ValueError(f"'{token}' is not a challenge id or operator")
+    if depth != 1:
+        raise ValueError("requirements must reduce to a single expression")
+
+
+def get_solve_bitset(solves: Iterable[int]) -> int:
+    """Build a solve bitset from an iterable of solved challenge ids."""
+    bitset = 0
+    for challenge_id in solves:
+        bitset |= 1 << challenge_id
+    return bitset
+
+
+def get_team_solve_bitset(team) -> int:
+    """Query a team's correct solves as a solve bitset."""
+    return get_solve_bitset(team.solves.filter(correct=True).values_list("challenge", flat=True))
+
+
+def as_solve_bitset(solves, team) -> int:
+    """Normalise a solve bitset or iterable of challenge ids to a bitset, querying the team's solves if None."""
+    if solves is None:
+        return get_team_solve_bitset(team)
+    if isinstance(solves, int):
+        return solves
+    return get_solve_bitset(solves)
+
+
+def is_solved(challenge_id: int, bitset: int) -> bool:
+    return bitset >> challenge_id & 1 == 1
+
+
+def requirements_met(requirements: Optional[str], bitset: int) -> bool:
+    """Check whether a team with the given solve bitset has met a challenge's unlock requirements."""
+    if not requirements:
+        return True
+    return compile_requirements(requirements)(bitset)
+
+
+def get_unlocked_ids(requirements: Iterable[tuple[int, Optional[str]]], bitset: int) -> set[int]:
+    """Evaluate the unlock state of a whole board, given (challenge id, requirements) pairs, in a single pass."""
+    return {challenge_id for challenge_id, reqs in requirements if requirements_met(reqs, bitset)}
@@ -0,0 +1,70 @@
+"""
+Checking many candidate flags at once, for verifying challenges before an event.
+
+Flags are run straight through each challenge's flag plugin in a thread pool, without recording solves or taking any
+locks, and every challenge involved is also self checked. Isolated checks wait for a free flag check worker for as long
+as it takes, and no more threads are used than the workers have slots, so a check only reports flag_check_timeout if
+the check itself ran out of time.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from challenge.models import Challenge
+from plugins.flag.executor import FlagCheckTimeout, check_flag, executor
+
+VERIFY_THREADS = 8
+
+
+def verify_pair(challenge, flag):
+    """Check one candidate flag, returning whether it's correct, any error and how long the check took."""
+    start = time.perf_counter()
+    correct, error = None, None
+    try:
+        correct = check_flag(challenge.flag_plugin, flag, wait=True)
+    except FlagCheckTimeout:
+        error = "flag_check_timeout"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "challenge": challenge.pk,
+        "flag": flag,
+        "correct": correct,
+        "error": error,
+        "time": time.perf_counter() - start,
+    }
+
+
+def verify_flags(pairs, threads=VERIFY_THREADS):
+    """
+    Check a list of (challenge id, flag) pairs, in parallel.
+
+    Returns the result of each pair in order, and the self check issues of every challenge that was found, in the same
+    format as the self check endpoint.
+    """
+    challenges = Challenge.objects.in_bulk({challenge_id for challenge_id, _ in pairs})
+    if settings.FLAG_CHECK_WORKERS:
+        executor.start()
+        threads = min(threads, executor.slot_count)
+    results = [None] * len(pairs)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = {}
+        for index, (challenge_id, flag) in enumerate(pairs):
+            if challenge_id in challenges:
+                futures[index] = pool.submit(verify_pair, challenges[challenge_id], flag)
+            else:
+                results[index] = {
+                    "challenge": challenge_id,
+                    "flag": flag,
+                    "correct": None,
+                    "error": "challenge_not_found",
+                    "time": 0,
+                }
+        for index, future in futures.items():
+            results[index] = future.result()
+    issues = []
+    for challenge in challenges.values():
+        issues += challenge.self_check()
+    return results, issues
@@ -1,28 +1,42 @@
 import hashlib
 import time
-from contextlib import suppress
 from typing import Union
 
-import requests
 from django.conf import settings
-from django.core.cache import caches
 from django.db import models, transaction
-from django.db.models import Case, Prefetch, Sum, Value, When
+from django.db.models import Case, Prefetch, Value, When
+from django.http import Http404
 from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import permissions
 from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
+from rest_framework.status import (
+    HTTP_304_NOT_MODIFIED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_403_FORBIDDEN,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 from backend.permissions import AdminOrReadOnly, IsBot, ReadOnlyBot
-from backend.response import FormattedResponse
+from backend.response import FormattedResponse, PrerenderedResponse
 from backend.signals import flag_reject, flag_score, flag_submit
 from backend.viewsets import AdminCreateModelViewSet, AuditLoggedViewSet
+from challenge.attempts import get_attempt_count, release_attempt, reserve_attempt, reset_attempt_count
+from challenge.board import (
+    add_counters,
+    get_board_delta,
+    get_board_etag,
+    get_challenge,
+    get_rendered_board,
+    invalidate_challenge,
+    invalidate_team_overlay,
+)
 from challenge.models import (
     Category,
     Challenge,
@@ -45,25 +59,19 @@ from challenge.serializers import (
     FastChallengeSerializer,
     FileSerializer,
     TagSerializer,
-    get_negative_votes,
-    get_positive_votes,
-    get_solve_counts,
 )
 from config import config
-from hint.models import Hint, HintUse
+from hint.models import Hint
+from hint.usage import get_used_hint_ids
 from member.models import Member
+from notifications.outbox import notify
+from plugins.flag.executor import FlagCheckTimeout, check_flag
+from scorerecalculator.totals import recalculate_teams, recalculate_users
 from sockets.signals import broadcast
 from team.models import Team
 from team.permissions import HasTeam
 
 
-def get_cache_key(user):
-    if user.team is None:
-        return str(caches["default"].get("challenge_mod_index", 0)) + "categoryvs_no_team"
-    else:
-        return str(caches["default"].get("challenge_mod_index", 0)) + "categoryvs_team_" + str(user.team.pk)
-
-
 class CategoryViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
     queryset = Category.objects.all()
     permission_classes = (CompetitionOpen & AdminOrReadOnly,)
@@ -90,7 +98,7 @@ class CategoryViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
                     "hint_set",
                     queryset=Hint.objects.annotate(
                         used=Case(
-                            When(id__in=HintUse.objects.filter(team=team).values_list("hint_id"), then=Value(True)),
+                            When(id__in=get_used_hint_ids(team), then=Value(True)),
                             default=Value(False),
                             output_field=models.BooleanField(),
                         )
@@ -105,7 +113,6 @@ class CategoryViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
                     else Tag.objects.filter(post_competition=False),
                     to_attr="tags",
                 ),
-                "hint_set__uses",
             )
             .select_related("first_blood")
         )
@@ -117,34 +124,22 @@ class CategoryViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
         return qs
 
     def list(self, request, *args, **kwargs):
-        cache = caches["default"]
-        if (
-            config.get("enable_preevent_cache")
-            and config.get("start_time") + 15 > time.time()
-            and "preevent_cache" in cache
-            and not request.user.is_staff
-        ):
-            return FormattedResponse(cache.get("preevent_cache"))
-
-        categories = cache.get(get_cache_key(request.user))
-        if categories is None or not config.get("enable_caching"):
+        if request.user.is_staff:
             queryset = self.filter_queryset(self.get_queryset())
-            serializer = self.get_serializer(queryset, many=True)
-            categories = serializer.data
-            cache.set(get_cache_key(request.user), categories, 3600)
+            return FormattedResponse(add_counters(self.get_serializer(queryset, many=True).data))
 
-        solve_counts = get_solve_counts()
-        positive_votes = get_positive_votes()
-        negative_votes = get_negative_votes()
-        for category in categories:
-            for challenge in category["challenges"]:
-                challenge["votes"] = {
-                    "positive": positive_votes.get(challenge["id"], 0),
-                    "negative": negative_votes.get(challenge["id"], 0),
-                }
-                challenge["solve_count"] = solve_counts.get(challenge["id"], 0)
+        version, etag = get_board_etag(request.user)
+        if "since" in request.query_params:
+            delta = get_board_delta(request.user, request.query_params["since"])
+            if delta is not None:
+                return FormattedResponse(delta, headers={"X-Board-Version": delta["version"]})
 
-        return FormattedResponse(categories)
+        if_none_match = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if etag is None or etag not in if_none_match:
+            etag, body = get_rendered_board(request.user)
+            if etag not in if_none_match:
+                return PrerenderedResponse(body, headers={"ETag": etag, "X-Board-Version": version})
+        return PrerenderedResponse(status=HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "X-Board-Version": version})
 
 
 class ChallengeViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
@@ -161,6 +156,19 @@ class ChallengeViewset(AuditLoggedViewSet, AdminCreateModelViewSet):
             return self.queryset
         return Challenge.get_unlocked_annotated_queryset(self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_staff and not request.user.should_deny_admin():
+            return super().retrieve(request, *args, **kwargs)
+        if request.user.is_staff:
+            raise Http404
+        try:
+            challenge = get_challenge(request.user, int(self.kwargs["pk"]))
+        except ValueError:
+            raise Http404
+        if challenge is None:
+            raise Http404
+        return Response(challenge)
+
 
 class ScoresViewset(ModelViewSet):
     queryset = Score.objects.all()
@@ -169,31 +177,9 @@ class ScoresViewset(ModelViewSet):
 
     def recalculate_scores(self, user, team):
         if user:
-            user = get_object_or_404(Member, id=user)
-            user.leaderboard_points = (
-                Score.objects.filter(user=user, leaderboard=True).aggregate(Sum("points"))["points__sum"] or 0
-            )
-            user.points = Score.objects.filter(user=user).aggregate(Sum("points"))["points__sum"] or 0
-            user.last_score = (
-                Score.objects.filter(user=user, leaderboard=True, tiebreaker=True)
-                .order_by("timestamp")
-                .first()
-                .timestamp
-            )
-            user.save()
+            recalculate_users([get_object_or_404(Member, id=user).pk])
         if team:
-            team = get_object_or_404(Team, id=team)
-            team.leaderboard_points = (
-                Score.objects.filter(team=team, leaderboard=True).aggregate(Sum("points"))["points__sum"] or 0
-            )
-            team.points = Score.objects.filter(team=team).aggregate(Sum("points"))["points__sum"] or 0
-            team.last_score = (
-                Score.objects.filter(team=team, leaderboard=True, tiebreaker=True)
-                .order_by("timestamp")
-                .first()
-                .timestamp
-            )
-            team.save()
+            recalculate_teams([get_object_or_404(Team, id=team).pk])
 
     def create(self, req, *args, **kwargs):
         x = super().create(req, *args, **kwargs)
@@ -269,37 +255,74 @@ class FlagSubmitView(APIView):
         ):
             return FormattedResponse(m="flag_submission_disabled", status=HTTP_403_FORBIDDEN)
 
+        flag = request.data.get("flag")
+        challenge_id = request.data.get("challenge")
+        if not flag or not challenge_id:
+            return FormattedResponse(status=HTTP_400_BAD_REQUEST, m="No flag or challenge ID provided")
+
+        user = request.user
+        challenge = get_object_or_404(Challenge, id=challenge_id)
+
+        # Reserved against the team's attempt counter before anything is locked, so teams over the limit cost nothing,
+        # and concurrent submissions can't all pass the limit by reading the same count.
+        limit = challenge.challenge_metadata.get("attempt_limit")
+        if limit:
+            if not reserve_attempt(challenge.pk, user.team_id, limit):
+                flag_reject.send(
+                    sender=self.__class__,
+                    user=user,
+                    team=user.team,
+                    challenge=challenge,
+                    flag=flag,
+                    reason="attempt_limit_reached",
+                )
+                return FormattedResponse(d={"correct": False}, m="attempt_limit_reached")
+            try:
+                return self.submit(user, challenge, flag)
+            finally:
+                release_attempt(challenge.pk, user.team_id)
+        return self.submit(user, challenge, flag)
+
+    def check_solvable(self, user, team_id, challenge):
+        """Return the response rejecting a submission to a challenge the team has solved or not unlocked, if any."""
+        if Solve.objects.filter(challenge=challenge, team_id=team_id, correct=True).exists():
+            return FormattedResponse(m="already_solved_challenge", status=HTTP_403_FORBIDDEN)
+        if not challenge.is_unlocked(user):
+            return FormattedResponse(m="challenge_not_unlocked", status=HTTP_403_FORBIDDEN)
+        return None
+
+    def submit(self, user, challenge, flag):
+        # Checked without locks first so that submissions which can't score don't use up a flag check, and again under
+        # the team's lock once the flag has been checked.
+        rejection = self.check_solvable(user, user.team_id, challenge)
+        if rejection is not None:
+            return rejection
+
+        # Checked before anything is locked, since a check can take up to its whole time budget.
+        try:
+            correct = check_flag(challenge.flag_plugin, flag, user=user, team=user.team)
+        except FlagCheckTimeout:
+            flag_reject.send(
+                sender=self.__class__,
+                user=user,
+                team=user.team,
+                challenge=challenge,
+                flag=flag,
+                reason="flag_check_timeout",
+            )
+            return FormattedResponse(d={"correct": False}, m="flag_check_timeout", status=HTTP_503_SERVICE_UNAVAILABLE)
+
+        # Only the team is locked, so submissions by different teams to the same challenge don't wait for each other.
         with transaction.atomic():
-            team = Team.objects.select_for_update().get(id=request.user.team.pk)
-            user = Member.objects.select_for_update().get(id=request.user.pk)
-            flag = request.data.get("flag")
-            challenge_id = request.data.get("challenge")
-            if not flag or not challenge_id:
-                return FormattedResponse(status=HTTP_400_BAD_REQUEST, m="No flag or challenge ID provided")
-
-            challenge = get_object_or_404(Challenge.objects.select_for_update(), id=challenge_id)
+            team = Team.objects.select_for_update().get(id=user.team_id)
             solve_set = Solve.objects.filter(challenge=challenge)
-            if solve_set.filter(team=team, correct=True).exists():
-                return FormattedResponse(m="already_solved_challenge", status=HTTP_403_FORBIDDEN)
-            if not challenge.is_unlocked(user):
-                return FormattedResponse(m="challenge_not_unlocked", status=HTTP_403_FORBIDDEN)
-
-            if challenge.challenge_metadata.get("attempt_limit"):
-                count = solve_set.filter(team=team).count()
-                if count > challenge.challenge_metadata["attempt_limit"]:
-                    flag_reject.send(
-                        sender=self.__class__,
-                        user=user,
-                        team=team,
-                        challenge=challenge,
-                        flag=flag,
-                        reason="attempt_limit_reached",
-                    )
-                    return FormattedResponse(d={"correct": False}, m="attempt_limit_reached")
+            rejection = self.check_solvable(user, team.pk, challenge)
+            if rejection is not None:
+                return rejection
 
             flag_submit.send(sender=self.__class__, user=user, team=team, challenge=challenge, flag=flag)
 
-            if not challenge.flag_plugin.check(flag, user=user, team=team):
+            if not correct:
                 flag_reject.send(
                     sender=self.__class__, user=user, team=team, challenge=challenge, flag=flag, reason="incorrect_flag"
                 )
@@ -307,9 +330,13 @@ class FlagSubmitView(APIView):
                 return FormattedResponse(d={"correct": False}, m="incorrect_flag")
 
             solve = challenge.points_plugin.score(user, team, flag, solve_set.filter(correct=True))
+            if solve is None:
+                return FormattedResponse(m="already_solved_challenge", status=HTTP_403_FORBIDDEN)
 
             if challenge.needs_recalculate:
-                challenge.recalculate_score(solve_set)
+                # With coalescing, earlier solves are brought up to date by the next recalculate_challenges pass.
+                if not settings.COALESCE_SCORE_RECALCULATION:
+                    challenge.recalculate_score(solve_set)
                 broadcast({
                     "type": "send_json",
                     "event_code": 7,
@@ -317,41 +344,44 @@ class FlagSubmitView(APIView):
                     "challenge_score": solve.score.points,
                 })
 
-            if challenge.first_blood is None:
-                challenge.first_blood = user
-                challenge.save(update_fields=["first_blood"])
-                hook = config.get("firstblood_webhook")
-                if hook and hook != "":
-                    challenge_clean = challenge.name.replace("`", "").replace("@", "@\u200b")
-                    team_clean = team.name.replace("`", "").replace("@", "@\u200b")
-                    if "discord.com" in hook and not hook.endswith("/slack"):
-                        hook += "/slack"
-                    challenge_clean = challenge_clean.replace("@", "@\u200b")
-                    team_clean = team_clean.replace("@", "@\u200b")
-                    body = {
-                        "username": "First Bloods",
-                        "attachments": [
-                            {
-                                "title": f":drop_of_blood: First Blood on `{challenge_clean}`!",
-                                "text": f"By team `{team_clean}`",
-                                "color": "#ff0000",
-                            }
-                        ],
-                    }
-
-                    with suppress(requests.exceptions.RequestException):
-                        requests.post(hook, json=body)
-
-            user.save()
-            team.save()
+            if solve.first_blood:
+                invalidate_challenge(challenge.pk)
+                notify("first_blood", challenge=challenge.name, team=team.name)
+
             flag_score.send(sender=self.__class__, user=user, team=team, challenge=challenge, flag=flag, solve=solve)
-            caches["default"].delete(get_cache_key(request.user))
+            invalidate_team_overlay(team)
             ret = {"correct": True}
             if challenge.post_score_explanation:
                 ret["explanation"] = challenge.post_score_explanation
             return FormattedResponse(d=ret, m="correct_flag")
 
 
+class AttemptCountView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get_challenge_and_team(self, data):
+        try:
+            return get_object_or_404(Challenge, id=data.get("challenge")), get_object_or_404(Team, id=data.get("team"))
+        except (TypeError, ValueError):
+            raise Http404
+
+    def get(self, request):
+        challenge, team = self.get_challenge_and_team(request.query_params)
+        return FormattedResponse(
+            d={
+                "challenge": challenge.pk,
+                "team": team.pk,
+                "attempts": get_attempt_count(challenge.pk, team.pk),
+                "attempt_limit": challenge.challenge_metadata.get("attempt_limit"),
+            }
+        )
+
+    def delete(self, request):
+        challenge, team = self.get_challenge_and_team(request.data)
+        reset_attempt_count(challenge.pk, team.pk)
+        return FormattedResponse(m="attempt_count_reset")
+
+
 class FlagCheckView(APIView):
     permission_classes = (CompetitionOpen & IsAuthenticated & HasTeam & ~IsBot,)
     throttle_scope = "flag_submit"
@@ -373,8 +403,11 @@ class FlagCheckView(APIView):
         if not solve_set.filter(team=team, correct=True).exists():
             return FormattedResponse(m="havent_solved_challenge", status=HTTP_403_FORBIDDEN)
 
-        if not challenge.flag_plugin.check(flag, user=user, team=team):
-            return FormattedResponse(d={"correct": False}, m="incorrect_flag")
+        try:
+            if not check_flag(challenge.flag_plugin, flag, user=user, team=team):
+                return FormattedResponse(d={"correct": False}, m="incorrect_flag")
+        except FlagCheckTimeout:
+            return FormattedResponse(d={"correct": False}, m="flag_check_timeout", status=HTTP_503_SERVICE_UNAVAILABLE)
 
         ret = {"correct": True}
 
@@ -0,0 +1,46 @@
+"""
+Rendering the challenge board ahead of release boundaries.
+
+When the competition starts, or a category or challenge is released, every client refetches the board at once. The
+board version changes at that moment, so without warm-up every team would miss the cache together. Warming the board
+for an upcoming release renders the base board, the anonymous overlay and the response body shared by every team
+which hasn't solved anything yet, using the same code paths as a request, and stores them under the keys of the
+upcoming version. Nothing reads those keys until the release time passes, at which point requests switch over to them
+as a whole.
+"""
+
+import time
+
+from django.core.cache import caches
+
+from challenge import board, counters
+
+
+def get_next_release(after=None):
+    """Return the first release boundary after the given timestamp, or now, or None if there are none left."""
+    if after is None:
+        after = time.time()
+    return next((release_time for release_time in board.get_release_schedule() if release_time > after), None)
+
+
+def warm_board(at=None):
+    """Render and store the board as it will be at the given timestamp, or now. Returns the warmed board version."""
+    if at is None:
+        at = time.time()
+    version = board.get_board_version(at)
+    counters_version = counters.get_counters_version()
+    base_board = board.serialize_base_board(at)
+    overlay = board.build_team_overlay(None, base_board)
+    etag, body = board.render_body(base_board, overlay)
+    etag_key, body_key = board.get_rendered_cache_keys(None, version)
+    timeout = max(at - time.time(), 0) + 3600
+    caches["default"].set_many(
+        {
+            board.get_base_cache_key(version): base_board,
+            board.get_overlay_cache_key(None, version): overlay,
+            etag_key: (etag, counters_version),
+            body_key: body,
+        },
+        timeout,
+    )
+    return version
@@ -3,3 +3,18 @@ from prometheus_client import multiprocess
 
 def child_exit(server, worker):
     multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+
+    from plugins.flag.executor import executor
+
+    if settings.FLAG_CHECK_WORKERS:
+        executor.start()
+
+
+def worker_exit(server, worker):
+    from challenge.attempts import flush_incorrect_attempts
+
+    flush_incorrect_attempts()
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hint', '0002_auto_20200808_1337'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hintuse',
+            index=models.Index(fields=['team', 'challenge'], name='hint_hintuse_team_chall_idx'),
+        ),
+    ]
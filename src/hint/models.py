@@ -27,3 +27,4 @@ class HintUse(ExportModelOperationsMixin("hint_use"), models.Model):
             "hint",
             "team",
         )
+        indexes = [models.Index(fields=["team", "challenge"], name="hint_hintuse_team_chall_idx")]
@@ -1,11 +1,13 @@
 from rest_framework import permissions
 
+from hint.usage import get_request_used_hint_ids
+
 
 class HasUsedHint(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff and not request.user.should_deny_admin():
             return True
-        return request.method in permissions.SAFE_METHODS and request.user.team.hints_used.filter(hint=obj).exists()
+        return request.method in permissions.SAFE_METHODS and obj.pk in get_request_used_hint_ids(request)
 
     def has_permission(self, request, view):
         return request.method in permissions.SAFE_METHODS or (
@@ -1,14 +1,13 @@
 import serpy
 from rest_framework import serializers
 
+from backend.serpy_compiler import CompiledSerializer
 from hint.models import Hint, HintUse
+from hint.usage import get_request_used_hint_ids
 
 
 def is_used(context, instance):
-    return (
-        context["request"].user.team is not None
-        and context["request"].user.team.hints_used.filter(hint=instance).exists()
-    )
+    return instance.pk in get_request_used_hint_ids(context["request"])
 
 
 class HintUseSerializer(serializers.ModelSerializer):
@@ -39,7 +38,7 @@ class HintSerializer(serializers.ModelSerializer, HintSerializerMixin):
         fields = ["id", "name", "penalty", "challenge", "text", "used"]
 
 
-class FastHintSerializer(serpy.Serializer):
+class FastHintSerializer(CompiledSerializer):
     id = serpy.IntField()
     name = serpy.StrField()
     penalty = serpy.IntField()
@@ -1,8 +1,14 @@
+from cachalot.api import cachalot_disabled
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_403_FORBIDDEN
 from rest_framework.test import APITestCase
 
 from challenge.tests.mixins import ChallengeSetupMixin
+from config import config
+from hint.models import Hint
+from hint.usage import invalidate_used_hints
 from hint.views import HintViewSet, UseHintView
 
 
@@ -119,3 +125,27 @@ class HintTestCase(ChallengeSetupMixin, APITestCase):
         self.client.force_authenticate(self.user)
         response = self.client.post(reverse("hint-use"), data={"id": self.hint1.id})
         self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_hint_list_queries_independent_of_hint_count(self):
+        config.set("enable_caching", False)
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse("hint-use"), data={"id": self.hint3.pk})
+        with cachalot_disabled(), CaptureQueriesContext(connection) as few_hints:
+            self.client.get(reverse("hint-list"))
+        for i in range(10):
+            Hint.objects.create(name=f"extra{i}", challenge=self.challenge2, text="a", penalty=100)
+        with cachalot_disabled(), CaptureQueriesContext(connection) as many_hints:
+            self.client.get(reverse("hint-list"))
+        config.set("enable_caching", True)
+        self.assertEqual(len(few_hints), len(many_hints))
+
+    def test_hint_use_read_cached(self):
+        config.set("enable_caching", True)
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse("hint-list"))
+        self.client.post(reverse("hint-use"), data={"id": self.hint3.pk})
+        response = self.client.get(reverse("hint-detail", kwargs={"pk": self.hint3.pk}))
+        config.set("enable_caching", False)
+        invalidate_used_hints(self.team)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotEqual(response.data["text"], "")
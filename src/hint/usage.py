@@ -0,0 +1,43 @@
+"""
+Loading the set of hints a team has used.
+
+Every hint path which needs to know whether a hint has been used, to show its text or mark it as used, reads the
+team's used hint ids from here, loaded at most once per request and cached between requests, rather than querying
+per hint.
+"""
+
+from django.core.cache import caches
+
+from config import config
+from hint.models import HintUse
+
+
+def get_cache_key(team):
+    return f"team_hints_used_{team.pk}"
+
+
+def get_used_hint_ids(team):
+    """Return the ids of the hints a team has used."""
+    if team is None:
+        return frozenset()
+    if not config.get("enable_caching"):
+        return frozenset(HintUse.objects.filter(team=team).values_list("hint_id", flat=True))
+    cache = caches["default"]
+    used_hint_ids = cache.get(get_cache_key(team))
+    if used_hint_ids is None:
+        used_hint_ids = frozenset(HintUse.objects.filter(team=team).values_list("hint_id", flat=True))
+        cache.set(get_cache_key(team), used_hint_ids, 3600)
+    return used_hint_ids
+
+
+def get_request_used_hint_ids(request):
+    """Return the ids of the hints the requesting user's team has used, loading them once per request."""
+    if not hasattr(request, "_used_hint_ids"):
+        request._used_hint_ids = get_used_hint_ids(getattr(request.user, "team", None))
+    return request._used_hint_ids
+
+
+def invalidate_used_hints(team):
+    """Drop a team's cached used hint ids after it uses a hint."""
+    if team is not None:
+        caches["default"].delete(get_cache_key(team))
@@ -1,4 +1,3 @@
-from django.core.cache import caches
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.status import HTTP_403_FORBIDDEN
@@ -9,7 +8,7 @@ from backend.response import FormattedResponse
 from backend.signals import use_hint
 from backend.viewsets import AdminCreateModelViewSet, AuditLoggedViewSet
 from challenge.permissions import CompetitionOpen
-from challenge.views import get_cache_key
+from challenge.board import invalidate_team_overlay
 from hint.models import Hint, HintUse
 from hint.permissions import HasUsedHint
 from hint.serializers import (
@@ -52,5 +51,5 @@ class UseHintView(APIView):
             challenge=hint.challenge,
         ).save()
         serializer = FullHintSerializer(hint, context={"request": request})
-        caches["default"].delete(get_cache_key(request.user))
+        invalidate_team_overlay(request.user.team)
         return FormattedResponse(d=serializer.data)
@@ -1,5 +1,10 @@
+from importlib import import_module
+
 from django.apps import AppConfig
 
 
 class LeaderboardConfig(AppConfig):
     name = "leaderboard"
+
+    def ready(self):
+        import_module("leaderboard.signals", "leaderboard")
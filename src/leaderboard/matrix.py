@@ -0,0 +1,78 @@
+"""
+The solve matrix scoreboard, of which teams have solved which challenges.
+
+The whole matrix is built from a single query over correct solves. Each team's row is a bitset with a bit per
+challenge, in the order of the challenge ids sent alongside it, encoded as base64, so a row costs a few bytes however
+many challenges a team has solved. Teams are in leaderboard order. Only challenges released on the board and not hidden
+are listed, so the matrix gives away nothing about the rest.
+
+The rendered response is cached as one body, keyed by the board version, which also moves as challenges and categories
+are released, and the version of the team leaderboard, which changes whenever a team's entry is refreshed, including
+after every solve. A matrix is therefore rebuilt at most once per change, however many clients fetch it.
+
+Once the standings are frozen, the matrix is built from the frozen snapshot instead, with only the solves made up to its
+time, so it doesn't give away the live standings.
+"""
+
+import base64
+from collections import defaultdict
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from backend.renderers import RACTFJSONRenderer
+from challenge.board import get_board_version
+from challenge.models import Challenge, Solve
+from config import config
+from leaderboard.ranking import get_team_ranking, get_teams_version
+
+
+def get_matrix_cache_key(snapshot=None):
+    if snapshot is not None:
+        return f"leaderboard_matrix_{get_board_version()}_{snapshot['name']}_{snapshot['version']}"
+    return f"leaderboard_matrix_{get_board_version()}_{get_teams_version()}"
+
+
+def encode_row(columns, solved):
+    """Encode the challenges a team has solved as a base64 bitset, with the first column in the highest bit."""
+    bits = bytearray((len(columns) + 7) // 8)
+    for challenge_id in solved:
+        column = columns.get(challenge_id)
+        if column is not None:
+            bits[column >> 3] |= 0x80 >> (column & 7)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+def build_matrix(snapshot=None):
+    now = timezone.now()
+    challenges = Challenge.objects.filter(hidden=False, release_time__lte=now, category__release_time__lte=now)
+    challenge_ids = list(challenges.order_by("id").values_list("id", flat=True))
+    columns = {challenge_id: column for column, challenge_id in enumerate(challenge_ids)}
+    solved = defaultdict(list)
+    solves = Solve.objects.filter(correct=True, team__is_visible=True)
+    if snapshot is not None:
+        solves = solves.filter(timestamp__lte=datetime.fromtimestamp(snapshot["at"], dt_timezone.utc))
+    for team_id, challenge_id in solves.values_list("team_id", "challenge_id").order_by():
+        solved[team_id].append(challenge_id)
+    entries = snapshot["teams"] if snapshot is not None else get_team_ranking()[0:]
+    teams = [{**team, "solves": encode_row(columns, solved[team["id"]])} for team in entries]
+    return {"challenges": challenge_ids, "teams": teams}
+
+
+def get_rendered_matrix(snapshot=None):
+    """
+    Return the response body of the matrix, building it if the cached copy is missing or out of date.
+
+    Given a snapshot of the standings, the matrix is as it was at the snapshot's time.
+    """
+    if not config.get("enable_caching"):
+        return RACTFJSONRenderer().render({"s": True, "m": "", "d": build_matrix(snapshot)})
+    cache = caches["default"]
+    key = get_matrix_cache_key(snapshot)
+    body = cache.get(key)
+    if body is None:
+        body = RACTFJSONRenderer().render({"s": True, "m": "", "d": build_matrix(snapshot)})
+        cache.set(key, body, 3600)
+    return body
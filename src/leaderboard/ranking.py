@@ -0,0 +1,292 @@
+"""
+Leaderboards kept in sorted sets.
+
+Every visible user and team is kept in a sorted set ordered by a composite of their leaderboard points and how long
+they've had them, with what the leaderboard endpoints show for them in a hash alongside, so leaderboard pages are
+served without touching the database. Teams are also kept in a set for their leaderboard group if it has its own
+leaderboard, or a set for teams without a group.
+
+Entries are refreshed from the database once a change to a team's or user's points commits, and the whole thing is
+rebuilt from the database the first time it's read if it's missing, or with the rebuild_leaderboard management command.
+"""
+
+import json
+
+from django.db import transaction
+
+from leaderboard.store import get_store
+from member.models import Member
+
+USERS_KEY = "leaderboard:users"
+USER_DATA_KEY = "leaderboard:users:data"
+TEAMS_KEY = "leaderboard:teams"
+TEAM_DATA_KEY = "leaderboard:teams:data"
+TEAM_GROUPS_KEY = "leaderboard:teams:groups"
+BUILT_KEY = "leaderboard:built"
+TEAMS_VERSION_KEY = "leaderboard:teams:version"
+USERS_VERSION_KEY = "leaderboard:users:version"
+REBUILD_PREFIX = "leaderboard:rebuild:"
+
+TIME_BITS = 2 ** 32
+
+
+def get_group_key(group_id):
+    return f"leaderboard:teams:group:{group_id if group_id is not None else 'none'}"
+
+
+def encode_score(points, last_score):
+    """
+    Combine points and the time they were reached into one sortable number.
+
+    More points rank higher, then an earlier last score. Both fit in a double exactly while points stay within 2**20.
+    """
+    timestamp = min(max(int(last_score.timestamp()), 0), TIME_BITS - 1) if last_score is not None else TIME_BITS - 1
+    return points * TIME_BITS + (TIME_BITS - 1 - timestamp)
+
+
+def get_team_rows(team_ids=None):
+    from team.models import Team
+
+    teams = Team.objects.all()
+    if team_ids is not None:
+        teams = teams.filter(id__in=team_ids)
+    return teams.values(
+        "id",
+        "name",
+        "leaderboard_points",
+        "last_score",
+        "is_visible",
+        "leaderboard_group_id",
+        "leaderboard_group__name",
+        "leaderboard_group__has_own_leaderboard",
+    )
+
+
+def get_user_rows(user_ids=None):
+    users = Member.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    return users.values("id", "username", "leaderboard_points", "last_score", "is_visible")
+
+
+def get_team_board_key(row):
+    """Return the key of the group leaderboard a team belongs on, if any."""
+    if row["leaderboard_group_id"] is None or row["leaderboard_group__has_own_leaderboard"]:
+        return get_group_key(row["leaderboard_group_id"])
+    return None
+
+
+def team_entry(row):
+    return json.dumps(
+        {
+            "name": row["name"],
+            "id": row["id"],
+            "leaderboard_points": row["leaderboard_points"],
+            "leaderboard_group_name": row["leaderboard_group__name"],
+        }
+    )
+
+
+def user_entry(row):
+    return json.dumps({"username": row["username"], "id": row["id"], "leaderboard_points": row["leaderboard_points"]})
+
+
+def is_built():
+    return bool(get_store().exists(BUILT_KEY))
+
+
+def refresh_teams(team_ids):
+    """Bring the entries of the given teams up to date with the database."""
+    store = get_store()
+    if not team_ids or not is_built():
+        return
+    team_ids = list(team_ids)
+    old_boards = dict(zip(team_ids, store.hmget(TEAM_GROUPS_KEY, team_ids)))
+    rows = {row["id"]: row for row in get_team_rows(team_ids)}
+    pipe = store.pipeline()
+    for team_id in team_ids:
+        row = rows.get(team_id)
+        old_board = old_boards[team_id].decode() if old_boards[team_id] else None
+        board = get_team_board_key(row) if row is not None and row["is_visible"] else None
+        if old_board is not None and old_board != board:
+            pipe.zrem(old_board, team_id)
+        if row is None or not row["is_visible"]:
+            pipe.zrem(TEAMS_KEY, team_id)
+            pipe.hdel(TEAM_DATA_KEY, team_id)
+            pipe.hdel(TEAM_GROUPS_KEY, team_id)
+            continue
+        score = encode_score(row["leaderboard_points"], row["last_score"])
+        pipe.zadd(TEAMS_KEY, {team_id: score})
+        pipe.hset(TEAM_DATA_KEY, team_id, team_entry(row))
+        if board is not None:
+            pipe.zadd(board, {team_id: score})
+            pipe.hset(TEAM_GROUPS_KEY, team_id, board)
+        else:
+            pipe.hdel(TEAM_GROUPS_KEY, team_id)
+    pipe.incr(TEAMS_VERSION_KEY)
+    pipe.execute()
+
+
+def refresh_users(user_ids):
+    """Bring the entries of the given users up to date with the database."""
+    store = get_store()
+    if not user_ids or not is_built():
+        return
+    rows = {row["id"]: row for row in get_user_rows(list(user_ids))}
+    pipe = store.pipeline()
+    for user_id in user_ids:
+        row = rows.get(user_id)
+        if row is None or not row["is_visible"]:
+            pipe.zrem(USERS_KEY, user_id)
+            pipe.hdel(USER_DATA_KEY, user_id)
+            continue
+        pipe.zadd(USERS_KEY, {user_id: encode_score(row["leaderboard_points"], row["last_score"])})
+        pipe.hset(USER_DATA_KEY, user_id, user_entry(row))
+    pipe.incr(USERS_VERSION_KEY)
+    pipe.execute()
+
+
+def refresh_on_commit(team_ids=(), user_ids=()):
+    """Refresh the entries of the given teams and users once the current transaction, if any, commits."""
+    team_ids, user_ids = [i for i in team_ids if i is not None], [i for i in user_ids if i is not None]
+    transaction.on_commit(lambda: (refresh_teams(team_ids), refresh_users(user_ids)))
+
+
+def rebuild_leaderboard():
+    """Build every leaderboard from the database, swapping the new ones in atomically. Returns the number of entries."""
+    store = get_store()
+    teams, groups, users = {}, {}, {}
+    team_data, team_groups, user_data = {}, {}, {}
+    for row in get_team_rows():
+        if not row["is_visible"]:
+            continue
+        score = encode_score(row["leaderboard_points"], row["last_score"])
+        teams[row["id"]] = score
+        team_data[row["id"]] = team_entry(row)
+        board = get_team_board_key(row)
+        if board is not None:
+            groups.setdefault(board, {})[row["id"]] = score
+            team_groups[row["id"]] = board
+    for row in get_user_rows():
+        if row["is_visible"]:
+            users[row["id"]] = encode_score(row["leaderboard_points"], row["last_score"])
+            user_data[row["id"]] = user_entry(row)
+
+    built = {
+        TEAMS_KEY: ("zadd", teams),
+        TEAM_DATA_KEY: ("hset", team_data),
+        TEAM_GROUPS_KEY: ("hset", team_groups),
+        USERS_KEY: ("zadd", users),
+        USER_DATA_KEY: ("hset", user_data),
+        **{board: ("zadd", members) for board, members in groups.items()},
+    }
+    pipe = store.pipeline()
+    for key, (command, values) in built.items():
+        pipe.delete(REBUILD_PREFIX + key)
+        if not values:
+            continue
+        if command == "zadd":
+            pipe.zadd(REBUILD_PREFIX + key, values)
+        else:
+            pipe.hset(REBUILD_PREFIX + key, mapping=values)
+    pipe.execute()
+
+    stale = [key.decode() for key in store.scan_iter(match=get_group_key("") + "*")]
+    pipe = store.pipeline()
+    for key in stale:
+        if key not in built:
+            pipe.delete(key)
+    for key, (_, values) in built.items():
+        if values:
+            pipe.rename(REBUILD_PREFIX + key, key)
+        else:
+            pipe.delete(key)
+    pipe.set(BUILT_KEY, 1)
+    pipe.incr(TEAMS_VERSION_KEY)
+    pipe.incr(USERS_VERSION_KEY)
+    pipe.execute()
+    return len(teams) + len(users)
+
+
+def get_teams_version():
+    """Return a number which changes whenever any team's entry does."""
+    ensure_built()
+    return int(get_store().get(TEAMS_VERSION_KEY) or 0)
+
+
+def get_users_version():
+    """Return a number which changes whenever any user's entry does."""
+    ensure_built()
+    return int(get_store().get(USERS_VERSION_KEY) or 0)
+
+
+def ensure_built():
+    if not is_built():
+        rebuild_leaderboard()
+
+
+def invalidate_leaderboard():
+    """Have the leaderboards rebuilt from the database the next time they're read."""
+    get_store().delete(BUILT_KEY)
+
+
+class Ranking:
+    """
+    A leaderboard, as a sequence of its entries from first place down.
+
+    Only len() and slices are supported, which is all that pagination needs, and each costs a single round trip. The
+    rank and position of a single entry are looked up in logarithmic time.
+    """
+
+    def __init__(self, key, data_key):
+        ensure_built()
+        self.key = key
+        self.data_key = data_key
+        self.store = get_store()
+
+    def __len__(self):
+        return self.store.zcard(self.key)
+
+    def rank(self, member):
+        """Return the 0 based rank of an entry, or None if it isn't on this leaderboard."""
+        return self.store.zrevrank(self.key, member)
+
+    def position(self, member):
+        """Return the 1 based position of an entry, shared by every entry on the same points, or None."""
+        score = self.store.zscore(self.key, member)
+        if score is None:
+            return None
+        return self.store.zcount(self.key, (int(score) // TIME_BITS + 1) * TIME_BITS, "+inf") + 1
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("Rankings only support slices")
+        start = index.start or 0
+        if index.stop is not None and index.stop <= start:
+            return []
+        ids = self.store.zrevrange(self.key, start, -1 if index.stop is None else index.stop - 1)
+        if not ids:
+            return []
+        return [json.loads(entry) for entry in self.store.hmget(self.data_key, ids) if entry is not None]
+
+
+def get_team_ranking(group_id=None):
+    """Return the leaderboard of every team, or of the teams in a group with its own leaderboard."""
+    if group_id is None:
+        return Ranking(TEAMS_KEY, TEAM_DATA_KEY)
+    return Ranking(get_group_key(group_id), TEAM_DATA_KEY)
+
+
+def get_team_group_ranking(team_id):
+    """Return the leaderboard of the group a team is ranked in, or None if its group doesn't have its own."""
+    ensure_built()
+    board = get_store().hget(TEAM_GROUPS_KEY, team_id)
+    return Ranking(board.decode(), TEAM_DATA_KEY) if board is not None else None
+
+
+def get_teams_without_group_ranking():
+    return Ranking(get_group_key(None), TEAM_DATA_KEY)
+
+
+def get_user_ranking():
+    return Ranking(USERS_KEY, USER_DATA_KEY)
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from challenge.models import Score, Solve
+from leaderboard.ranking import invalidate_leaderboard, refresh_on_commit
+from leaderboard.snapshots import entry_changed, invalidate_on_commit
+from leaderboard.timeline import append_on_commit, drop_on_commit
+from member.models import Member
+from team.models import LeaderboardGroup, Team
+
+
+@receiver([post_save, post_delete], sender=Team)
+def team_leaderboard_refresh(sender, instance, **kwargs):
+    refresh_on_commit(team_ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Member)
+def user_leaderboard_refresh(sender, instance, **kwargs):
+    refresh_on_commit(user_ids=[instance.pk])
+
+
+TEAM_SNAPSHOT_FIELDS = {"name", "is_visible", "leaderboard_group", "leaderboard_group_id"}
+USER_SNAPSHOT_FIELDS = {"username", "is_visible"}
+
+
+def get_snapshot_entry(instance):
+    """Return the fields of a team's or user's snapshot entry which can be edited, or None if it isn't shown."""
+    if not instance.is_visible:
+        return None
+    if isinstance(instance, Team):
+        return {"name": instance.name, "leaderboard_group_id": instance.leaderboard_group_id}
+    return {"username": instance.username}
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Member)
+def standings_snapshot_invalidate(sender, instance, update_fields=None, **kwargs):
+    fields = TEAM_SNAPSHOT_FIELDS if sender is Team else USER_SNAPSHOT_FIELDS
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    if entry_changed("teams" if sender is Team else "users", instance.pk, get_snapshot_entry(instance)):
+        invalidate_on_commit()
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Member)
+def standings_snapshot_drop(sender, instance, **kwargs):
+    if entry_changed("teams" if sender is Team else "users", instance.pk, None):
+        invalidate_on_commit()
+
+
+@receiver([post_save, post_delete], sender=LeaderboardGroup)
+def group_leaderboard_invalidate(sender, instance, **kwargs):
+    invalidate_leaderboard()
+
+
+@receiver(post_save, sender=Score)
+def score_timeline_update(sender, instance, created, **kwargs):
+    if created and instance.leaderboard:
+        append_on_commit(instance)
+    elif not created:
+        drop_on_commit(team_ids=[instance.team_id], user_ids=[instance.user_id])
+
+
+@receiver(post_delete, sender=Score)
+def score_timeline_drop(sender, instance, **kwargs):
+    drop_on_commit(team_ids=[instance.team_id], user_ids=[instance.user_id])
+
+
+@receiver(post_delete, sender=Solve)
+def solve_leaderboard_refresh(sender, instance, **kwargs):
+    if instance.correct:
+        refresh_on_commit(team_ids=[instance.team_id])
+
+
+@receiver([post_save, post_delete], sender=Score)
+def score_snapshot_invalidate(sender, instance, created=False, **kwargs):
+    # An edit may have moved the score from before a snapshot's time to after it.
+    invalidate_on_commit(instance.timestamp.timestamp() if created else None)
@@ -0,0 +1,245 @@
+"""
+Frozen snapshots of the standings.
+
+The public standings are final once end_time passes, and with the scoreboard enabled, freeze once hide_scoreboard_at
+does. At each of those points the team and user standings are materialised into a snapshot, computed from the scores
+made up to that moment, so taking it late doesn't pick up later solves. From then on the CTFTime export, the team and
+user leaderboards and rank lookups are served from the snapshot, out of the cache, without touching the database, and
+the graph and solve matrix only show scores and solves made up to its time.
+
+A snapshot is taken the first time it's needed, or with the snapshot_standings management command, and is keyed by the
+moment it was taken at, so moving either time takes a new one. One taken before its moment is taken again once needed.
+With STANDINGS_SNAPSHOT_STORAGE set, each snapshot is also written to the configured file storage as JSON, and read
+back from there if it drops out of the cache.
+
+Corrections made once a snapshot's time has passed, such as hiding or renaming a team or editing a score from before
+it, move the snapshot's generation on once they commit, so it's retaken with them the next time it's needed. Saves
+which don't change anything the snapshot shows, and new scores made after its time, don't touch it. Only one request
+retakes a snapshot at a time, under a lock, and the rest are served the previous snapshot meanwhile, or wait for the
+new one if there's no previous one.
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+from config import config
+from member.models import Member
+
+FREEZE = "freeze"
+FINAL = "final"
+
+# How long one request may spend taking a snapshot before another is allowed to take it instead.
+LOCK_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.1
+
+
+def get_snapshot_key(name, at):
+    return f"standings_snapshot_{name}_{int(at)}"
+
+
+def get_generation_key(name, at):
+    return f"{get_snapshot_key(name, at)}_generation"
+
+
+def get_lock_key(name, at):
+    return f"{get_snapshot_key(name, at)}_lock"
+
+
+def get_snapshot_path(name, at):
+    return f"standings/{name}-{int(at)}.json"
+
+
+def get_current_snapshot_time(now=None):
+    """Return the name and time of the snapshot the standings are currently frozen at, or None if they're live."""
+    now = time.time() if now is None else now
+    if config.get("end_time") <= now:
+        return FINAL, config.get("end_time")
+    # With the scoreboard disabled, hide_scoreboard_at is when it's shown again rather than when it freezes.
+    freeze_at = config.get("hide_scoreboard_at")
+    if config.get("enable_scoreboard") and freeze_at != -1 and freeze_at <= now:
+        return FREEZE, freeze_at
+    return None
+
+
+def get_past_snapshot_times(now=None):
+    """Return the name and time of each snapshot whose time has passed, whether or not it's the current one."""
+    now = time.time() if now is None else now
+    times = [(FREEZE, config.get("hide_scoreboard_at")), (FINAL, config.get("end_time"))]
+    return [(name, at) for name, at in times if at != -1 and at <= now]
+
+
+def invalidate_snapshots(changed_at=None):
+    """Drop every snapshot whose time has passed, or only those at or after a change's time, to be retaken later."""
+    for name, at in get_past_snapshot_times():
+        if changed_at is not None and changed_at > at:
+            continue
+        cache = caches["default"]
+        cache.add(get_generation_key(name, at), 0, timeout=None)
+        cache.incr(get_generation_key(name, at))
+        if settings.STANDINGS_SNAPSHOT_STORAGE and default_storage.exists(get_snapshot_path(name, at)):
+            default_storage.delete(get_snapshot_path(name, at))
+
+
+def invalidate_on_commit(changed_at=None):
+    """Drop the snapshots a change affects once the current transaction, if any, commits."""
+    if any(changed_at is None or changed_at <= at for _, at in get_past_snapshot_times()):
+        transaction.on_commit(lambda: invalidate_snapshots(changed_at))
+
+
+def entry_changed(kind, entry_id, entry):
+    """
+    Return whether a team's or user's entry differs from what any snapshot taken so far shows for it.
+
+    kind is "teams" or "users", and entry has the fields the snapshot shows which can be edited, or is None if the
+    team or user isn't shown on the leaderboard.
+    """
+    for name, at in get_past_snapshot_times():
+        snapshot = read_snapshot(name, at)
+        if snapshot is None:
+            continue
+        shown = next((shown for shown in snapshot[kind] if shown["id"] == entry_id), None)
+        if (shown is None) != (entry is None):
+            return True
+        if shown is not None and any(shown[field] != value for field, value in entry.items()):
+            return True
+    return False
+
+
+def get_standings(queryset, at, fields):
+    """Annotate a queryset of teams or users with the leaderboard points they had at a time, ordered by them."""
+    at = datetime.fromtimestamp(at, timezone.utc)
+    scored = Q(scores__leaderboard=True, scores__timestamp__lte=at)
+    rows = (
+        queryset.filter(is_visible=True)
+        .annotate(
+            frozen_points=Coalesce(Sum(F("scores__points") - F("scores__penalty"), filter=scored), 0),
+            frozen_last_score=Max("scores__timestamp", filter=scored & Q(scores__tiebreaker=True)),
+        )
+        .order_by("-frozen_points", "frozen_last_score", "id")
+        .values("frozen_points", *fields)
+    )
+    return [
+        {"pos": position, **{field: row[field] for field in fields}, "leaderboard_points": row["frozen_points"]}
+        for position, row in enumerate(rows, start=1)
+    ]
+
+
+def build_snapshot(name, at):
+    from team.models import Team
+
+    teams = get_standings(Team.objects.all(), at, ("id", "name", "leaderboard_group_id", "leaderboard_group__name"))
+    for team in teams:
+        team["leaderboard_group_name"] = team.pop("leaderboard_group__name")
+    users = get_standings(Member.objects.all(), at, ("id", "username"))
+    standings = json.dumps({"teams": teams, "users": users}, sort_keys=True).encode()
+    return {
+        "name": name,
+        "at": at,
+        "taken_at": time.time(),
+        "version": hashlib.sha256(standings).hexdigest()[:16],
+        "teams": teams,
+        "users": users,
+    }
+
+
+def take_snapshot(name, at):
+    """Materialise the standings at a time into a snapshot, replacing any already taken, and return it."""
+    # Read first, so that a correction committing while the snapshot is built leaves it stale rather than lost.
+    generation = caches["default"].get(get_generation_key(name, at), 0)
+    snapshot = {**build_snapshot(name, at), "generation": generation}
+    caches["default"].set(get_snapshot_key(name, at), snapshot, timeout=None)
+    if settings.STANDINGS_SNAPSHOT_STORAGE:
+        path = get_snapshot_path(name, at)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(json.dumps(snapshot).encode()))
+    return snapshot
+
+
+def read_snapshot(name, at, snapshot=None):
+    """Return the snapshot at a time if it's been taken, from the cache or else from storage, without taking it."""
+    if snapshot is None:
+        snapshot = caches["default"].get(get_snapshot_key(name, at))
+    if snapshot is None and settings.STANDINGS_SNAPSHOT_STORAGE and default_storage.exists(get_snapshot_path(name, at)):
+        with default_storage.open(get_snapshot_path(name, at)) as f:
+            snapshot = json.load(f)
+        caches["default"].set(get_snapshot_key(name, at), snapshot, timeout=None)
+    return snapshot
+
+
+def get_snapshot(name, at):
+    """Return the snapshot of the standings at a time, taking it if it hasn't been taken yet or is out of date."""
+    cache = caches["default"]
+    key, generation_key = get_snapshot_key(name, at), get_generation_key(name, at)
+    state = cache.get_many([key, generation_key])
+    snapshot = read_snapshot(name, at, state.get(key))
+    # A snapshot taken ahead of its time misses anything scored between then and its time, so is taken again.
+    current = snapshot is not None and snapshot.get("generation", 0) == state.get(generation_key, 0)
+    if current and snapshot["taken_at"] >= at:
+        return snapshot
+
+    if not cache.add(get_lock_key(name, at), 1, timeout=LOCK_TIMEOUT):
+        # Another request is taking it, so serve the previous one meanwhile, or wait for theirs.
+        if snapshot is not None:
+            return snapshot
+        deadline = time.time() + LOCK_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            snapshot = cache.get(key)
+            if snapshot is not None:
+                return snapshot
+    try:
+        return take_snapshot(name, at)
+    finally:
+        cache.delete(get_lock_key(name, at))
+
+
+def get_current_snapshot():
+    """Return the snapshot the standings are currently frozen at, or None if they're live."""
+    current = get_current_snapshot_time()
+    return get_snapshot(*current) if current is not None else None
+
+
+class SnapshotRanking:
+    """A leaderboard in a snapshot, with the same interface as leaderboard.ranking.Ranking."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.ranks = {entry["id"]: rank for rank, entry in enumerate(entries)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def rank(self, member):
+        return self.ranks.get(int(member))
+
+    def position(self, member):
+        rank = self.rank(member)
+        if rank is None:
+            return None
+        points = self.entries[rank]["leaderboard_points"]
+        while rank > 0 and self.entries[rank - 1]["leaderboard_points"] == points:
+            rank -= 1
+        return rank + 1
+
+
+def get_snapshot_team_group_ranking(snapshot, team_id):
+    """Return the leaderboard of a team's group in a snapshot, or None if the team isn't in it."""
+    teams = {team["id"]: team for team in snapshot["teams"]}
+    if team_id not in teams:
+        return None
+    group_id = teams[team_id]["leaderboard_group_id"]
+    return SnapshotRanking([team for team in snapshot["teams"] if team["leaderboard_group_id"] == group_id])
@@ -0,0 +1,177 @@
+"""
+Where leaderboards are kept.
+
+Leaderboards are Redis sorted sets and hashes, on the same Redis as the default cache. When the default cache isn't
+Redis, as in development and tests, an in process stand in with the same interface is used instead, which isn't shared
+between processes.
+"""
+
+import threading
+import time
+
+from django.core.cache import caches
+
+
+def encode(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class MemoryPipeline:
+    def __init__(self, store):
+        self.store = store
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return call
+
+    def execute(self):
+        with self.store.lock:
+            return [getattr(self.store, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class MemoryStore:
+    """The subset of the redis-py client used for leaderboards, kept in memory."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expiry = {}
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    def _expire(self, name):
+        if name in self.expiry and self.expiry[name] <= time.monotonic():
+            self.data.pop(name, None)
+            self.expiry.pop(name, None)
+
+    def _ranked(self, name):
+        members = self.data.get(name, {})
+        return sorted(members.items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    def zadd(self, name, mapping):
+        with self.lock:
+            self.data.setdefault(name, {}).update({encode(member): score for member, score in mapping.items()})
+
+    def zrem(self, name, *members):
+        with self.lock:
+            for member in members:
+                self.data.get(name, {}).pop(encode(member), None)
+
+    def zcard(self, name):
+        return len(self.data.get(name, {}))
+
+    def zrevrange(self, name, start, end, withscores=False):
+        with self.lock:
+            ranked = self._ranked(name)
+        ranked = ranked[start:] if end == -1 else ranked[start : end + 1]
+        return ranked if withscores else [member for member, _ in ranked]
+
+    def zrevrank(self, name, member):
+        with self.lock:
+            members = [ranked for ranked, _ in self._ranked(name)]
+        try:
+            return members.index(encode(member))
+        except ValueError:
+            return None
+
+    def zcount(self, name, min, max):
+        low, high = float(min), float(max)
+        with self.lock:
+            return sum(1 for score in self.data.get(name, {}).values() if low <= score <= high)
+
+    def zscore(self, name, member):
+        return self.data.get(name, {}).get(encode(member))
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self.lock:
+            values = self.data.setdefault(name, {})
+            if key is not None:
+                values[encode(key)] = encode(value)
+            for key, value in (mapping or {}).items():
+                values[encode(key)] = encode(value)
+
+    def hget(self, name, key):
+        return self.data.get(name, {}).get(encode(key))
+
+    def hmget(self, name, keys):
+        values = self.data.get(name, {})
+        return [values.get(encode(key)) for key in keys]
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.get(name, {}).pop(encode(key), None)
+
+    def rpush(self, name, *values):
+        with self.lock:
+            self.data.setdefault(name, []).extend(encode(value) for value in values)
+
+    def rpushx(self, name, value):
+        with self.lock:
+            self._expire(name)
+            if name in self.data:
+                self.data[name].append(encode(value))
+
+    def lrange(self, name, start, end):
+        with self.lock:
+            self._expire(name)
+            values = self.data.get(name, [])
+            return values[start:] if end == -1 else values[start : end + 1]
+
+    def expire(self, name, seconds):
+        with self.lock:
+            if name in self.data:
+                self.expiry[name] = time.monotonic() + seconds
+
+    def exists(self, *names):
+        with self.lock:
+            for name in names:
+                self._expire(name)
+            return sum(1 for name in names if name in self.data)
+
+    def delete(self, *names):
+        with self.lock:
+            for name in names:
+                name = name.decode() if isinstance(name, bytes) else name
+                self.data.pop(name, None)
+                self.expiry.pop(name, None)
+
+    def rename(self, src, dst):
+        with self.lock:
+            self.data[dst] = self.data.pop(src)
+            self.expiry.pop(dst, None)
+
+    def set(self, name, value):
+        with self.lock:
+            self.data[name] = encode(value)
+
+    def get(self, name):
+        with self.lock:
+            self._expire(name)
+            return self.data.get(name)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            value = int(self.data.get(name, 0)) + amount
+            self.data[name] = encode(value)
+            return value
+
+    def scan_iter(self, match="*"):
+        prefix = match.rstrip("*")
+        return [name.encode() for name in list(self.data) if name.startswith(prefix)]
+
+
+memory_store = MemoryStore()
+
+
+def get_store():
+    """Return a redis-py client for leaderboards, or the in memory stand in if the default cache isn't Redis."""
+    client = getattr(caches["default"], "client", None)
+    if client is not None and hasattr(client, "get_client"):
+        return client.get_client(write=True)
+    return memory_store
@@ -1,12 +1,45 @@
+import base64
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.reverse import reverse
-from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from rest_framework.test import APITestCase
 
 from challenge.models import Category, Challenge, Score, Solve
 from config import config
-from leaderboard.views import CTFTimeListView, GraphView, TeamListView, UserListView
+from leaderboard.matrix import encode_row
+from leaderboard.ranking import encode_score, invalidate_leaderboard, rebuild_leaderboard, refresh_on_commit
+from leaderboard.snapshots import (
+    FINAL,
+    FREEZE,
+    get_current_snapshot_time,
+    get_generation_key,
+    get_lock_key,
+    get_snapshot,
+    get_snapshot_key,
+    get_snapshot_path,
+    invalidate_snapshots,
+    take_snapshot,
+)
+from leaderboard.timeline import downsample, drop_all_timelines, get_timelines
+from leaderboard.views import (
+    CTFTimeListView,
+    GraphView,
+    MatrixScoreboardView,
+    TeamListView,
+    TeamRankView,
+    UserListView,
+    UserRankView,
+)
 from member.models import Member
-from team.models import Team
+from team.models import LeaderboardGroup, Team
 
 
 def populate():
@@ -43,6 +76,8 @@ def populate():
 
 class ScoreListTestCase(APITestCase):
     def setUp(self):
+        invalidate_leaderboard()
+        drop_all_timelines()
         GraphView.throttle_scope = ""
         user = Member(username="scorelist-test", email="scorelist-test@example.org")
         user.save()
@@ -92,6 +127,16 @@ class ScoreListTestCase(APITestCase):
         self.assertEqual(response.data["d"]["user"][0]["points"], 1400)
         self.assertEqual(response.data["d"]["team"][0]["points"], 1400)
 
+    def test_timeline_sorting(self):
+        config.set("enable_caching", False)
+        populate()
+        response = self.client.get(reverse("leaderboard-graph") + "?resolution=")
+        config.set("enable_caching", True)
+        self.assertEqual(response.data["d"]["user"][0]["leaderboard_points"], 1400)
+        self.assertEqual(response.data["d"]["user"][0]["timeline"][-1]["points"], 1400)
+        self.assertEqual(response.data["d"]["team"][0]["leaderboard_points"], 1400)
+        self.assertEqual(response.data["d"]["team"][0]["timeline"][-1]["points"], 1400)
+
     def test_user_only(self):
         populate()
         config.set("enable_teams", False)
@@ -110,9 +155,57 @@ class ScoreListTestCase(APITestCase):
         config.set("enable_caching", False)
         self.assertEqual(uncached_response.data, cached_response.data)
 
+    def test_cached_until_scored(self):
+        populate()
+        config.set("enable_caching", True)
+        url = reverse("leaderboard-graph") + "?resolution=10"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        team = Team.objects.get(name="scorelist-test14")
+        with self.captureOnCommitCallbacks(execute=True):
+            Score(team=team, user=team.owner, reason="test", points=1).save()
+            refresh_on_commit(team_ids=[team.pk], user_ids=[team.owner_id])
+        response = self.client.get(url)
+        config.set("enable_caching", False)
+        self.assertEqual(response.data["d"]["team"][0]["timeline"][-1]["points"], 1401)
+
+    def test_cached_until_user_changed(self):
+        populate()
+        config.set("enable_caching", True)
+        url = reverse("leaderboard-graph")
+        self.client.get(url)
+        user = Team.objects.get(name="scorelist-test14").owner
+        user.username = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response = self.client.get(url)
+        config.set("enable_caching", False)
+        self.assertIn("renamed", [row["user_name"] for row in response.data["d"]["user"]])
+
+    def test_invalid_resolution(self):
+        response = self.client.get(reverse("leaderboard-graph") + "?resolution=a")
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("leaderboard-graph") + "?resolution=2")
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_resolution(self):
+        config.set("enable_caching", False)
+        populate()
+        team = Team.objects.get(name="scorelist-test14")
+        for i in range(50):
+            Score(team=team, user=team.owner, reason="test", points=1).save()
+        response = self.client.get(reverse("leaderboard-graph") + "?resolution=10")
+        config.set("enable_caching", True)
+        timeline = response.data["d"]["team"][0]["timeline"]
+        self.assertEqual(len(timeline), 10)
+        self.assertEqual(timeline[0]["points"], 1400)
+        self.assertEqual(timeline[-1]["points"], 1450)
+
 
 class UserListTestCase(APITestCase):
     def setUp(self):
+        invalidate_leaderboard()
         user = Member(username="userlist-test", email="userlist-test@example.org")
         user.save()
         self.user = user
@@ -147,6 +240,7 @@ class UserListTestCase(APITestCase):
 
 class TeamListTestCase(APITestCase):
     def setUp(self):
+        invalidate_leaderboard()
         user = Member(username="userlist-test", email="userlist-test@example.org")
         user.save()
         self.user = user
@@ -181,6 +275,7 @@ class TeamListTestCase(APITestCase):
 
 class CTFTimeListTestCase(APITestCase):
     def setUp(self):
+        invalidate_leaderboard()
         user = Member(username="userlist-test", email="userlist-test@example.org")
         user.save()
         self.user = user
@@ -221,44 +316,468 @@ class CTFTimeListTestCase(APITestCase):
 
 class MatrixTestCase(APITestCase):
     def setUp(self):
+        invalidate_leaderboard()
         user = Member(username="matrix-test", email="matrix-test@example.org")
         user.save()
         self.user = user
-        TeamListView.throttle_scope = None
+        MatrixScoreboardView.throttle_scope = None
         populate()
 
+    def get_matrix(self):
+        response = self.client.get(reverse("leaderboard-matrix"))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.json()["d"]
+
     def test_authenticated(self):
         self.client.force_authenticate(self.user)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
+        response = self.client.get(reverse("leaderboard-matrix"))
         self.assertEqual(response.status_code, HTTP_200_OK)
 
     def test_unauthenticated(self):
-        response = self.client.get(reverse("leaderboard-matrix-list"))
+        response = self.client.get(reverse("leaderboard-matrix"))
         self.assertEqual(response.status_code, HTTP_200_OK)
 
     def test_length(self):
-        self.client.force_authenticate(self.user)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
-        self.assertEqual(len(response.data["d"]["results"]), 15)
+        self.assertEqual(len(self.get_matrix()["teams"]), 15)
+
+    def test_columns(self):
+        challenge_ids = list(Challenge.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(self.get_matrix()["challenges"], challenge_ids)
+
+    def test_hidden_and_unreleased_columns(self):
+        category = Challenge.objects.first().category
+        hidden = Challenge.objects.create(
+            name="matrix-hidden", category=category, description="", challenge_type="basic", challenge_metadata={},
+            flag_type="plaintext", flag_metadata={}, author="", score=1, hidden=True,
+        )
+        unreleased = Challenge.objects.create(
+            name="matrix-unreleased", category=category, description="", challenge_type="basic", challenge_metadata={},
+            flag_type="plaintext", flag_metadata={}, author="", score=1,
+            release_time=timezone.now() + timedelta(hours=1),
+        )
+        challenges = self.get_matrix()["challenges"]
+        self.assertNotIn(hidden.pk, challenges)
+        self.assertNotIn(unreleased.pk, challenges)
 
     def test_solves_present(self):
-        self.client.force_authenticate(self.user)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
-        self.assertEqual(len(response.data["d"]["results"][0]["solve_ids"]), 1)
+        matrix = self.get_matrix()
+        self.assertEqual(base64.b64decode(matrix["teams"][0]["solves"]), b"\x80")
 
     def test_solves_not_present(self):
-        self.client.force_authenticate(self.user)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
-        self.assertEqual(len(response.data["d"]["results"][1]["solve_ids"]), 0)
+        matrix = self.get_matrix()
+        self.assertEqual(base64.b64decode(matrix["teams"][1]["solves"]), b"\x00")
 
     def test_order(self):
-        self.client.force_authenticate(self.user)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
-        points = [x["leaderboard_points"] for x in response.data["d"]["results"]]
+        points = [x["leaderboard_points"] for x in self.get_matrix()["teams"]]
         self.assertEqual(points, sorted(points, reverse=True))
 
+    def test_encode_row(self):
+        columns = {challenge_id: column for column, challenge_id in enumerate(range(10, 20))}
+        self.assertEqual(base64.b64decode(encode_row(columns, [10, 17, 18, 19, 99])), b"\x81\xc0")
+
+    def test_cached_until_solve(self):
+        config.set("enable_caching", True)
+        team = Team.objects.get(name="scorelist-test13")
+        challenge = Challenge.objects.get(name="test3")
+        self.get_matrix()
+        with self.assertNumQueries(0):
+            self.get_matrix()
+        with self.captureOnCommitCallbacks(execute=True):
+            Solve.objects.create(team=team, solved_by=team.owner, challenge=challenge)
+            Team.objects.filter(pk=team.pk).update(leaderboard_points=2000)
+            refresh_on_commit(team_ids=[team.pk])
+        matrix = self.get_matrix()
+        self.assertEqual(matrix["teams"][0]["id"], team.pk)
+        self.assertEqual(base64.b64decode(matrix["teams"][0]["solves"]), b"\x80")
+
     def test_disabled_scoreboard(self):
         config.set("enable_scoreboard", False)
-        response = self.client.get(reverse("leaderboard-matrix-list"))
+        response = self.client.get(reverse("leaderboard-matrix"))
         config.set("enable_scoreboard", True)
         self.assertEqual(response.data["d"], {})
+
+
+class RankingTestCase(APITestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        TeamListView.throttle_scope = None
+        UserListView.throttle_scope = None
+
+    def test_encode_score_tiebreak(self):
+        earlier, later = timezone.now() - timedelta(hours=1), timezone.now()
+        self.assertGreater(encode_score(100, earlier), encode_score(100, later))
+        self.assertGreater(encode_score(101, later), encode_score(100, earlier))
+
+    def test_list_without_database(self):
+        populate()
+        self.client.get(reverse("leaderboard-team"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("leaderboard-team"), {"limit": 5, "offset": 5})
+        self.assertEqual([team["leaderboard_points"] for team in response.data["d"]["results"]], [900, 800, 700, 600, 500])
+        self.assertEqual(response.data["d"]["count"], 15)
+
+    def test_tiebreak_order(self):
+        populate()
+        first, second = Team.objects.filter(leaderboard_points__in=[100, 200]).order_by("leaderboard_points")
+        first.leaderboard_points = second.leaderboard_points
+        first.last_score = second.last_score - timedelta(minutes=1)
+        first.save()
+        rebuild_leaderboard()
+        response = self.client.get(reverse("leaderboard-team"))
+        names = [team["name"] for team in response.data["d"]["results"]]
+        self.assertLess(names.index(first.name), names.index(second.name))
+
+    def test_refreshed_on_commit(self):
+        populate()
+        self.client.get(reverse("leaderboard-user"))
+        user = Member.objects.get(leaderboard_points=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.leaderboard_points = 5000
+            user.save()
+        response = self.client.get(reverse("leaderboard-user"))
+        self.assertEqual(response.data["d"]["results"][0]["username"], user.username)
+
+    def test_hidden_team_removed(self):
+        populate()
+        self.client.get(reverse("leaderboard-team"))
+        team = Team.objects.get(leaderboard_points=1400)
+        with self.captureOnCommitCallbacks(execute=True):
+            team.is_visible = False
+            team.save()
+        response = self.client.get(reverse("leaderboard-team"))
+        self.assertEqual(response.data["d"]["count"], 14)
+
+    def test_group_leaderboard(self):
+        populate()
+        group = LeaderboardGroup.objects.create(name="group", has_own_leaderboard=True)
+        Team.objects.filter(leaderboard_points__gte=1000).update(leaderboard_group=group)
+        rebuild_leaderboard()
+        response = self.client.get(reverse("leaderboard-team"), {"group": group.pk})
+        self.assertEqual(response.data["d"]["count"], 5)
+        self.assertEqual(response.data["d"]["results"][0]["leaderboard_group_name"], "group")
+
+    def test_group_moved(self):
+        populate()
+        group = LeaderboardGroup.objects.create(name="group", has_own_leaderboard=True)
+        self.client.get(reverse("leaderboard-team"))
+        team = Team.objects.get(leaderboard_points=1400)
+        with self.captureOnCommitCallbacks(execute=True):
+            team.leaderboard_group = group
+            team.save()
+        response = self.client.get(reverse("leaderboard-team"), {"group": group.pk})
+        self.assertEqual(response.data["d"]["count"], 1)
+
+
+class TimelineTestCase(APITestCase):
+    def setUp(self):
+        drop_all_timelines()
+        self.user = Member.objects.create(username="timeline-test", email="timeline-test@example.org")
+        self.team = Team.objects.create(name="timeline-test", password="timeline-test", owner=self.user)
+        self.user.team = self.team
+        self.user.save()
+        now = timezone.now()
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100, timestamp=now)
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=50, penalty=10, timestamp=now)
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=999, leaderboard=False)
+
+    def tearDown(self):
+        drop_all_timelines()
+
+    def test_cumulative(self):
+        timeline = get_timelines("team", [self.team.pk])[self.team.pk]
+        self.assertEqual([points for _, points in timeline], [100, 140])
+
+    def test_appended_on_commit(self):
+        get_timelines("user", [self.user.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Score.objects.create(
+                team=self.team, user=self.user, reason="test", points=10, timestamp=timezone.now() + timedelta(hours=1)
+            )
+        Score.objects.filter(points=100).update(points=0)
+        timeline = get_timelines("user", [self.user.pk])[self.user.pk]
+        self.assertEqual([points for _, points in timeline], [100, 140, 150])
+
+    def test_dropped_on_change(self):
+        get_timelines("team", [self.team.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            score = Score.objects.get(points=100)
+            score.points = 200
+            score.save()
+        timeline = get_timelines("team", [self.team.pk])[self.team.pk]
+        self.assertEqual([points for _, points in timeline], [200, 240])
+
+    def test_downsample(self):
+        points = [(x, x * x) for x in range(100)]
+        sampled = downsample(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertEqual(sampled, sorted(sampled))
+
+    def test_downsample_short(self):
+        points = [(0, 0), (1, 1)]
+        self.assertEqual(downsample(points, 10), points)
+
+
+class RankLookupTestCase(APITestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        TeamRankView.throttle_scope = None
+        UserRankView.throttle_scope = None
+        populate()
+        self.team = Team.objects.get(name="scorelist-test10")
+
+    def get_rank(self, name, pk, **params):
+        return self.client.get(reverse(name, kwargs={"id": pk}), params)
+
+    def test_team_rank(self):
+        response = self.get_rank("leaderboard-team-rank", self.team.pk, around=2)
+        rank = response.data["d"]
+        self.assertEqual((rank["rank"], rank["position"]), (5, 5))
+        self.assertEqual(rank["entry"]["id"], self.team.pk)
+        self.assertEqual([team["leaderboard_points"] for team in rank["above"]], [1200, 1100])
+        self.assertEqual([team["leaderboard_points"] for team in rank["below"]], [900, 800])
+        self.assertEqual(rank["group"]["rank"], 5)
+
+    def test_top_rank(self):
+        team = Team.objects.get(name="scorelist-test14")
+        rank = self.get_rank("leaderboard-team-rank", team.pk, around=2).data["d"]
+        self.assertEqual((rank["rank"], rank["above"]), (1, []))
+        self.assertEqual(len(rank["below"]), 2)
+
+    def test_tied_position(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Team.objects.filter(name="scorelist-test11").update(leaderboard_points=1000)
+            refresh_on_commit(team_ids=Team.objects.filter(name="scorelist-test11").values_list("id", flat=True))
+        rank = self.get_rank("leaderboard-team-rank", self.team.pk).data["d"]
+        self.assertEqual(rank["position"], 4)
+        self.assertIn(rank["rank"], (4, 5))
+
+    def test_user_rank(self):
+        user = Member.objects.get(username="scorelist-test13")
+        rank = self.get_rank("leaderboard-user-rank", user.pk, around=0).data["d"]
+        self.assertEqual((rank["rank"], rank["position"], rank["above"], rank["below"]), (2, 2, [], []))
+        self.assertNotIn("group", rank)
+
+    def test_group(self):
+        group = LeaderboardGroup.objects.create(name="rank-group", has_own_leaderboard=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.leaderboard_group = group
+            self.team.save()
+        rank = self.get_rank("leaderboard-team-rank", self.team.pk).data["d"]
+        self.assertEqual(rank["rank"], 5)
+        self.assertEqual((rank["group"]["rank"], rank["group"]["above"], rank["group"]["below"]), (1, [], []))
+
+    def test_without_database(self):
+        self.get_rank("leaderboard-team-rank", self.team.pk)
+        with self.assertNumQueries(0):
+            response = self.get_rank("leaderboard-team-rank", self.team.pk)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.is_visible = False
+            self.team.save()
+        response = self.get_rank("leaderboard-team-rank", self.team.pk)
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+    def test_invalid_around(self):
+        response = self.get_rank("leaderboard-team-rank", self.team.pk, around=1000)
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_disabled_scoreboard(self):
+        config.set("enable_scoreboard", False)
+        response = self.get_rank("leaderboard-team-rank", self.team.pk)
+        config.set("enable_scoreboard", True)
+        self.assertEqual(response.data["d"], {})
+
+    def test_frozen(self):
+        freeze_at = time.time() - 60
+        config.set("hide_scoreboard_at", freeze_at)
+        try:
+            rank = self.get_rank("leaderboard-team-rank", self.team.pk).data["d"]
+        finally:
+            config.set("hide_scoreboard_at", -1)
+            caches["default"].delete(get_snapshot_key(FREEZE, freeze_at))
+        self.assertEqual(rank["position"], 1)
+        self.assertEqual(rank["entry"]["leaderboard_points"], 0)
+
+
+class SnapshotTestCase(APITestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        CTFTimeListView.throttle_scope = None
+        TeamListView.throttle_scope = None
+        UserListView.throttle_scope = None
+        self.now = time.time()
+        self.freeze_at = self.now - 60
+        for name, points, ago in (("snapshot-early", 100, 120), ("snapshot-late", 200, 30)):
+            user = Member.objects.create(
+                username=name, email=f"{name}@example.org", leaderboard_points=points, is_visible=True
+            )
+            team = Team.objects.create(name=name, password=name, owner=user, leaderboard_points=points)
+            user.team = team
+            user.save()
+            Score.objects.create(
+                team=team, user=user, reason="test", points=points, timestamp=timezone.now() - timedelta(seconds=ago)
+            )
+
+    def tearDown(self):
+        config.set("hide_scoreboard_at", -1)
+        config.set("end_time", time.time() + 7 * 24 * 60 * 60)
+        caches["default"].delete_many(
+            [
+                get(name, self.freeze_at)
+                for name in (FREEZE, FINAL)
+                for get in (get_snapshot_key, get_generation_key, get_lock_key)
+            ]
+        )
+
+    def test_live(self):
+        response = self.client.get(reverse("leaderboard-ctftime"))
+        self.assertEqual(response.data["standings"][0], {"team": "snapshot-late", "score": 200, "pos": 1})
+
+    def test_frozen(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        response = self.client.get(reverse("leaderboard-ctftime"))
+        self.assertEqual(
+            response.data["standings"],
+            [{"team": "snapshot-early", "score": 100, "pos": 1}, {"team": "snapshot-late", "score": 0, "pos": 2}],
+        )
+
+    def test_frozen_without_database(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        self.client.get(reverse("leaderboard-ctftime"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("leaderboard-ctftime"))
+            response = self.client.get(reverse("leaderboard-team"))
+        self.assertEqual([team["name"] for team in response.data["d"]["results"]], ["snapshot-early", "snapshot-late"])
+
+    def test_final(self):
+        config.set("end_time", self.freeze_at)
+        response = self.client.get(reverse("leaderboard-user"))
+        users = [user["username"] for user in response.data["d"]["results"]]
+        self.assertEqual(users, ["snapshot-early", "snapshot-late"])
+        self.assertEqual(response.data["d"]["results"][0]["leaderboard_points"], 100)
+
+    def test_freeze_ignored_with_scoreboard_disabled(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        config.set("enable_scoreboard", False)
+        current = get_current_snapshot_time()
+        config.set("enable_scoreboard", True)
+        self.assertIsNone(current)
+
+    def test_version(self):
+        first = take_snapshot(FREEZE, self.freeze_at)
+        second = take_snapshot(FREEZE, self.freeze_at)
+        self.assertEqual(first["version"], second["version"])
+        team = Team.objects.get(name="snapshot-late")
+        Score.objects.create(team=team, reason="test", points=5, timestamp=timezone.now() - timedelta(hours=1))
+        self.assertNotEqual(take_snapshot(FREEZE, self.freeze_at)["version"], first["version"])
+
+    def test_graph_frozen(self):
+        GraphView.throttle_scope = None
+        config.set("hide_scoreboard_at", self.freeze_at)
+        config.set("enable_caching", False)
+        rows = self.client.get(reverse("leaderboard-graph")).data["d"]["team"]
+        timelines = self.client.get(reverse("leaderboard-graph") + "?resolution=10").data["d"]["team"]
+        config.set("enable_caching", True)
+        self.assertEqual([row["team_name"] for row in rows], ["snapshot-early"])
+        self.assertEqual([team["name"] for team in timelines], ["snapshot-early", "snapshot-late"])
+        self.assertEqual(timelines[1]["leaderboard_points"], 0)
+        self.assertEqual(timelines[1]["timeline"], [])
+
+    def test_matrix_frozen(self):
+        MatrixScoreboardView.throttle_scope = None
+        category = Category.objects.create(name="snapshot", display_order=0, contained_type="test", description="")
+        challenge = Challenge.objects.create(
+            name="snapshot", category=category, description="", challenge_type="basic", challenge_metadata={},
+            flag_type="plaintext", flag_metadata={}, author="", score=1,
+            release_time=timezone.now() - timedelta(hours=1),
+        )
+        team = Team.objects.get(name="snapshot-late")
+        Solve.objects.create(team=team, solved_by=team.owner, challenge=challenge, timestamp=timezone.now())
+        config.set("hide_scoreboard_at", self.freeze_at)
+        config.set("enable_caching", False)
+        matrix = self.client.get(reverse("leaderboard-matrix")).json()["d"]
+        config.set("enable_caching", True)
+        self.assertEqual([team["name"] for team in matrix["teams"]], ["snapshot-early", "snapshot-late"])
+        self.assertEqual(base64.b64decode(matrix["teams"][1]["solves"]), b"\x00")
+
+    def test_hidden_team_drops_snapshot(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        self.client.get(reverse("leaderboard-ctftime"))
+        team = Team.objects.get(name="snapshot-early")
+        team.is_visible = False
+        with self.captureOnCommitCallbacks(execute=True):
+            team.save()
+        response = self.client.get(reverse("leaderboard-ctftime"))
+        self.assertEqual(response.data["standings"], [{"team": "snapshot-late", "score": 0, "pos": 1}])
+
+    def test_renamed_team_drops_snapshot(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        self.client.get(reverse("leaderboard-ctftime"))
+        team = Team.objects.get(name="snapshot-early")
+        team.name = "snapshot-renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            team.save()
+        response = self.client.get(reverse("leaderboard-ctftime"))
+        self.assertEqual(response.data["standings"][0]["team"], "snapshot-renamed")
+
+    def test_unrelated_save_keeps_snapshot(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        self.client.get(reverse("leaderboard-ctftime"))
+        team = Team.objects.get(name="snapshot-early")
+        team.description = "edited"
+        with self.captureOnCommitCallbacks(execute=True):
+            team.save()
+            team.owner.save()
+        with self.assertNumQueries(0):
+            self.client.get(reverse("leaderboard-ctftime"))
+
+    def test_retake_locked_serves_previous(self):
+        previous = take_snapshot(FREEZE, self.freeze_at)
+        invalidate_snapshots()
+        caches["default"].add(get_lock_key(FREEZE, self.freeze_at), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(FREEZE, self.freeze_at), previous)
+
+    def test_retake_locked_waits(self):
+        snapshot = take_snapshot(FREEZE, self.freeze_at)
+        caches["default"].delete(get_snapshot_key(FREEZE, self.freeze_at))
+        caches["default"].add(get_lock_key(FREEZE, self.freeze_at), 1)
+
+        def taken(interval):
+            caches["default"].set(get_snapshot_key(FREEZE, self.freeze_at), snapshot)
+
+        with mock.patch("leaderboard.snapshots.time.sleep", side_effect=taken), self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(FREEZE, self.freeze_at), snapshot)
+
+    def test_deleted_score_drops_snapshot(self):
+        config.set("end_time", self.freeze_at)
+        self.client.get(reverse("leaderboard-user"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Score.objects.filter(user__username="snapshot-early").delete()
+        response = self.client.get(reverse("leaderboard-user"))
+        self.assertEqual(response.data["d"]["results"][1]["leaderboard_points"], 0)
+
+    def test_new_score_keeps_snapshot(self):
+        config.set("hide_scoreboard_at", self.freeze_at)
+        self.client.get(reverse("leaderboard-ctftime"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Score.objects.create(team=Team.objects.get(name="snapshot-late"), reason="test", points=5)
+        self.assertIsNotNone(caches["default"].get(get_snapshot_key(FREEZE, self.freeze_at)))
+
+    def test_taken_early_retaken(self):
+        early = {**take_snapshot(FINAL, self.freeze_at), "taken_at": self.freeze_at - 10}
+        caches["default"].set(get_snapshot_key(FINAL, self.freeze_at), early, timeout=None)
+        self.assertGreaterEqual(get_snapshot(FINAL, self.freeze_at)["taken_at"], self.freeze_at)
+
+    @override_settings(STANDINGS_SNAPSHOT_STORAGE=True)
+    def test_storage(self):
+        snapshot = take_snapshot(FREEZE, self.freeze_at)
+        caches["default"].delete(get_snapshot_key(FREEZE, self.freeze_at))
+        try:
+            self.assertEqual(get_snapshot(FREEZE, self.freeze_at), json.loads(json.dumps(snapshot)))
+        finally:
+            default_storage.delete(get_snapshot_path(FREEZE, self.freeze_at))
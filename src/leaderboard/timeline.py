@@ -0,0 +1,158 @@
+"""
+Cumulative score timelines for the leaderboard graph.
+
+The scores counting towards each team's and user's leaderboard points are kept in a list alongside the leaderboards,
+which is appended to as each score commits rather than read back from the database for every graph. A timeline is built
+from the database the first time it's read if it's missing, and dropped whenever scores already in it change so that
+it's rebuilt. Timelines also expire after TIMELINE_TTL seconds, which bounds how long a score that committed while its
+timeline was being built can be missing from it.
+
+The graph downsamples each timeline to a fixed number of points with largest triangle three buckets, so its size and
+the cost of serialising it stay the same however many solves there are.
+"""
+
+from datetime import datetime, timezone
+
+from django.db import transaction
+from rest_framework.fields import DateTimeField
+
+from challenge.models import Score
+from leaderboard.store import get_store
+
+TIMELINE_PREFIX = "leaderboard:timeline:"
+TIMELINE_TTL = 600
+MIN_RESOLUTION = 3
+MAX_RESOLUTION = 1000
+
+# Every timeline starts with this, so that one with no scores yet still exists.
+HEADER = b"-"
+
+
+def get_timeline_key(kind, pk):
+    return f"{TIMELINE_PREFIX}{kind}:{pk}"
+
+
+def timeline_entry(timestamp, points):
+    return f"{timestamp.timestamp()},{points}"
+
+
+def build_timelines(kind, ids):
+    """Build the timelines of the given teams or users from the database, returning their entries."""
+    field = f"{kind}_id"
+    entries = {pk: [HEADER] for pk in ids}
+    scores = (
+        Score.objects.filter(**{f"{field}__in": ids}, leaderboard=True)
+        .order_by("timestamp")
+        .values_list(field, "timestamp", "points", "penalty")
+    )
+    for pk, timestamp, points, penalty in scores:
+        entries[pk].append(timeline_entry(timestamp, points - penalty).encode())
+
+    pipe = get_store().pipeline()
+    for pk, values in entries.items():
+        key = get_timeline_key(kind, pk)
+        pipe.delete(key)
+        pipe.rpush(key, *values)
+        pipe.expire(key, TIMELINE_TTL)
+    pipe.execute()
+    return entries
+
+
+def get_timelines(kind, ids, until=None):
+    """
+    Return the cumulative timelines of the given teams or users, by id.
+
+    Each is a list of (unix timestamp, leaderboard points) pairs, one for every score, oldest first, optionally only up
+    to a unix timestamp.
+    """
+    pipe = get_store().pipeline()
+    for pk in ids:
+        pipe.lrange(get_timeline_key(kind, pk), 0, -1)
+    entries = dict(zip(ids, pipe.execute()))
+    missing = [pk for pk, values in entries.items() if not values]
+    if missing:
+        entries.update(build_timelines(kind, missing))
+
+    timelines = {}
+    for pk, values in entries.items():
+        scores = sorted((tuple(map(float, value.split(b","))) for value in values[1:]), key=lambda score: score[0])
+        total, timeline = 0, []
+        for timestamp, points in scores:
+            if until is not None and timestamp > until:
+                break
+            total += int(points)
+            timeline.append((timestamp, total))
+        timelines[pk] = timeline
+    return timelines
+
+
+def append_score(score):
+    """Add a new score to its team's and user's timelines, if they've been built."""
+    entry = timeline_entry(score.timestamp, score.points - score.penalty)
+    pipe = get_store().pipeline()
+    if score.team_id is not None:
+        pipe.rpushx(get_timeline_key("team", score.team_id), entry)
+    if score.user_id is not None:
+        pipe.rpushx(get_timeline_key("user", score.user_id), entry)
+    pipe.execute()
+
+
+def append_on_commit(score):
+    transaction.on_commit(lambda: append_score(score))
+
+
+def drop_timelines(team_ids=(), user_ids=()):
+    """Drop the timelines of the given teams and users, so they're rebuilt the next time they're read."""
+    keys = [get_timeline_key("team", pk) for pk in team_ids if pk is not None]
+    keys += [get_timeline_key("user", pk) for pk in user_ids if pk is not None]
+    if keys:
+        get_store().delete(*keys)
+
+
+def drop_on_commit(team_ids=(), user_ids=()):
+    team_ids, user_ids = list(team_ids), list(user_ids)
+    transaction.on_commit(lambda: drop_timelines(team_ids, user_ids))
+
+
+def drop_all_timelines():
+    store = get_store()
+    keys = list(store.scan_iter(match=TIMELINE_PREFIX + "*"))
+    if keys:
+        store.delete(*keys)
+
+
+def downsample(points, size):
+    """Reduce a series of (x, y) points to at most size of them with largest triangle three buckets."""
+    if len(points) <= size:
+        return points
+
+    # The first and last points are always kept, and the rest are split into size - 2 buckets. From each bucket, the
+    # point forming the largest triangle with the point kept from the last bucket and the average of the next is kept.
+    sampled = [points[0]]
+    every = (len(points) - 2) / (size - 2)
+    previous = 0
+    for bucket in range(size - 2):
+        start, end = int(bucket * every) + 1, int((bucket + 1) * every) + 1
+        following = points[end : min(int((bucket + 2) * every) + 1, len(points))]
+        average_x = sum(x for x, _ in following) / len(following)
+        average_y = sum(y for _, y in following) / len(following)
+        previous_x, previous_y = points[previous]
+
+        best, best_area = start, -1
+        for index in range(start, end):
+            x, y = points[index]
+            area = abs((previous_x - average_x) * (y - previous_y) - (previous_x - x) * (average_y - previous_y))
+            if area > best_area:
+                best, best_area = index, area
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def format_timeline(timeline, resolution):
+    field = DateTimeField()
+    return [
+        {"timestamp": field.to_representation(datetime.fromtimestamp(timestamp, timezone.utc)), "points": points}
+        for timestamp, points in downsample(timeline, resolution)
+    ]
@@ -1,28 +1,34 @@
 import time
+from datetime import datetime, timezone
 
 from django.core.cache import caches
-from django.db.models import Window, Q
-from django.db.models.functions import RowNumber
-
 from rest_framework.generics import ListAPIView
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from rest_framework.views import APIView
-from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from backend.response import FormattedResponse
+from backend.response import FormattedResponse, PrerenderedResponse
 from challenge.models import Score
 from config import config
+from leaderboard.matrix import get_rendered_matrix
+from leaderboard.ranking import (
+    get_team_group_ranking,
+    get_team_ranking,
+    get_teams_version,
+    get_teams_without_group_ranking,
+    get_user_ranking,
+    get_users_version,
+)
 from leaderboard.serializers import (
-    CTFTimeSerializer,
     LeaderboardTeamScoreSerializer,
     LeaderboardUserScoreSerializer,
-    MatrixSerializer,
     TeamPointsSerializer,
     UserPointsSerializer,
 )
-from member.models import Member
-from team.models import Team
+from leaderboard.snapshots import SnapshotRanking, get_current_snapshot, get_snapshot_team_group_ranking
+from leaderboard.timeline import MAX_RESOLUTION, MIN_RESOLUTION, format_timeline, get_timelines
+from team.models import LeaderboardGroup
 
 
 def should_hide_scoreboard():
@@ -33,6 +39,35 @@ def should_hide_scoreboard():
     )
 
 
+DEFAULT_AROUND = 5
+MAX_AROUND = 50
+
+
+def get_around(request):
+    """Return how many entries either side of a rank were asked for, or None if it isn't valid."""
+    try:
+        around = int(request.query_params.get("around", DEFAULT_AROUND))
+    except ValueError:
+        return None
+    return around if 0 <= around <= MAX_AROUND else None
+
+
+def get_rank(ranking, member, around):
+    """Return the rank and position of an entry on a leaderboard along with the entries around it, or None."""
+    rank = ranking.rank(member)
+    if rank is None:
+        return None
+    start = max(rank - around, 0)
+    entries = ranking[start : rank + around + 1]
+    return {
+        "rank": rank + 1,
+        "position": ranking.position(member),
+        "entry": entries[rank - start],
+        "above": entries[: rank - start],
+        "below": entries[rank - start + 1 :],
+    }
+
+
 class CTFTimeListView(APIView):
     renderer_classes = (
         JSONRenderer,
@@ -41,8 +76,43 @@ class CTFTimeListView(APIView):
     def get(self, request, *args, **kwargs):
         if should_hide_scoreboard() or not config.get("enable_ctftime"):
             return Response({})
-        teams = Team.objects.visible().ranked()
-        return Response({"standings": CTFTimeSerializer(teams, many=True).data})
+        snapshot = get_current_snapshot()
+        teams = snapshot["teams"] if snapshot is not None else get_team_ranking()[0:]
+        standings = [
+            {"team": team["name"], "score": team["leaderboard_points"], "pos": position}
+            for position, team in enumerate(teams, start=1)
+        ]
+        return Response({"standings": standings})
+
+
+def get_graph_entries(snapshot=None):
+    """Return the entries of the top teams of each leaderboard and the top users, live or from a snapshot."""
+    graph_members = config.get("graph_members")
+    group_ids = list(LeaderboardGroup.objects.filter(has_own_leaderboard=True).values_list("id", flat=True))
+    if snapshot is not None:
+        teams = snapshot["teams"]
+        top_teams = [team for team in teams if team["leaderboard_group_id"] not in group_ids][:graph_members]
+        for group_id in group_ids:
+            top_teams += [team for team in teams if team["leaderboard_group_id"] == group_id][:graph_members]
+        return top_teams, snapshot["users"][:graph_members]
+    top_teams = get_teams_without_group_ranking()[:graph_members]
+    for group_id in group_ids:
+        top_teams += get_team_ranking(group_id)[:graph_members]
+    top_users = get_user_ranking()[:graph_members]
+    return top_teams, top_users
+
+
+def get_score_rows(kind, entries, serializer_class, until=None):
+    """Return the leaderboard scores of the given teams or users, serialized one row each, in leaderboard order."""
+    ranks = {entry["id"]: rank for rank, entry in enumerate(entries)}
+    field = f"{kind}_id"
+    scores = Score.objects.filter(**{f"{field}__in": ranks}, leaderboard=True).select_related(kind)
+    if until is not None:
+        scores = scores.filter(timestamp__lte=datetime.fromtimestamp(until, timezone.utc))
+    if kind == "team":
+        scores = scores.select_related("team__leaderboard_group")
+    scores = sorted(scores, key=lambda score: (ranks[getattr(score, field)], score.timestamp))
+    return serializer_class(scores, many=True).data
 
 
 class GraphView(APIView):
@@ -52,80 +122,130 @@ class GraphView(APIView):
         if should_hide_scoreboard():
             return FormattedResponse({})
 
+        # By default every leaderboard score of the top teams and users is a row. Given a resolution, each team and
+        # user is instead listed once, with their cumulative points downsampled to at most that many points.
+        resolution = request.query_params.get("resolution")
+        if resolution is not None:
+            try:
+                resolution = int(resolution or config.get("graph_resolution"))
+            except ValueError:
+                return FormattedResponse(m="invalid_resolution", status=HTTP_400_BAD_REQUEST)
+            if not MIN_RESOLUTION <= resolution <= MAX_RESOLUTION:
+                return FormattedResponse(m="invalid_resolution", status=HTTP_400_BAD_REQUEST)
+
+        # Refreshing a team's or user's leaderboard entry moves the teams or users version. Once the standings are
+        # frozen, only scores up to the snapshot's time are shown.
+        snapshot = get_current_snapshot()
+        until = snapshot["at"] if snapshot is not None else None
+        if snapshot is not None:
+            version = f"{snapshot['name']}_{snapshot['version']}"
+        else:
+            version = f"{get_teams_version()}_{get_users_version()}"
         cache = caches["default"]
-        cached_leaderboard = cache.get("leaderboard_graph")
+        key = f"leaderboard_graph_{resolution or 'scores'}_{config.get('graph_members')}_{version}"
+        cached_leaderboard = cache.get(key)
         if cached_leaderboard is not None and config.get("enable_caching"):
             return FormattedResponse(cached_leaderboard)
 
-        graph_members = config.get("graph_members")
-        
-        teams_with_row_numbers = Team.objects.visible().annotate(
-            row_number=Window(
-                expression=RowNumber(),
-                partition_by=['leaderboard_group'],
-                order_by=["-leaderboard_points", "last_score"]
-            )
-        )
-        top_teams = teams_with_row_numbers.filter(
-            Q(row_number__lte=graph_members) & 
-            (Q(leaderboard_group__has_own_leaderboard=True) | Q(leaderboard_group__isnull=True))
-        )
-
-        top_users = (
-            Member
-            .objects.filter(is_visible=True)
-            .order_by("-leaderboard_points", "last_score")[:graph_members]
-        )
-
-        team_scores = (
-            Score.objects.filter(team__in=top_teams, leaderboard=True)
-            .select_related("team")
-            .order_by("-team__leaderboard_points", "team__last_score")
-        )
-        user_scores = (
-            Score.objects.filter(user__in=top_users, leaderboard=True)
-            .select_related("user")
-            .order_by("-user__leaderboard_points", "user__last_score")
-        )
-
-        user_serializer = LeaderboardUserScoreSerializer(user_scores, many=True)
-        team_serializer = LeaderboardTeamScoreSerializer(team_scores, many=True)
-        response = {"user": user_serializer.data}
-        if config.get("enable_teams"):
-            response["team"] = team_serializer.data
-
-        cache.set("leaderboard_graph", response, 15)
+        top_teams, top_users = get_graph_entries(snapshot)
+        if resolution is None:
+            response = {"user": get_score_rows("user", top_users, LeaderboardUserScoreSerializer, until)}
+            if config.get("enable_teams"):
+                response["team"] = get_score_rows("team", top_teams, LeaderboardTeamScoreSerializer, until)
+        else:
+            user_timelines = get_timelines("user", [user["id"] for user in top_users], until)
+            response = {
+                "user": [
+                    {**user, "timeline": format_timeline(user_timelines[user["id"]], resolution)} for user in top_users
+                ]
+            }
+            if config.get("enable_teams"):
+                team_timelines = get_timelines("team", [team["id"] for team in top_teams], until)
+                response["team"] = [
+                    {**team, "timeline": format_timeline(team_timelines[team["id"]], resolution)}
+                    for team in top_teams
+                ]
+
+        cache.set(key, response, 3600)
         return FormattedResponse(response)
 
 
 class UserListView(ListAPIView):
     throttle_scope = "leaderboard"
-    queryset = Member.objects.filter(is_visible=True).order_by("-leaderboard_points", "last_score")
     serializer_class = UserPointsSerializer
 
     def list(self, request, *args, **kwargs):
         if should_hide_scoreboard():
             return FormattedResponse({})
-        return super(UserListView, self).list(request, *args, **kwargs)
+        snapshot = get_current_snapshot()
+        users = snapshot["users"] if snapshot is not None else get_user_ranking()
+        return self.get_paginated_response(self.paginate_queryset(users))
 
 
 class TeamListView(ListAPIView):
     throttle_scope = "leaderboard"
-    queryset = Team.objects.visible().ranked()
     serializer_class = TeamPointsSerializer
 
     def list(self, request, *args, **kwargs):
         if should_hide_scoreboard():
             return FormattedResponse({})
-        return super(TeamListView, self).list(request, *args, **kwargs)
+        group = request.query_params.get("group")
+        try:
+            group = int(group) if group is not None else None
+        except ValueError:
+            return FormattedResponse(m="invalid_group", status=HTTP_400_BAD_REQUEST)
+        snapshot = get_current_snapshot()
+        if snapshot is not None:
+            teams = [team for team in snapshot["teams"] if group is None or team["leaderboard_group_id"] == group]
+        else:
+            teams = get_team_ranking(group)
+        return self.get_paginated_response(self.paginate_queryset(teams))
+
+
+class UserRankView(APIView):
+    throttle_scope = "leaderboard"
 
+    def get(self, request, id):
+        if should_hide_scoreboard():
+            return FormattedResponse({})
+        around = get_around(request)
+        if around is None:
+            return FormattedResponse(m="invalid_around", status=HTTP_400_BAD_REQUEST)
+        snapshot = get_current_snapshot()
+        ranking = SnapshotRanking(snapshot["users"]) if snapshot is not None else get_user_ranking()
+        rank = get_rank(ranking, id, around)
+        if rank is None:
+            return FormattedResponse(m="user_not_found", status=HTTP_404_NOT_FOUND)
+        return FormattedResponse(rank)
+
+
+class TeamRankView(APIView):
+    throttle_scope = "leaderboard"
 
-class MatrixScoreboardView(ReadOnlyModelViewSet):
+    def get(self, request, id):
+        if should_hide_scoreboard():
+            return FormattedResponse({})
+        around = get_around(request)
+        if around is None:
+            return FormattedResponse(m="invalid_around", status=HTTP_400_BAD_REQUEST)
+        snapshot = get_current_snapshot()
+        if snapshot is not None:
+            ranking = SnapshotRanking(snapshot["teams"])
+            group_ranking = get_snapshot_team_group_ranking(snapshot, id)
+        else:
+            ranking = get_team_ranking()
+            group_ranking = get_team_group_ranking(id)
+        rank = get_rank(ranking, id, around)
+        if rank is None:
+            return FormattedResponse(m="team_not_found", status=HTTP_404_NOT_FOUND)
+        rank["group"] = get_rank(group_ranking, id, around) if group_ranking is not None else None
+        return FormattedResponse(rank)
+
+
+class MatrixScoreboardView(APIView):
     throttle_scope = "leaderboard"
-    queryset = Team.objects.visible().ranked().prefetch_solves()
-    serializer_class = MatrixSerializer
 
-    def list(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
         if should_hide_scoreboard():
             return FormattedResponse({})
-        return super(MatrixScoreboardView, self).list(request, *args, **kwargs)
+        return PrerenderedResponse(get_rendered_matrix(get_current_snapshot()))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('member', '0010_fix_client_ip_addresses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(models.OrderBy(models.F('leaderboard_points'), descending=True), models.F('last_score'), condition=models.Q(('is_visible', True)), name='member_member_leaderboard_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userip',
+            index=models.Index(fields=['user', 'ip'], name='member_userip_user_ip_idx'),
+        ),
+    ]
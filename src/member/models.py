@@ -4,7 +4,7 @@ from enum import IntEnum
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import SET_NULL
+from django.db.models import SET_NULL, F, Q
 from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -55,6 +55,14 @@ class Member(ExportModelOperationsMixin("member"), AbstractUser):
                 name='member_member_username_uniq_idx',
             ),
         ]
+        indexes = [
+            models.Index(
+                F("leaderboard_points").desc(),
+                "last_score",
+                condition=Q(is_visible=True),
+                name="member_member_leaderboard_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.username
@@ -85,6 +93,9 @@ class UserIP(ExportModelOperationsMixin("user_ip"), models.Model):
     last_seen = models.DateTimeField(default=timezone.now)
     user_agent = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "ip"], name="member_userip_user_ip_idx")]
+
     @staticmethod
     def hook(request):
         if not request.user.is_authenticated:
@@ -3,6 +3,7 @@ from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.viewsets import ModelViewSet
 
+from backend.pagination import FormattedKeysetPagination
 from backend.permissions import AdminOrReadOnlyVisible, ReadOnlyBot
 from backend.viewsets import AdminListModelViewSet, AuditLoggedViewSet
 from member.models import UserIP, Member
@@ -46,6 +47,7 @@ class SelfView(RetrieveUpdateAPIView):
 class MemberViewSet(AuditLoggedViewSet, AdminListModelViewSet):
     permission_classes = (AdminOrReadOnlyVisible,)
     throttle_scope = "member"
+    pagination_class = FormattedKeysetPagination
     serializer_class = MemberSerializer
     admin_serializer_class = AdminMemberSerializer
     list_serializer_class = ListMemberSerializer
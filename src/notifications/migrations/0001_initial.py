@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:00
+
+from django.db import migrations, models
+import django.utils.timezone
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=64)),
+                ('sink', models.JSONField(help_text='The options of the sink the notification is sent to, as they were when it was queued.')),
+                ('payload', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('delivered', models.DateTimeField(null=True)),
+                ('failed', models.BooleanField(default=False)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('delivered__isnull', True), ('failed', False)), fields=['next_attempt'], name='notification_pending_idx')],
+            },
+            bases=(django_prometheus.models.ExportModelOperationsMixin('notification'), models.Model),
+        ),
+    ]
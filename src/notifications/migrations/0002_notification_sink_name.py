@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    # The sink options are dropped rather than converted so that no webhook URL survives in the table. Notifications
+    # still queued from before have no sink name, and are given up on as being to an unknown sink.
+    operations = [
+        migrations.RemoveField(
+            model_name='notification',
+            name='sink',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sink',
+            field=models.CharField(default='', help_text='The name of the sink the notification is sent to, its options are looked up when sent.', max_length=64),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import models
+from django.db.models import JSONField, Q
+from django.utils import timezone
+from django_prometheus.models import ExportModelOperationsMixin
+
+
+class Notification(ExportModelOperationsMixin("notification"), models.Model):
+    """
+    A notification of an event waiting to be delivered to a sink, such as a first blood webhook.
+
+    Notifications are queued in the same transaction as the change they announce, and delivered once it has committed
+    by the dispatch_notifications management command.
+    """
+
+    event = models.CharField(max_length=64)
+    sink = models.CharField(
+        max_length=64, help_text="The name of the sink the notification is sent to, its options are looked up when sent."
+    )
+    payload = JSONField(default=dict)
+    created = models.DateTimeField(default=timezone.now)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    delivered = models.DateTimeField(null=True)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt"],
+                condition=Q(delivered__isnull=True, failed=False),
+                name="notification_pending_idx",
+            )
+        ]
@@ -0,0 +1,138 @@
+"""
+The notification outbox.
+
+notify() queues a notification for each configured sink as rows in the same transaction as the change being
+announced, so nothing is sent for a change which is rolled back and nothing slow happens while the request holds its
+locks. A Dispatcher, run in the background by the dispatch_notifications management command, delivers them over a
+pooled HTTP session with a timeout, retrying failures with exponential backoff and holding back every notification to
+a sink which has rate limited it until the limit expires. Delivered and failed notifications are pruned once they're
+older than NOTIFICATION_RETENTION.
+"""
+
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from notifications.models import Notification
+from notifications.sinks import get_configured_sinks, get_sink, get_sinks
+
+BACKOFF = 5
+BATCH_SIZE = 20
+PRUNE_INTERVAL = timedelta(hours=1)
+
+logger = logging.getLogger(__name__)
+
+
+def notify(event, **payload):
+    """Queue an event for every sink configured to receive it, to be sent once the current transaction commits."""
+    Notification.objects.bulk_create(
+        Notification(event=event, sink=name, payload=payload) for name in get_configured_sinks(event)
+    )
+
+
+def get_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Dispatcher:
+    """Delivers queued notifications, keeping an HTTP session and the sinks' rate limits between batches."""
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+        self.rate_limited_until = {}
+        self.pruned_at = None
+
+    def claim(self, limit):
+        """Take the notifications which are due, leasing them so other dispatchers leave them alone meanwhile."""
+        now = timezone.now()
+        with transaction.atomic():
+            notifications = list(
+                Notification.objects.select_for_update(skip_locked=True)
+                .filter(delivered__isnull=True, failed=False, next_attempt__lte=now)
+                .order_by("next_attempt")[:limit]
+            )
+            # Long enough for every claimed notification to time out, after which they're retried if we've died.
+            lease = now + timedelta(seconds=settings.NOTIFICATION_TIMEOUT * (len(notifications) + 1))
+            Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(
+                next_attempt=lease
+            )
+        return notifications
+
+    def dispatch(self, limit=BATCH_SIZE):
+        """Attempt to deliver the notifications which are due, returning how many were attempted."""
+        now = timezone.now()
+        if self.pruned_at is None or self.pruned_at <= now - PRUNE_INTERVAL:
+            self.prune(now)
+            self.pruned_at = now
+        notifications = self.claim(limit)
+        sinks = get_sinks()
+        for notification in notifications:
+            try:
+                self.deliver(notification, sinks)
+            except Exception as e:
+                logger.exception("Error delivering %s notification %d", notification.event, notification.pk)
+                self.retry(notification, repr(e))
+        return len(notifications)
+
+    def prune(self, now):
+        """Delete the notifications which were delivered or given up on longer ago than they're kept for."""
+        cutoff = now - timedelta(seconds=settings.NOTIFICATION_RETENTION)
+        Notification.objects.filter(Q(delivered__lt=cutoff) | Q(failed=True, created__lt=cutoff)).delete()
+
+    def deliver(self, notification, sinks):
+        now = timezone.now()
+        options = sinks.get(notification.sink)
+        if options is None:
+            return self.fail(notification, "Unknown sink")
+        sink = get_sink(options)
+
+        limited_until = self.rate_limited_until.get(sink.key)
+        if limited_until is not None and limited_until > now:
+            notification.next_attempt = limited_until
+            notification.save(update_fields=["next_attempt"])
+            return
+
+        try:
+            status, retry_after = sink.send(
+                self.session, sink.format(notification.event, notification.payload), settings.NOTIFICATION_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            return self.retry(notification, str(e))
+
+        if 200 <= status < 300:
+            notification.delivered = now
+            notification.save(update_fields=["delivered"])
+        elif status == 429:
+            limited_until = now + timedelta(seconds=retry_after if retry_after is not None else BACKOFF)
+            self.rate_limited_until[sink.key] = limited_until
+            notification.next_attempt = limited_until
+            notification.last_error = "Rate limited"
+            notification.save(update_fields=["next_attempt", "last_error"])
+        elif status >= 500:
+            self.retry(notification, f"HTTP {status}")
+        else:
+            self.fail(notification, f"HTTP {status}")
+
+    def retry(self, notification, error):
+        notification.attempts += 1
+        if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            return self.fail(notification, error)
+        notification.next_attempt = timezone.now() + timedelta(seconds=BACKOFF * 2 ** (notification.attempts - 1))
+        notification.last_error = error
+        notification.save(update_fields=["attempts", "next_attempt", "last_error"])
+
+    def fail(self, notification, error):
+        logger.warning("Giving up on %s notification %d: %s", notification.event, notification.pk, error)
+        notification.failed = True
+        notification.last_error = error
+        notification.save(update_fields=["attempts", "failed", "last_error"])
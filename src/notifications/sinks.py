@@ -0,0 +1,117 @@
+"""
+Destinations notifications are delivered to.
+
+Sinks are configured as a list of option dicts in the notification_sinks config key, e.g.
+``{"name": "announcements", "type": "slack", "url": "https://hooks.slack.com/...", "events": ["first_blood"]}``.
+Leaving out ``events`` sends every event to the sink. Queued notifications only record the name of their sink, and its
+options are looked up when they're sent, so the webhook URLs stay in the config. A sink without a name is named after
+its position in the list. The older firstblood_webhook key is still honoured as a slack sink, named firstblood_webhook,
+for first bloods.
+"""
+
+from typing import Optional
+
+from config import config
+
+
+class Sink:
+    """Formats and sends notifications to one destination."""
+
+    def __init__(self, options):
+        self.options = options
+
+    def format(self, event, payload) -> dict:
+        return {"event": event, **payload}
+
+    def send(self, session, body, timeout) -> tuple[int, Optional[float]]:
+        """Send a formatted notification, returning the response status and how long to wait if rate limited."""
+        response = session.post(self.options["url"], json=body, timeout=timeout)
+        retry_after = response.headers.get("Retry-After")
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        return response.status_code, retry_after
+
+    @property
+    def key(self):
+        """Identify the destination, so that a rate limit on one notification holds back the rest sent to it."""
+        return self.options.get("url", self.options["type"])
+
+
+class JSONSink(Sink):
+    """Posts the event and its payload as JSON."""
+
+
+def clean(text):
+    """Stop names from breaking out of code spans or mentioning anyone."""
+    return text.replace("`", "").replace("@", "@\u200b")
+
+
+class SlackSink(Sink):
+    """Posts Slack formatted messages, also used for Discord through its Slack compatible webhook endpoint."""
+
+    def __init__(self, options):
+        super().__init__(options)
+        url = options["url"]
+        if "discord.com" in url and not url.endswith("/slack"):
+            self.options = dict(options, url=url + "/slack")
+
+    def format(self, event, payload):
+        if event == "first_blood":
+            return {
+                "username": "First Bloods",
+                "attachments": [
+                    {
+                        "title": f":drop_of_blood: First Blood on `{clean(payload['challenge'])}`!",
+                        "text": f"By team `{clean(payload['team'])}`",
+                        "color": "#ff0000",
+                    }
+                ],
+            }
+        return {"text": f"{event}: " + ", ".join(f"{key} `{clean(str(value))}`" for key, value in payload.items())}
+
+
+class StubSink(Sink):
+    """
+    Keeps notifications in memory instead of sending them anywhere, for testing offline.
+
+    The ``status`` and ``retry_after`` options set the response it pretends to get.
+    """
+
+    deliveries = []
+
+    def send(self, session, body, timeout):
+        status = self.options.get("status", 200)
+        if 200 <= status < 300:
+            StubSink.deliveries.append(body)
+        return status, self.options.get("retry_after")
+
+
+SINKS = {
+    "json": JSONSink,
+    "slack": SlackSink,
+    "stub": StubSink,
+}
+
+
+def get_sink(options) -> Sink:
+    return SINKS[options["type"]](options)
+
+
+def get_sinks() -> dict[str, dict]:
+    """Return the options of every configured sink by name."""
+    sinks = {
+        options.get("name", f"sink_{index}"): options
+        for index, options in enumerate(config.get("notification_sinks") or [])
+        if options.get("type") in SINKS
+    }
+    hook = config.get("firstblood_webhook")
+    if hook:
+        sinks["firstblood_webhook"] = {"type": "slack", "url": hook, "events": ["first_blood"]}
+    return sinks
+
+
+def get_configured_sinks(event) -> list[str]:
+    """Return the names of every sink configured to receive an event."""
+    return [name for name, options in get_sinks().items() if event in options.get("events", [event])]
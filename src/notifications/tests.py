@@ -0,0 +1,143 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from config import config
+from notifications.models import Notification
+from notifications.outbox import Dispatcher, notify
+from notifications.sinks import SlackSink, StubSink, get_configured_sinks, get_sinks
+
+
+class NotifyTestCase(TestCase):
+    def tearDown(self):
+        config.set("notification_sinks", [])
+        config.set("firstblood_webhook", "")
+
+    def test_notify_no_sinks(self):
+        notify("first_blood", challenge="a", team="b")
+        self.assertFalse(Notification.objects.exists())
+
+    def test_notify_queues_per_sink(self):
+        config.set("notification_sinks", [{"type": "stub"}, {"type": "json", "url": "https://example.com"}])
+        notify("first_blood", challenge="a", team="b")
+        self.assertEqual(sorted(Notification.objects.values_list("sink", flat=True)), ["sink_0", "sink_1"])
+
+    def test_notify_stores_sink_name(self):
+        config.set("notification_sinks", [{"name": "hook", "type": "json", "url": "https://example.com/secret"}])
+        notify("first_blood", challenge="a", team="b")
+        notification = Notification.objects.get()
+        self.assertEqual(notification.sink, "hook")
+        self.assertNotIn("secret", str(Notification.objects.values().get()))
+
+    def test_sink_event_filter(self):
+        config.set("notification_sinks", [{"type": "stub", "events": ["other"]}])
+        self.assertEqual(get_configured_sinks("first_blood"), [])
+
+    def test_legacy_webhook(self):
+        config.set("firstblood_webhook", "https://example.com/hook")
+        self.assertEqual(get_configured_sinks("first_blood"), ["firstblood_webhook"])
+        self.assertEqual(get_sinks()["firstblood_webhook"]["url"], "https://example.com/hook")
+        self.assertEqual(get_configured_sinks("other"), [])
+
+    def test_slack_sink_discord_url(self):
+        sink = SlackSink({"type": "slack", "url": "https://discord.com/api/webhooks/1/a"})
+        self.assertEqual(sink.options["url"], "https://discord.com/api/webhooks/1/a/slack")
+
+    def test_slack_sink_cleans_names(self):
+        body = SlackSink({"type": "slack", "url": ""}).format("first_blood", {"challenge": "`a`", "team": "@everyone"})
+        self.assertEqual(body["attachments"][0]["text"], "By team `@\u200beveryone`")
+
+
+class DispatcherTestCase(TestCase):
+    def setUp(self):
+        StubSink.deliveries.clear()
+
+    def tearDown(self):
+        config.set("notification_sinks", [])
+
+    def queue(self, **sink):
+        config.set("notification_sinks", [{"name": "stub", "type": "stub", **sink}])
+        return Notification.objects.create(event="first_blood", sink="stub", payload={"team": "a"})
+
+    def test_deliver(self):
+        notification = self.queue()
+        Dispatcher().dispatch()
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.delivered)
+        self.assertEqual(StubSink.deliveries, [{"event": "first_blood", "team": "a"}])
+
+    def test_delivered_once(self):
+        self.queue()
+        dispatcher = Dispatcher()
+        dispatcher.dispatch()
+        self.assertEqual(dispatcher.dispatch(), 0)
+        self.assertEqual(len(StubSink.deliveries), 1)
+
+    def test_server_error_retried(self):
+        notification = self.queue(status=502)
+        Dispatcher().dispatch()
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 1)
+        self.assertFalse(notification.failed)
+        self.assertGreater(notification.next_attempt, timezone.now())
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=1)
+    def test_server_error_gives_up(self):
+        notification = self.queue(status=502)
+        Dispatcher().dispatch()
+        notification.refresh_from_db()
+        self.assertTrue(notification.failed)
+
+    def test_client_error_not_retried(self):
+        notification = self.queue(status=404)
+        Dispatcher().dispatch()
+        notification.refresh_from_db()
+        self.assertTrue(notification.failed)
+
+    def test_rate_limit_holds_back_sink(self):
+        first, second = self.queue(status=429, retry_after=60), self.queue(status=429, retry_after=60)
+        Dispatcher().dispatch()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.attempts, 0)
+        self.assertGreater(second.next_attempt, timezone.now() + timedelta(seconds=50))
+
+    def test_timeout_retried(self):
+        session = mock.Mock()
+        session.post.side_effect = requests.exceptions.Timeout("timed out")
+        config.set("notification_sinks", [{"name": "json", "type": "json", "url": "https://example.com"}])
+        notification = Notification.objects.create(event="first_blood", sink="json", payload={})
+        Dispatcher(session=session).dispatch()
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(session.post.call_args.kwargs["timeout"], 5)
+
+    def test_unknown_sink(self):
+        notification = Notification.objects.create(event="first_blood", sink="removed", payload={})
+        Dispatcher().dispatch()
+        notification.refresh_from_db()
+        self.assertTrue(notification.failed)
+
+    def test_sink_error_retried(self):
+        first, second = self.queue(), self.queue()
+        with mock.patch.object(StubSink, "format", side_effect=[ValueError("bad payload"), {"team": "a"}]):
+            self.assertEqual(Dispatcher().dispatch(), 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.attempts, 1)
+        self.assertIn("bad payload", first.last_error)
+        self.assertGreater(first.next_attempt, timezone.now())
+        self.assertIsNotNone(second.delivered)
+
+    @override_settings(NOTIFICATION_RETENTION=60)
+    def test_prune(self):
+        old = timezone.now() - timedelta(minutes=5)
+        Notification.objects.create(event="first_blood", sink="stub", created=old, delivered=old)
+        Notification.objects.create(event="first_blood", sink="stub", created=old, failed=True)
+        recent = Notification.objects.create(event="first_blood", sink="stub", delivered=timezone.now())
+        pending = Notification.objects.create(event="first_blood", sink="stub", created=old, next_attempt=old)
+        Dispatcher().prune(timezone.now())
+        self.assertEqual(set(Notification.objects.values_list("pk", flat=True)), {recent.pk, pending.pk})
@@ -2,9 +2,20 @@ import abc
 
 from plugins.base import Plugin
 
+# Prepared plugin state by challenge id, as (version, state), kept for the life of the worker.
+_prepared = {}
+
+
+def clear_prepared(challenge_id):
+    _prepared.pop(challenge_id, None)
+
 
 class FlagPlugin(Plugin, abc.ABC):
     plugin_type = "flag"
+    # Longer flags are rejected without being checked.
+    max_flag_length = 1000
+    # Whether checks can take long enough on hostile input to need running in a worker process with a time budget.
+    isolated = False
 
     def __init__(self, challenge):
         self.challenge = challenge
@@ -13,6 +24,35 @@ class FlagPlugin(Plugin, abc.ABC):
     def check(self, flag, *args, **kwargs):
         pass
 
+    def prepare(self):
+        """
+        Work out anything check needs which doesn't depend on the submitted flag, like a compiled pattern.
+
+        The result is available to check as self.prepared, and is only worked out again when the challenge's version
+        changes or the challenge is saved.
+        """
+        return None
+
+    def get_version(self):
+        """
+        Identify the state prepare depends on, so that prepared state is rebuilt whenever it changes.
+
+        This is the challenge's flag_version, which is bumped by every save changing its flag, rather than the flag
+        metadata itself so that checking which state to use doesn't take time proportional to the reference flag.
+        """
+        return str(self.challenge.flag_version)
+
+    @property
+    def prepared(self):
+        version = (self.name, self.get_version())
+        cached = _prepared.get(self.challenge.pk)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        state = self.prepare()
+        if self.challenge.pk is not None:
+            _prepared[self.challenge.pk] = (version, state)
+        return state
+
     @abc.abstractmethod
     def self_check(self):
         """Return a list of strings describing any problems with the configuration of this plugin."""
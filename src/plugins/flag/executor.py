@@ -0,0 +1,158 @@
+"""
+Time bounded flag checking.
+
+Flags are attacker controlled, and some checks, like matching a regex, can take exponentially long on the wrong input.
+Flags longer than the plugin's max_flag_length are rejected without being checked. Checks by plugins marked as
+isolated are run in a small pool of worker processes, each with a budget of FLAG_CHECK_TIMEOUT seconds of CPU time,
+so that a slow check ties up a worker process rather than a thread serving requests. Checks still appear synchronous
+to the client, the request thread waits for the result.
+
+Waiting for a free worker has its own limit, FLAG_CHECK_QUEUE_TIMEOUT, so a burst of submissions queueing behind each
+other doesn't eat into their CPU budgets. If no worker is free within it, or a worker stops responding entirely, the
+check is treated as having timed out too, so the number of request threads waiting on flag checks stays bounded. The
+pool is started and its workers set up when a gunicorn worker boots, see gunicorn_config.py, so the first checks don't
+wait for that either.
+"""
+
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+flag_check_timeouts_total = Counter(
+    "flag_check_timeouts_total",
+    "Flag checks which ran out of time, by flag type and reason",
+    labelnames=("flag_type", "reason"),
+)
+flag_check_oversized_total = Counter(
+    "flag_check_oversized_total",
+    "Flags rejected for being longer than their flag type allows",
+    labelnames=("flag_type",),
+)
+
+
+class FlagCheckTimeout(Exception):
+    """Raised when a flag couldn't be checked within its time budget."""
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _raise_out_of_time(signum, frame):
+    raise _OutOfTime()
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    signal.signal(signal.SIGPROF, _raise_out_of_time)
+
+
+def _warm():
+    return None
+
+
+def _timed_check(plugin, flag, budget, kwargs):
+    """Run a check in a worker process, returning None if it used up its CPU time budget."""
+    signal.setitimer(signal.ITIMER_PROF, budget)
+    try:
+        return bool(plugin.check(flag, **kwargs))
+    except _OutOfTime:
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+class FlagCheckExecutor:
+    """A pool of worker processes for isolated flag checks, shared by every thread in the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+        self.slots = None
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                workers = settings.FLAG_CHECK_WORKERS
+                self.pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=_init_worker,
+                )
+                self.slots = threading.BoundedSemaphore(self.slot_count)
+            return self.pool, self.slots
+
+    @property
+    def slot_count(self):
+        """How many checks can be submitted to the pool at once, the rest wait for one to finish."""
+        return settings.FLAG_CHECK_WORKERS * 2
+
+    def start(self):
+        """Start the pool and wait for every worker process to be set up, so the first checks don't have to."""
+        pool, _ = self.get_pool()
+        for future in [pool.submit(_warm) for _ in range(settings.FLAG_CHECK_WORKERS)]:
+            future.result()
+
+    def reset(self, pool):
+        """Kill a pool which has stopped responding, so the next check starts a new one."""
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = None
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, plugin, flag, wait=False, **kwargs):
+        """Check a flag in the pool, with wait, waiting for a free worker for as long as it takes."""
+        pool, slots = self.get_pool()
+        budget = settings.FLAG_CHECK_TIMEOUT
+        if not slots.acquire(timeout=None if wait else settings.FLAG_CHECK_QUEUE_TIMEOUT):
+            raise FlagCheckTimeout("busy")
+        try:
+            future = pool.submit(_timed_check, plugin, flag, budget, kwargs)
+            # The budget is CPU time in the worker, so allow for waiting behind another check, and for process startup
+            # if the pool was restarted.
+            result = future.result(timeout=budget * 4 + 10)
+        except (FutureTimeoutError, BrokenProcessPool):
+            logger.warning("Flag check worker stopped responding, restarting the pool")
+            self.reset(pool)
+            raise FlagCheckTimeout("unresponsive")
+        finally:
+            slots.release()
+        if result is None:
+            raise FlagCheckTimeout("cpu")
+        return result
+
+
+executor = FlagCheckExecutor()
+
+
+def check_flag(plugin, flag, wait=False, **kwargs):
+    """
+    Check a flag against a flag plugin within the plugin's limits.
+
+    Returns whether the flag is correct, raising FlagCheckTimeout if that couldn't be worked out in time. With wait, the
+    check waits for a free worker however long that takes, so only the check itself can time out.
+    """
+    if isinstance(flag, str) and len(flag) > plugin.max_flag_length:
+        flag_check_oversized_total.labels(plugin.name).inc()
+        return False
+    if not plugin.isolated or not settings.FLAG_CHECK_WORKERS:
+        return bool(plugin.check(flag, **kwargs))
+    try:
+        return executor.check(plugin, flag, wait=wait, **kwargs)
+    except FlagCheckTimeout as e:
+        flag_check_timeouts_total.labels(plugin.name, str(e)).inc()
+        raise
@@ -32,16 +32,21 @@ passes = {
 class LenientFlagPlugin(FlagPlugin):
     name = "lenient"
 
+    def prepare(self):
+        exclude_passes = self.challenge.flag_metadata.get("exclude_passes", [])
+        operations = [passes[operation] for operation in passes if operation not in exclude_passes]
+        real_flag = self.challenge.flag_metadata["flag"]
+        for operation in operations:
+            real_flag = operation(real_flag)
+        return operations, real_flag
+
+    def get_version(self):
+        return super().get_version() + config.get("flag_prefix")
+
     def check(self, flag, *args, **kwargs):
-        flag_metadata = self.challenge.flag_metadata
-        if "exclude_passes" not in flag_metadata:
-            flag_metadata["exclude_passes"] = []
-
-        real_flag = flag_metadata["flag"]
-        for operation in passes:
-            if operation not in flag_metadata["exclude_passes"]:
-                flag = passes[operation](flag)
-                real_flag = passes[operation](real_flag)
+        operations, real_flag = self.prepared
+        for operation in operations:
+            flag = operation(flag)
         return real_flag == flag
 
     def self_check(self):
@@ -11,9 +11,13 @@ def clean(text):
 
 class LongTextFlagPlugin(FlagPlugin):
     name = "long_text"
+    max_flag_length = 100000
+
+    def prepare(self):
+        return clean(self.challenge.flag_metadata["flag"])
 
     def check(self, flag, *args, **kwargs):
-        return clean(self.challenge.flag_metadata["flag"]) == clean(flag)
+        return self.prepared == clean(flag)
 
     def self_check(self):
         """Ensure the set flag metadata has a 'flag' property"""
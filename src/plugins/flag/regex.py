@@ -5,10 +5,14 @@ from plugins.flag.base import FlagPlugin
 
 class RegexFlagPlugin(FlagPlugin):
     name = "regex"
+    max_flag_length = 256
+    isolated = True
+
+    def prepare(self):
+        return re.compile(self.challenge.flag_metadata["flag"])
 
     def check(self, flag, *args, **kwargs):
-        regex = re.compile(self.challenge.flag_metadata["flag"])
-        return regex.fullmatch(flag)
+        return self.prepared.fullmatch(flag)
 
     def self_check(self):
         if not self.challenge.flag_metadata.get("flag", ""):
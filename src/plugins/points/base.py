@@ -1,12 +1,15 @@
 import abc
 import time
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import F, Sum
-from django.utils import timezone
 
-from challenge.models import Score, Solve
+from challenge.models import Challenge, Score, Solve
 from config import config
 from hint.models import HintUse
+from leaderboard.ranking import refresh_on_commit
+from member.models import Member
 from plugins.base import Plugin
 
 
@@ -25,6 +28,14 @@ class PointsPlugin(Plugin, abc.ABC):
         return self.challenge.score
 
     def score(self, user, team, flag, solves, *args, **kwargs):
+        """
+        Score a correct flag for a team, returning the new solve, or None if the team or user has already solved it.
+
+        The solve is inserted relying on the unique correct solve constraints rather than locking the challenge, the
+        team's and user's points are incremented in place, and first blood goes to whichever solve sets it first.
+        """
+        from team.models import Team
+
         challenge = self.challenge
         points = self.get_points(team, flag, solves.count())
 
@@ -33,38 +44,51 @@ class PointsPlugin(Plugin, abc.ABC):
         deducted = min(points, deducted)
 
         scored = config.get("end_time") >= time.time() and config.get("enable_scoring")
-        score = Score(
-            team=team,
-            reason="challenge",
-            points=points,
-            penalty=deducted,
-            leaderboard=scored,
-            user=user,
-            tiebreaker=challenge.tiebreaker,
-        )
-        score.save()
-
-        solve = Solve(
-            team=team,
-            solved_by=user,
-            challenge=challenge,
-            first_blood=challenge.first_blood is None,
-            flag=flag,
-            score=score,
-        )
-        solve.save()
-
-        user.points += points - deducted
-        team.points += points - deducted
+        try:
+            with transaction.atomic():
+                score = Score(
+                    team=team,
+                    reason="challenge",
+                    points=points,
+                    penalty=deducted,
+                    leaderboard=scored,
+                    user=user,
+                    tiebreaker=challenge.tiebreaker,
+                )
+                score.save()
+
+                solve = Solve(team=team, solved_by=user, challenge=challenge, flag=flag, score=score)
+                solve.save()
+        except IntegrityError:
+            return None
+
+        if Challenge.objects.filter(pk=challenge.pk, first_blood__isnull=True).update(first_blood=user):
+            Solve.objects.filter(pk=solve.pk).update(first_blood=True)
+            solve.first_blood = True
+            challenge.first_blood = user
+
+        gained = points - deducted
+        updates = {"points": F("points") + gained}
+        user.points += gained
+        team.points += gained
         if scored:
-            user.leaderboard_points += points - deducted
-            team.leaderboard_points += points - deducted
+            updates["leaderboard_points"] = F("leaderboard_points") + gained
+            user.leaderboard_points += gained
+            team.leaderboard_points += gained
             if score.tiebreaker:
-                user.last_score = timezone.now()
-                team.last_score = timezone.now()
+                updates["last_score"] = user.last_score = team.last_score = score.timestamp
+        Member.objects.filter(pk=user.pk).update(**updates)
+        Team.objects.filter(pk=team.pk).update(**updates)
+        refresh_on_commit(team_ids=[team.pk], user_ids=[user.pk])
 
         return solve
 
     def register_incorrect_attempt(self, user, team, flag, solves, *args, **kwargs):
-        if config.get("enable_track_incorrect_submissions"):
+        if not config.get("enable_track_incorrect_submissions"):
+            return
+        if settings.BUFFER_INCORRECT_ATTEMPTS:
+            from challenge.attempts import record_incorrect_attempt
+
+            record_incorrect_attempt(user, team, self.challenge, flag)
+        else:
             Solve(team=team, solved_by=user, challenge=self.challenge, flag=flag, correct=False, score=None).save()
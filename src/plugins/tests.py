@@ -1,3 +1,7 @@
+import threading
+from unittest import mock
+
+from django.test import override_settings
 from rest_framework.test import APITestCase
 
 from challenge.models import Category, Challenge, Score, Solve
@@ -5,6 +9,7 @@ from challenge.tests.mixins import ChallengeSetupMixin
 from config import config
 from member.models import Member
 from plugins import plugins
+from plugins.flag.executor import FlagCheckExecutor, FlagCheckTimeout, check_flag
 from plugins.flag.hashed import HashedFlagPlugin
 from plugins.flag.lenient import LenientFlagPlugin
 from plugins.flag.plaintext import PlaintextFlagPlugin
@@ -101,6 +106,11 @@ class LenientFlagPluginTestCase(APITestCase):
         self.challenge.flag_metadata.pop("exclude_passes")
         self.assertTrue(self.plugin.check("A"))
 
+    def test_check_leaves_metadata(self):
+        self.challenge.flag_metadata.pop("exclude_passes")
+        self.plugin.check("A")
+        self.assertEqual(self.challenge.flag_metadata, {"flag": "ractf{a}"})
+
 
 class PlaintextFlagPluginTestCase(APITestCase):
     def setUp(self):
@@ -177,6 +187,106 @@ class RegexFlagPluginTestCase(APITestCase):
         self.assertTrue(self.plugin.check("abcractf{a}abc"))
 
 
+class CheckFlagTestCase(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="test", display_order=0, contained_type="test", description="")
+        self.challenge = Challenge.objects.create(
+            name="test1",
+            category=category,
+            description="a",
+            challenge_type="basic",
+            challenge_metadata={},
+            flag_type="regex",
+            flag_metadata={"flag": "ractf{a+}"},
+            author="ractf",
+            score=1000,
+        )
+
+    def test_oversized_flag_rejected(self):
+        self.assertFalse(check_flag(PlaintextFlagPlugin(self.challenge), "a" * 1001))
+
+    def test_regex_isolated(self):
+        plugin = RegexFlagPlugin(self.challenge)
+        self.assertTrue(check_flag(plugin, "ractf{aaa}"))
+        self.assertFalse(check_flag(plugin, "ractf{b}"))
+
+    @override_settings(FLAG_CHECK_TIMEOUT=0.2)
+    def test_regex_timeout(self):
+        self.challenge.flag_metadata = {"flag": "(a+)+b"}
+        self.challenge.save()
+        with self.assertRaises(FlagCheckTimeout):
+            check_flag(RegexFlagPlugin(self.challenge), "a" * 64)
+
+    def test_start_warms_workers(self):
+        executor = FlagCheckExecutor()
+        executor.start()
+        pool, _ = executor.get_pool()
+        self.assertEqual(len(pool._processes), 2)
+        pool.shutdown()
+
+    @override_settings(FLAG_CHECK_TIMEOUT=0.2, FLAG_CHECK_QUEUE_TIMEOUT=5)
+    def test_queue_wait_not_counted_against_budget(self):
+        executor = FlagCheckExecutor()
+        executor.start()
+        pool, slots = executor.get_pool()
+        for _ in range(4):
+            slots.acquire()
+        release = threading.Timer(0.5, slots.release)
+        release.start()
+        self.assertTrue(executor.check(RegexFlagPlugin(self.challenge), "ractf{a}"))
+        release.join()
+        pool.shutdown()
+
+    @override_settings(FLAG_CHECK_QUEUE_TIMEOUT=0.1)
+    def test_queue_timeout(self):
+        executor = FlagCheckExecutor()
+        _, slots = executor.get_pool()
+        for _ in range(4):
+            slots.acquire()
+        with self.assertRaisesMessage(FlagCheckTimeout, "busy"):
+            executor.check(RegexFlagPlugin(self.challenge), "ractf{a}")
+
+    @override_settings(FLAG_CHECK_WORKERS=0)
+    def test_regex_inline(self):
+        self.assertTrue(check_flag(RegexFlagPlugin(self.challenge), "ractf{a}"))
+
+
+class PreparedFlagPluginTestCase(ChallengeSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.challenge1.flag_type = "regex"
+        self.challenge1.flag_metadata = {"flag": "ractf{a+}"}
+        self.challenge1.save()
+
+    def test_prepared_across_instances(self):
+        with mock.patch.object(RegexFlagPlugin, "prepare", wraps=RegexFlagPlugin(self.challenge1).prepare) as prepare:
+            for _ in range(3):
+                RegexFlagPlugin(Challenge.objects.get(pk=self.challenge1.pk)).check("ractf{aa}")
+        self.assertEqual(prepare.call_count, 1)
+
+    def test_prepared_rebuilt_on_save(self):
+        self.assertTrue(RegexFlagPlugin(self.challenge1).check("ractf{a}"))
+        self.challenge1.flag_metadata = {"flag": "ractf{b+}"}
+        self.challenge1.save()
+        challenge = Challenge.objects.get(pk=self.challenge1.pk)
+        self.assertFalse(RegexFlagPlugin(challenge).check("ractf{a}"))
+        self.assertTrue(RegexFlagPlugin(challenge).check("ractf{bb}"))
+
+    def test_prepared_rebuilt_when_saved_by_another_process(self):
+        self.assertTrue(RegexFlagPlugin(self.challenge1).check("ractf{a}"))
+        with mock.patch("challenge.signals.clear_prepared"):
+            challenge = Challenge.objects.get(pk=self.challenge1.pk)
+            challenge.flag_metadata = {"flag": "ractf{b+}"}
+            challenge.save()
+        self.assertTrue(RegexFlagPlugin(Challenge.objects.get(pk=self.challenge1.pk)).check("ractf{bb}"))
+
+    def test_flag_version_not_bumped_by_score_updates(self):
+        version = self.challenge1.flag_version
+        self.challenge1.current_score = 500
+        self.challenge1.save(update_fields=["current_score"])
+        self.assertEqual(Challenge.objects.get(pk=self.challenge1.pk).flag_version, version)
+
+
 class BasicPointsPluginTestCase(APITestCase):
     def setUp(self):
         category = Category(name="test", display_order=0, contained_type="test", description="")
@@ -256,6 +366,12 @@ class DecayPointsPluginTestCase(ChallengeSetupMixin, APITestCase):
         self.assertEqual(self.team.points, 1000)
         self.assertEqual(self.team.leaderboard_points, 1000)
 
+    def test_score_already_solved(self):
+        self.plugin.score(self.user, self.team, "", Solve.objects.filter(challenge=self.challenge2))
+        solve = self.plugin.score(self.user, self.team, "", Solve.objects.filter(challenge=self.challenge2))
+        self.assertIsNone(solve)
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 1000)
+
     def test_score_lb_disabled(self):
         config.set("enable_scoring", False)
         self.plugin.score(self.user, self.team, "", Solve.objects.filter(challenge=self.challenge2))
@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.core.cache import caches
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from challenge.models import Category, Challenge, Score, Solve
+from challenge.views import FlagSubmitView
+from member.models import Member
+from team.models import Team
+
+FLAG = "ractf{benchmark}"
+
+
+class BenchmarkFlagSubmitView(FlagSubmitView):
+    permission_classes = ()
+    throttle_classes = ()
+
+
+class ChallengeLockFlagSubmitView(BenchmarkFlagSubmitView):
+    """FlagSubmitView as it was before only the team was locked, holding the challenge row lock for the whole
+    submission."""
+
+    def post(self, request):
+        with transaction.atomic():
+            Challenge.objects.select_for_update().get(pk=request.data["challenge"])
+            return super().post(request)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures flag submission throughput with many teams solving one challenge at once, with and without the "
+        "challenge row lock. The teams and challenge are created for the run and deleted afterwards, run it against a "
+        "staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=32)
+
+    def handle(self, *args, **options):
+        prefix = "bench-" + uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=prefix, display_order=0, contained_type="test", description="")
+        challenge = Challenge.objects.create(
+            name=prefix,
+            category=category,
+            description="",
+            challenge_type="default",
+            challenge_metadata={},
+            flag_type="plaintext",
+            flag_metadata={"flag": FLAG},
+            author="benchmark",
+            score=100,
+        )
+        Member.objects.bulk_create(
+            Member(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com") for i in range(options["teams"])
+        )
+        members = list(Member.objects.filter(username__startswith=prefix + "-"))
+        Team.objects.bulk_create(Team(name=member.username, password="benchmark", owner=member) for member in members)
+        teams = {team.name: team for team in Team.objects.filter(name__startswith=prefix + "-")}
+        for member in members:
+            member.team = teams[member.username]
+        Member.objects.bulk_update(members, ["team"])
+
+        try:
+            results = []
+            for label, view_class in (
+                ("Challenge lock", ChallengeLockFlagSubmitView),
+                ("Team lock", BenchmarkFlagSubmitView),
+            ):
+                elapsed, failures = self.run(view_class, members, challenge, options["workers"])
+                if failures:
+                    self.stderr.write(f"{label}: {failures} submissions weren't scored as correct.")
+                results.append(len(members) / elapsed)
+                self.stdout.write(f"{label + ':':<16}{results[-1]:.1f} submissions/s")
+                self.reset(challenge, teams.values(), members)
+            self.stdout.write(f"{'Speedup:':<16}{results[1] / results[0]:.2f}x")
+        finally:
+            self.reset(challenge, teams.values(), members)
+            challenge.delete()
+            category.delete()
+            Team.objects.filter(name__startswith=prefix + "-").delete()
+            Member.objects.filter(username__startswith=prefix + "-").delete()
+            # The deletions above decremented the counts for teams and members which were never counted.
+            caches["default"].set("member_count", Member.objects.count(), timeout=None)
+            caches["default"].set("team_count", Team.objects.count(), timeout=None)
+
+    def run(self, view_class, members, challenge, workers):
+        """Submit the correct flag once for every member's team, all at once, returning the time taken and failures."""
+        view = view_class.as_view()
+        factory = APIRequestFactory()
+        pending = deque(members)
+        failures = []
+        start = threading.Barrier(workers) if workers > 1 else None
+
+        def submit_all():
+            if start is not None:
+                start.wait()
+            try:
+                while True:
+                    try:
+                        member = pending.popleft()
+                    except IndexError:
+                        return
+                    request = factory.post("/", {"flag": FLAG, "challenge": challenge.pk}, format="json")
+                    force_authenticate(request, user=member)
+                    response = view(request)
+                    if response.data["m"] != "correct_flag":
+                        failures.append(response.data["m"])
+            finally:
+                if start is not None:
+                    connection.close()
+
+        began = time.perf_counter()
+        if start is None:
+            submit_all()
+        else:
+            threads = [threading.Thread(target=submit_all) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return time.perf_counter() - began, len(failures)
+
+    def reset(self, challenge, teams, members):
+        Solve.objects.filter(challenge=challenge).delete()
+        Score.objects.filter(team__in=teams).delete()
+        Challenge.objects.filter(pk=challenge.pk).update(first_blood=None)
+        Team.objects.filter(pk__in=[team.pk for team in teams]).update(points=0, leaderboard_points=0)
+        Member.objects.filter(pk__in=[member.pk for member in members]).update(points=0, leaderboard_points=0)
@@ -0,0 +1,114 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+import serpy
+from django.core.management import BaseCommand
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework.request import Request
+
+from backend.serpy_compiler import CompiledSerializer
+from challenge.models import Category, Challenge, File, Tag
+from challenge.serializers import (
+    FastCategorySerializer,
+    FastChallengeSerializer,
+    FastLockedChallengeSerializer,
+    setup_context,
+)
+from hint.models import Hint
+from member.models import Member
+
+
+class LegacyChallengeSerializer(FastChallengeSerializer):
+    """FastChallengeSerializer as it was before compilation, with a context set up per category and a new serializer
+    per locked challenge."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        setup_context(self.context)
+        self.bind_context(self.context)
+
+    def _serialize(self, instance, fields):
+        if (
+            instance.is_unlocked(self.context["request"].user, solves=self.context.get("solves", None))
+            and not instance.hidden
+            and instance.unlock_time_surpassed
+        ):
+            return serpy.Serializer._serialize(self, instance, fields)
+        return FastLockedChallengeSerializer(instance).serialize(instance)
+
+
+class LegacyCategorySerializer(FastCategorySerializer):
+    def get_challenges(self, instance):
+        return LegacyChallengeSerializer(instance.challenges, many=True, context=self.context).data
+
+
+def build_board(category_count, challenge_count, hint_count):
+    """Build an unsaved board of categories with their challenges, hints, files and tags prefetched."""
+    release_time = timezone.now() - timedelta(hours=1)
+    categories = [
+        Category(id=i, name=f"category-{i}", display_order=i, contained_type="test", description="", metadata={})
+        for i in range(category_count)
+    ]
+    for category in categories:
+        category.challenges = []
+    for i in range(challenge_count):
+        challenge = Challenge(
+            id=i,
+            name=f"challenge-{i}",
+            category=categories[i % category_count],
+            description="description " * 20,
+            challenge_type="default",
+            challenge_metadata={"cserv_name": "test"},
+            flag_type="plaintext",
+            flag_metadata={"flag": "ractf{flag}"},
+            author="author",
+            score=100,
+            unlock_requirements=f"{i - 1}" if i % 4 == 0 and i else None,
+            release_time=release_time,
+            post_score_explanation="explanation",
+        )
+        challenge.unlock_time_surpassed = True
+        challenge.hints = [
+            Hint(id=i * hint_count + j, name=f"hint-{j}", penalty=10, text="text", challenge=challenge)
+            for j in range(hint_count)
+        ]
+        for hint in challenge.hints:
+            hint.used = False
+        challenge.files = [File(id=i, name="file", url="https://example.com", size=1, md5="0", challenge=challenge)]
+        challenge.tags = [Tag(id=i, text="tag", type="type", challenge=challenge)]
+        categories[i % category_count].challenges.append(challenge)
+    return categories
+
+
+class Command(BaseCommand):
+    help = "Compares the compiled challenge board serializers with the interpreted ones they replaced"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--challenges", type=int, default=500)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--hints", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        board = build_board(options["categories"], options["challenges"], options["hints"])
+        request = Request(HttpRequest())
+        request.user = Member(username="benchmark", email="benchmark@example.com")
+
+        with mock.patch.object(CompiledSerializer, "_serialize", serpy.Serializer._serialize):
+            legacy_time, legacy = self.time(LegacyCategorySerializer, board, request, options["repeat"])
+        compiled_time, compiled = self.time(FastCategorySerializer, board, request, options["repeat"])
+
+        if legacy != compiled:
+            self.stderr.write("The compiled serializers gave a different result to the interpreted ones.")
+        self.stdout.write(f"Interpreted: {legacy_time * 1000:.2f}ms per board")
+        self.stdout.write(f"Compiled:    {compiled_time * 1000:.2f}ms per board")
+        self.stdout.write(f"Speedup:     {legacy_time / compiled_time:.2f}x")
+
+    def time(self, serializer_class, board, request, repeat):
+        data = None
+        start = time.perf_counter()
+        for _ in range(repeat):
+            data = serializer_class(board, many=True, context={"request": request}).data
+        return (time.perf_counter() - start) / repeat, data
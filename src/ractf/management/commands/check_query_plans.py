@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand, CommandError
+
+from backend.query_plans import HOT_QUERIES, check_query_plans
+
+
+class Command(BaseCommand):
+    help = "Explains the hottest queries and fails if any of them sequentially scans a large table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10000,
+            help="Only count scans of tables with at least this many rows, seed the database with fake data first",
+        )
+        parser.add_argument("queries", nargs="*", help="Names of the queries to check, by default all of them")
+
+    def handle(self, *args, **options):
+        unknown = set(options["queries"]) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+        queries = {name: HOT_QUERIES[name] for name in options["queries"] or HOT_QUERIES}
+        failures = check_query_plans(queries, min_rows=options["min_rows"])
+        for name in queries:
+            if name in failures:
+                self.stdout.write(f"{name}: sequential scan of {', '.join(failures[name])}")
+            else:
+                self.stdout.write(f"{name}: ok")
+        if failures:
+            raise CommandError(f"{len(failures)} of {len(queries)} hot queries scan a large table")
+        self.stdout.write(f"Checked {len(queries)} hot queries")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from notifications.outbox import BATCH_SIZE, Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Delivers queued notifications, such as first blood webhooks, to their sinks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="Keep running and deliver notifications as they're queued")
+        parser.add_argument("--poll", type=float, default=1, help="Seconds between checks for queued notifications")
+
+    def handle(self, *args, **options):
+        AuditLogEntry.create_management_entry("dispatch_notifications", extra={"watch": options["watch"]})
+        dispatcher = Dispatcher()
+        while True:
+            attempted = dispatcher.dispatch()
+            if attempted:
+                self.stdout.write(f"Attempted delivery of {attempted} notifications")
+            if attempted == BATCH_SIZE:
+                continue
+            if not options["watch"]:
+                return
+            time.sleep(options["poll"])
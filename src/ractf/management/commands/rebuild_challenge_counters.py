@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from challenge.counters import COUNTERS, get_challenge_counters, rebuild_challenge_counters
+
+
+class Command(BaseCommand):
+    help = "Reconcile the stored challenge solve and vote counters with the database"
+
+    def handle(self, *args, **options):
+        stored = get_challenge_counters()
+        rebuilt = rebuild_challenge_counters()
+        corrected = []
+        for counter in COUNTERS:
+            for challenge_id in stored[counter].keys() | rebuilt[counter].keys():
+                old, new = stored[counter].get(challenge_id, 0), rebuilt[counter].get(challenge_id, 0)
+                if old != new:
+                    corrected.append({"challenge": challenge_id, "counter": counter, "old": old, "new": new})
+                    self.stdout.write(f"Challenge {challenge_id} {counter}: {old} -> {new}")
+        AuditLogEntry.create_management_entry("rebuild_challenge_counters", extra={"corrected": corrected})
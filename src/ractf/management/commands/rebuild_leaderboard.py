@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from leaderboard.ranking import rebuild_leaderboard
+from leaderboard.timeline import drop_all_timelines
+
+
+class Command(BaseCommand):
+    help = "Rebuild the team and user leaderboards from the database, and have their graph timelines rebuilt"
+
+    def handle(self, *args, **options):
+        entries = rebuild_leaderboard()
+        drop_all_timelines()
+        AuditLogEntry.create_management_entry("rebuild_leaderboard", extra={"entries": entries})
+        self.stdout.write(f"Rebuilt leaderboards with {entries} entries")
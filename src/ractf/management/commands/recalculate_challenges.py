@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from challenge.recalculation import recalculate_due_challenges
+
+
+class Command(BaseCommand):
+    help = "Brings the scores of decaying challenges up to date with their number of solves"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="Keep running and recalculate challenges as they're solved")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.SCORE_RECALCULATION_INTERVAL,
+            help="Seconds between recalculation passes",
+        )
+
+    def handle(self, *args, **options):
+        AuditLogEntry.create_management_entry("recalculate_challenges", extra={"watch": options["watch"]})
+        while True:
+            for challenge in recalculate_due_challenges():
+                self.stdout.write(f"Recalculated {challenge.name}: {challenge.current_score} points")
+            if not options["watch"]:
+                return
+            time.sleep(options["interval"])
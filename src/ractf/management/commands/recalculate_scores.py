@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from scorerecalculator.totals import recalculate_teams, recalculate_users
+
+
+class Command(BaseCommand):
+    help = "Recalculate the points of every team and user from their scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list the totals which are out of date")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        changes = {"team": recalculate_teams(dry_run=dry_run), "user": recalculate_users(dry_run=dry_run)}
+        for kind, rows in changes.items():
+            for row in rows:
+                stored, recalculated = row["stored"], row["recalculated"]
+                self.stdout.write(
+                    f"{kind} {row['id']}: points {stored['points']} -> {recalculated['points']}, "
+                    f"leaderboard_points {stored['leaderboard_points']} -> {recalculated['leaderboard_points']}, "
+                    f"last_score {stored['last_score']} -> {recalculated['last_score']}"
+                )
+        if not dry_run:
+            AuditLogEntry.create_management_entry(
+                "recalculate_scores", extra={"teams": len(changes["team"]), "users": len(changes["user"])}
+            )
+        verb = "Found" if dry_run else "Recalculated"
+        self.stdout.write(f"{verb} {len(changes['team'])} teams and {len(changes['user'])} users out of date")
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand, CommandError
+
+from admin.models import AuditLogEntry
+from config import config
+from leaderboard.snapshots import FINAL, FREEZE, take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Take the frozen snapshots of the standings served after the scoreboard freezes and the competition ends"
+
+    def add_arguments(self, parser):
+        parser.add_argument("snapshots", nargs="*", help=f"Snapshots to take, {FREEZE} or {FINAL}, by default both")
+
+    def handle(self, *args, **options):
+        names = options["snapshots"] or [FREEZE, FINAL]
+        for name in names:
+            if name not in (FREEZE, FINAL):
+                raise CommandError(f"Unknown snapshot {name}, expected {FREEZE} or {FINAL}")
+        times = {FREEZE: config.get("hide_scoreboard_at"), FINAL: config.get("end_time")}
+        if FREEZE in names and times[FREEZE] == -1:
+            if options["snapshots"]:
+                raise CommandError("hide_scoreboard_at isn't set, so there's no freeze to snapshot")
+            names.remove(FREEZE)
+        for name in names:
+            snapshot = take_snapshot(name, times[name])
+            AuditLogEntry.create_management_entry(
+                "snapshot_standings", extra={"name": name, "at": snapshot["at"], "version": snapshot["version"]}
+            )
+            self.stdout.write(
+                f"Took {name} snapshot at {snapshot['at']} with {len(snapshot['teams'])} teams and "
+                f"{len(snapshot['users'])} users, version {snapshot['version']}"
+            )
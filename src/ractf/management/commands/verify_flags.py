@@ -0,0 +1,59 @@
+import json
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from challenge.models import Challenge
+from challenge.verification import verify_flags
+
+REFERENCE_FLAG_TYPES = ("plaintext", "lenient", "long_text")
+
+
+class Command(BaseCommand):
+    help = "Checks candidate flags against their challenges' flag plugins, without recording any solves"
+    stealth_options = ("stdin",)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file", nargs="?", help='JSON file of [{"challenge": id, "flag": "..."}] pairs to check, "-" for stdin'
+        )
+        parser.add_argument(
+            "--reference",
+            action="store_true",
+            help="Also check every challenge's stored flag, for flag types where it's a valid submission",
+        )
+        parser.add_argument("--threads", type=int, default=8)
+
+    def handle(self, *args, **options):
+        pairs = []
+        if options["file"]:
+            try:
+                if options["file"] == "-":
+                    flags = json.load(options.get("stdin", sys.stdin))
+                else:
+                    with open(options["file"]) as f:
+                        flags = json.load(f)
+                pairs += [(int(pair["challenge"]), pair["flag"]) for pair in flags]
+            except (OSError, KeyError, TypeError, ValueError) as e:
+                raise CommandError(f"Couldn't read flags: {e}")
+        if options["reference"]:
+            for challenge in Challenge.objects.filter(flag_type__in=REFERENCE_FLAG_TYPES):
+                if isinstance(challenge.flag_metadata, dict) and challenge.flag_metadata.get("flag"):
+                    pairs.append((challenge.pk, challenge.flag_metadata["flag"]))
+        if not pairs and not options["reference"]:
+            raise CommandError("Give a file of flags to check or --reference")
+
+        results, issues = verify_flags(pairs, threads=options["threads"])
+        for result in results:
+            outcome = result["error"] or ("correct" if result["correct"] else "incorrect")
+            self.stdout.write(
+                f"Challenge {result['challenge']} {result['flag']!r}: {outcome} ({result['time'] * 1000:.2f}ms)"
+            )
+        for issue in issues:
+            self.stdout.write(f"Challenge {issue['challenge']} issue: {issue['issue']} {issue.get('extra', '')}".rstrip())
+        correct = sum(1 for result in results if result["correct"])
+        errors = sum(1 for result in results if result["error"])
+        self.stdout.write(
+            f"Checked {len(results)} flags: {correct} correct, {len(results) - correct - errors} incorrect, "
+            f"{errors} errors, {len(issues)} issues"
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management import BaseCommand
+
+from admin.models import AuditLogEntry
+from challenge.warmup import get_next_release, warm_board
+from config import config
+
+
+class Command(BaseCommand):
+    help = "Renders the challenge board ahead of the competition start and each category and challenge release"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="Keep running and warm the board before each release")
+        parser.add_argument("--lead", type=float, default=30, help="Seconds before a release to warm the board")
+        parser.add_argument("--poll", type=float, default=60, help="Seconds between checks for new releases")
+
+    def handle(self, *args, **options):
+        AuditLogEntry.create_management_entry("warm_board", extra={"watch": options["watch"]})
+        if not config.get("enable_caching"):
+            self.stderr.write("Caching is disabled, there is nothing to warm.")
+            return
+
+        self.warm()
+        next_release = get_next_release()
+        if next_release is not None and next_release - options["lead"] <= time.time():
+            self.warm(next_release)
+
+        while options["watch"]:
+            next_release = get_next_release()
+            wait = options["poll"] if next_release is None else next_release - options["lead"] - time.time()
+            if wait > 0:
+                time.sleep(min(wait, options["poll"]))
+                continue
+            self.warm(next_release)
+            time.sleep(max(next_release - time.time(), 0))
+
+    def warm(self, at=None):
+        start = time.time()
+        version = warm_board(at)
+        self.stdout.write(f"Warmed board version {version} in {time.time() - start:.3f}s")
@@ -1,9 +1,16 @@
 from io import StringIO
 
-from django.core.management import call_command
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
+from challenge.models import Challenge, Score
+from challenge.tests.mixins import ChallengeSetupMixin
+from config import config
+from leaderboard.snapshots import FINAL, get_snapshot_key
 from member.models import UserIP, Member
+from notifications.models import Notification
+from team.models import Team
 
 
 class GroupIpsTest(TestCase):
@@ -42,3 +49,134 @@ class GroupIpsTest(TestCase):
         call_command("group_ips", "--json", "--multiple", stdout=out)
         self.assertIn("1.1.1.1", out.getvalue())
         self.assertNotIn("2.2.2.2", out.getvalue())
+
+
+class RebuildChallengeCountersTest(TestCase):
+    def test_rebuild_challenge_counters(self):
+        out = StringIO()
+        call_command("rebuild_challenge_counters", stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+
+class WarmBoardTest(TestCase):
+    def test_warm_board(self):
+        config.set("enable_caching", True)
+        out = StringIO()
+        call_command("warm_board", stdout=out)
+        config.set("enable_caching", False)
+        self.assertIn("Warmed board version", out.getvalue())
+
+    def test_warm_board_caching_disabled(self):
+        out, err = StringIO(), StringIO()
+        call_command("warm_board", stdout=out, stderr=err)
+        self.assertEqual(out.getvalue(), "")
+
+
+class BenchmarkSerializersTest(TestCase):
+    def test_benchmark_serializers(self):
+        out, err = StringIO(), StringIO()
+        call_command("benchmark_serializers", "--challenges", "20", "--repeat", "1", stdout=out, stderr=err)
+        self.assertIn("Speedup", out.getvalue())
+        self.assertEqual(err.getvalue(), "")
+
+
+class BenchmarkFlagSubmissionTest(TestCase):
+    def test_benchmark_flag_submission(self):
+        out, err = StringIO(), StringIO()
+        call_command("benchmark_flag_submission", "--teams", "5", "--workers", "1", stdout=out, stderr=err)
+        self.assertIn("Speedup", out.getvalue())
+        self.assertEqual(err.getvalue(), "")
+        self.assertFalse(Team.objects.filter(name__startswith="bench-").exists())
+
+
+class DispatchNotificationsTest(TestCase):
+    def test_dispatch_notifications(self):
+        config.set("notification_sinks", [{"name": "stub", "type": "stub"}])
+        Notification.objects.create(event="first_blood", sink="stub", payload={})
+        out = StringIO()
+        call_command("dispatch_notifications", stdout=out)
+        config.set("notification_sinks", [])
+        self.assertIn("Attempted delivery of 1 notifications", out.getvalue())
+        self.assertTrue(Notification.objects.filter(delivered__isnull=False).exists())
+
+
+class VerifyFlagsTest(ChallengeSetupMixin, TestCase):
+    def test_verify_reference_flags(self):
+        out = StringIO()
+        call_command("verify_flags", "--reference", stdout=out)
+        self.assertIn(f"Challenge {self.challenge1.pk} 'ractf{{a}}': correct", out.getvalue())
+        self.assertIn("Checked 3 flags: 3 correct, 0 incorrect, 0 errors", out.getvalue())
+
+    def test_verify_flags_stdin(self):
+        out = StringIO()
+        flags = StringIO(f'[{{"challenge": {self.challenge2.pk}, "flag": "ractf{{b}}"}}]')
+        call_command("verify_flags", "-", stdin=flags, stdout=out)
+        self.assertIn("Checked 1 flags: 0 correct, 1 incorrect", out.getvalue())
+
+
+class RecalculateChallengesTest(ChallengeSetupMixin, TestCase):
+    def test_recalculate_challenges(self):
+        self.challenge2.points_type = "decay"
+        self.challenge2.save()
+        Challenge.objects.filter(pk=self.challenge2.pk).update(current_score=1)
+        out = StringIO()
+        call_command("recalculate_challenges", stdout=out)
+        self.assertIn("Recalculated test2: 1000 points", out.getvalue())
+
+
+class RebuildLeaderboardTest(TestCase):
+    def test_rebuild_leaderboard(self):
+        Member.objects.create(username="rebuild", email="rebuild@example.com", is_visible=True)
+        out = StringIO()
+        call_command("rebuild_leaderboard", stdout=out)
+        self.assertIn("Rebuilt leaderboards with 1 entries", out.getvalue())
+
+
+class SnapshotStandingsTest(TestCase):
+    def tearDown(self):
+        config.set("hide_scoreboard_at", -1)
+        caches["default"].delete(get_snapshot_key(FINAL, config.get("end_time")))
+
+    def test_snapshot_standings(self):
+        Member.objects.create(username="snapshot", email="snapshot@example.com", is_visible=True)
+        out = StringIO()
+        call_command("snapshot_standings", stdout=out)
+        self.assertIn("Took final snapshot", out.getvalue())
+        self.assertNotIn("freeze", out.getvalue())
+        self.assertIn("1 users", out.getvalue())
+
+    def test_snapshot_freeze_unset(self):
+        with self.assertRaises(CommandError):
+            call_command("snapshot_standings", "freeze", stdout=StringIO())
+
+
+class RecalculateScoresTest(TestCase):
+    def setUp(self):
+        self.user = Member.objects.create(username="recalculate", email="recalculate@example.org")
+        self.team = Team.objects.create(name="recalculate", owner=self.user, password="a")
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command("recalculate_scores", "--dry-run", stdout=out)
+        self.assertIn("Found 1 teams and 1 users out of date", out.getvalue())
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 0)
+
+    def test_recalculate_scores(self):
+        out = StringIO()
+        call_command("recalculate_scores", stdout=out)
+        self.assertIn("Recalculated 1 teams and 1 users out of date", out.getvalue())
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 100)
+        self.assertEqual(Member.objects.get(id=self.user.pk).points, 100)
+
+
+class CheckQueryPlansTest(TestCase):
+    def test_check_query_plans(self):
+        out = StringIO()
+        call_command("check_query_plans", min_rows=0, stdout=out)
+        self.assertIn("team_leaderboard: ok", out.getvalue())
+        self.assertIn("Checked", out.getvalue())
+
+    def test_unknown_query(self):
+        with self.assertRaises(CommandError):
+            call_command("check_query_plans", "missing", stdout=StringIO())
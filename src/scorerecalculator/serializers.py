@@ -0,0 +1,5 @@
+from rest_framework import serializers
+
+
+class RecalculateSerializer(serializers.Serializer):
+    dry_run = serializers.BooleanField(default=False)
@@ -1,11 +1,18 @@
 import random
+from unittest import mock
 
 from rest_framework.reverse import reverse
-from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN,
+)
 from rest_framework.test import APITestCase
 
 from challenge.models import Score
 from member.models import Member
+from scorerecalculator.totals import recalculate_teams, recalculate_users
 from team.models import Team
 
 
@@ -174,3 +181,103 @@ class RecalculateAllViewTestCase(APITestCase):
         self.client.post(reverse("recalculate-all"))
         self.assertEqual(Team.objects.get(id=self.team.pk).leaderboard_points, total)
         self.assertEqual(Member.objects.get(id=self.user.pk).leaderboard_points, total)
+
+
+class RecalculateTotalsTestCase(APITestCase):
+    def setUp(self):
+        user = Member(username="recalculate-test", email="recalculate-test@example.org")
+        user.save()
+        admin_user = Member(
+            username="recalculate-test-admin",
+            email="recalculate-test-admin@example.org",
+        )
+        admin_user.is_staff = True
+        admin_user.save()
+        team = Team(name="recalculate-team", owner=user, password="a")
+        team.save()
+        user.team = team
+        user.save()
+        self.user = user
+        self.admin_user = admin_user
+        self.team = team
+        # Unscored accounts have their last_score moved to when they joined by the first recalculation.
+        recalculate_teams()
+        recalculate_users()
+
+    def test_penalty_and_last_score(self):
+        first = Score.objects.create(team=self.team, user=self.user, reason="test", points=100, penalty=20)
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=50, tiebreaker=False)
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=10, leaderboard=False)
+        recalculate_teams([self.team.pk])
+        team = Team.objects.get(id=self.team.pk)
+        self.assertEqual(team.points, 140)
+        self.assertEqual(team.leaderboard_points, 130)
+        self.assertEqual(team.last_score, first.timestamp)
+
+    def test_no_scores(self):
+        Team.objects.filter(id=self.team.pk).update(points=50, leaderboard_points=50)
+        recalculate_teams([self.team.pk])
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 0)
+
+    def test_last_score_deleted(self):
+        first = Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        last = Score.objects.create(team=self.team, user=self.user, reason="test", points=50)
+        recalculate_teams([self.team.pk])
+        recalculate_users([self.user.pk])
+        last.delete()
+        recalculate_teams([self.team.pk])
+        recalculate_users([self.user.pk])
+        self.assertEqual(Team.objects.get(id=self.team.pk).last_score, first.timestamp)
+        self.assertEqual(Member.objects.get(id=self.user.pk).last_score, first.timestamp)
+
+    def test_last_score_all_deleted(self):
+        score = Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        recalculate_teams([self.team.pk])
+        recalculate_users([self.user.pk])
+        score.delete()
+        recalculate_teams([self.team.pk])
+        recalculate_users([self.user.pk])
+        self.assertEqual(Team.objects.get(id=self.team.pk).last_score, self.user.date_joined)
+        self.assertEqual(Member.objects.get(id=self.user.pk).last_score, self.user.date_joined)
+
+    def test_dry_run(self):
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        changes = recalculate_users(dry_run=True)
+        self.assertEqual([change["id"] for change in changes], [self.user.pk])
+        self.assertEqual(changes[0]["stored"]["points"], 0)
+        self.assertEqual(changes[0]["recalculated"]["points"], 100)
+        self.assertEqual(Member.objects.get(id=self.user.pk).points, 0)
+
+    def test_only_differing_rows(self):
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        recalculate_teams()
+        recalculate_users()
+        self.assertEqual(recalculate_teams(dry_run=True), [])
+        self.assertEqual(recalculate_users(dry_run=True), [])
+
+    def test_batches(self):
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        with mock.patch("scorerecalculator.totals.BATCH_SIZE", 1):
+            changes = recalculate_users()
+        self.assertEqual([change["id"] for change in changes], [self.user.pk])
+        self.assertEqual(Member.objects.get(id=self.user.pk).points, 100)
+
+    def test_view_dry_run(self):
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.post(reverse("recalculate-all"), {"dry_run": True}, format="json")
+        self.assertEqual([team["id"] for team in response.data["d"]["teams"]], [self.team.pk])
+        self.assertEqual([user["id"] for user in response.data["d"]["users"]], [self.user.pk])
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 0)
+
+    def test_view_form_dry_run_false(self):
+        Score.objects.create(team=self.team, user=self.user, reason="test", points=100)
+        self.client.force_authenticate(self.admin_user)
+        for value in ("false", "0"):
+            self.client.post(reverse("recalculate-team", kwargs={"id": self.team.pk}), {"dry_run": value})
+        self.assertEqual(Team.objects.get(id=self.team.pk).points, 100)
+
+    def test_view_invalid_dry_run(self):
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.post(reverse("recalculate-all"), {"dry_run": "maybe"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
@@ -0,0 +1,176 @@
+"""
+Set-based recalculation of team and user totals from their scores.
+
+Totals are summed by the database rather than in Python. One statement sums the scores of a batch of teams or users,
+grouped by team or user, joins the sums against the stored points, leaderboard_points and last_score, and keeps only
+the rows where they differ. An UPDATE ... FROM that statement then rewrites just those rows. A dry run stops after the
+first statement, so it reports exactly what a recalculation would change.
+
+A user with no leaderboard tiebreaker scores left has their last_score reset to when they joined, and a team to when
+its owner joined, as teams don't record when they were made. Either is before any score they could have had.
+
+Teams and users are recalculated in batches, each in its own short transaction which locks only the rows of that
+batch, in id order, before their scores are summed. Flag submission locks the team it scores for, so a solve either
+commits before its team's batch is summed, and is counted, or waits for that one batch rather than the whole run.
+"""
+
+from django.db import connection, transaction
+
+from challenge.models import Score
+from leaderboard.ranking import refresh_on_commit
+from member.models import Member
+
+BATCH_SIZE = 1000
+
+CHANGES_SQL = """
+SELECT
+    target.id,
+    target.points,
+    target.leaderboard_points,
+    target.last_score,
+    COALESCE(totals.points, 0) AS new_points,
+    COALESCE(totals.leaderboard_points, 0) AS new_leaderboard_points,
+    COALESCE(totals.last_score, {joined}) AS new_last_score
+FROM {table} target
+LEFT JOIN (
+    SELECT
+        {column} AS id,
+        SUM(points - penalty) AS points,
+        SUM(CASE WHEN leaderboard THEN points - penalty ELSE 0 END) AS leaderboard_points,
+        MAX(CASE WHEN leaderboard AND tiebreaker THEN timestamp END) AS last_score
+    FROM {scores}
+    WHERE {column} IN ({ids})
+    GROUP BY {column}
+) totals ON totals.id = target.id
+WHERE target.id IN ({ids}) AND (
+    target.points <> COALESCE(totals.points, 0)
+    OR target.leaderboard_points <> COALESCE(totals.leaderboard_points, 0)
+    OR target.last_score <> COALESCE(totals.last_score, {joined})
+)
+"""
+
+UPDATE_SQL = """
+UPDATE {table}
+SET points = changes.new_points,
+    leaderboard_points = changes.new_leaderboard_points,
+    last_score = changes.new_last_score
+FROM ({changes}) changes
+WHERE {table}.id = changes.id
+"""
+
+
+def get_changes_sql(model, count):
+    members = connection.ops.quote_name(Member._meta.db_table)
+    if model is Member:
+        column, joined = "user_id", "target.date_joined"
+    else:
+        column, joined = "team_id", f"(SELECT owner.date_joined FROM {members} owner WHERE owner.id = target.owner_id)"
+    return CHANGES_SQL.format(
+        table=connection.ops.quote_name(model._meta.db_table),
+        scores=connection.ops.quote_name(Score._meta.db_table),
+        column=column,
+        joined=joined,
+        ids=", ".join(["%s"] * count),
+    )
+
+
+def convert_last_score(model, value):
+    """Convert a last_score read by a raw query to a datetime, as the ORM would have."""
+    field = model._meta.get_field("last_score")
+    expression = field.get_col(model._meta.db_table)
+    for converter in connection.ops.get_db_converters(expression) + field.get_db_converters(connection):
+        value = converter(value, expression, connection)
+    return value
+
+
+def get_changes(model, ids):
+    """Return the stored and recalculated totals of each of the given teams or users whose totals are out of date."""
+    if not ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(get_changes_sql(model, len(ids)), [*ids, *ids])
+        rows = cursor.fetchall()
+    return [
+        {
+            "id": row[0],
+            "stored": {
+                "points": row[1],
+                "leaderboard_points": row[2],
+                "last_score": convert_last_score(model, row[3]),
+            },
+            "recalculated": {
+                "points": row[4],
+                "leaderboard_points": row[5],
+                "last_score": convert_last_score(model, row[6]),
+            },
+        }
+        for row in rows
+    ]
+
+
+def update_totals(model, ids):
+    changes = get_changes_sql(model, len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPDATE_SQL.format(table=connection.ops.quote_name(model._meta.db_table), changes=changes), [*ids, *ids]
+        )
+
+
+def get_batches(model, ids):
+    """Yield the ids of the teams or users to recalculate in batches, in id order, or every one if ids is None."""
+    if ids is not None:
+        ids = sorted(set(ids))
+        for start in range(0, len(ids), BATCH_SIZE):
+            yield ids[start:start + BATCH_SIZE]
+        return
+    last = 0
+    while True:
+        batch = list(model.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def recalculate_batch(model, ids, dry_run):
+    with transaction.atomic():
+        if not dry_run:
+            ids = list(model.objects.select_for_update().filter(id__in=ids).order_by("id").values_list("id", flat=True))
+        changes = get_changes(model, ids)
+        if changes and not dry_run:
+            changed = [change["id"] for change in changes]
+            update_totals(model, changed)
+            if model is Member:
+                refresh_on_commit(user_ids=changed)
+            else:
+                refresh_on_commit(team_ids=changed)
+    return changes
+
+
+def recalculate(model, ids=None, dry_run=False):
+    changes = []
+    for batch in get_batches(model, ids):
+        changes += recalculate_batch(model, batch, dry_run)
+    return changes
+
+
+def recalculate_teams(team_ids=None, dry_run=False):
+    """
+    Bring the totals of the given teams, or every team, up to date with their scores.
+
+    Returns the stored and recalculated totals of each team whose totals were out of date. With dry_run, nothing is
+    written.
+    """
+    from team.models import Team
+
+    return recalculate(Team, team_ids, dry_run)
+
+
+def recalculate_users(user_ids=None, dry_run=False):
+    """
+    Bring the totals of the given users, or every user, up to date with their scores.
+
+    Returns the stored and recalculated totals of each user whose totals were out of date. With dry_run, nothing is
+    written.
+    """
+    return recalculate(Member, user_ids, dry_run)
@@ -1,61 +1,43 @@
-from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 
 from backend.response import FormattedResponse
-from challenge.models import Score
 from member.models import Member
+from scorerecalculator.serializers import RecalculateSerializer
+from scorerecalculator.totals import recalculate_teams, recalculate_users
 from team.models import Team
 
 
-def recalculate_team(team):
-    team.points = 0
-    team.leaderboard_points = 0
-    for user in team.members.all():
-        with transaction.atomic():
-            recalculate_user(user)
-            team.points += user.points
-            team.leaderboard_points += user.leaderboard_points
-    team.save()
-
-
-def recalculate_user(user):
-    user.points = 0
-    user.leaderboard_points = 0
-    scores = Score.objects.filter(user=user)
-    for score in scores:
-        if score.leaderboard:
-            user.leaderboard_points += score.points - score.penalty
-        user.points += score.points - score.penalty
-    user.save()
+def get_dry_run(request):
+    serializer = RecalculateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data["dry_run"]
 
 
 class RecalculateTeamView(APIView):
     permission_classes = (IsAdminUser,)
 
     def post(self, request, id):
-        with transaction.atomic():
-            team = get_object_or_404(Team.objects.select_for_update(), id=id)
-            recalculate_team(team)
-        return FormattedResponse()
+        team = get_object_or_404(Team, id=id)
+        dry_run = get_dry_run(request)
+        return FormattedResponse(d={"teams": recalculate_teams([team.pk], dry_run=dry_run)})
 
 
 class RecalculateUserView(APIView):
     permission_classes = (IsAdminUser,)
 
     def post(self, request, id):
-        with transaction.atomic():
-            user = get_object_or_404(Member.objects.select_for_update(), id=id)
-            recalculate_user(user)
-        return FormattedResponse()
+        user = get_object_or_404(Member, id=id)
+        dry_run = get_dry_run(request)
+        return FormattedResponse(d={"users": recalculate_users([user.pk], dry_run=dry_run)})
 
 
 class RecalculateAllView(APIView):
     permission_classes = (IsAdminUser,)
 
     def post(self, request):
-        with transaction.atomic():
-            for team in Team.objects.select_for_update().all():
-                recalculate_team(team)
-        return FormattedResponse()
+        dry_run = get_dry_run(request)
+        return FormattedResponse(
+            d={"teams": recalculate_teams(dry_run=dry_run), "users": recalculate_users(dry_run=dry_run)}
+        )
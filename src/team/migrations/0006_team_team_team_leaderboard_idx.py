@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('team', '0005_leaderboardgroup_team_leaderboard_group'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(models.OrderBy(models.F('leaderboard_points'), descending=True), models.F('last_score'), condition=models.Q(('is_visible', True)), name='team_team_leaderboard_idx'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import CASCADE, SET_NULL, Prefetch
+from django.db.models import CASCADE, SET_NULL, F, Prefetch, Q
 from django.db.models.functions import Lower
 from django.utils import timezone
 from django_prometheus.models import ExportModelOperationsMixin
@@ -61,3 +61,11 @@ class Team(ExportModelOperationsMixin("team"), models.Model):
                 name='team_team_username_uniq_idx',
             ),
         ]
+        indexes = [
+            models.Index(
+                F("leaderboard_points").desc(),
+                "last_score",
+                condition=Q(is_visible=True),
+                name="team_team_leaderboard_idx",
+            ),
+        ]
@@ -15,6 +15,7 @@ from rest_framework.status import (
 from rest_framework.views import APIView
 
 from backend.exceptions import FormattedException
+from backend.pagination import FormattedKeysetPagination
 from backend.permissions import AdminOrReadOnlyVisible, ReadOnlyBot, AdminOrReadOnly
 from backend.response import FormattedResponse
 from backend.signals import team_join, team_join_attempt, team_join_reject
@@ -69,6 +70,7 @@ class LeaderboardGroupViewSet(AuditLoggedViewSet, AdminListModelViewSet):
 class TeamViewSet(AuditLoggedViewSet, AdminListModelViewSet):
     permission_classes = (AdminOrReadOnlyVisible,)
     throttle_scope = "team"
+    pagination_class = FormattedKeysetPagination
     serializer_class = TeamSerializer
     admin_serializer_class = AdminTeamSerializer
     list_serializer_class = ListTeamSerializer